@@ -1,14 +1,54 @@
 import os
-import toml
+import hashlib
+import importlib
 """
 Star names Formatting
 """
 try:
-    from ref.star_names import star_name_format, optimal_star_name, star_name_preference, StringStarName, StarName,\
+    from ref.star_names import star_name_format, optimal_star_name, StringStarName, StarName,\
         star_letters, asterisk_names, asterisk_name_types
+    star_names_module = "ref.star_names"
 except ImportError:
-    from autostar.config.default_star_names import star_name_format, optimal_star_name, star_name_preference, \
-        StringStarName, StarName, star_letters, asterisk_names, asterisk_name_types
+    from autostar.config.default_star_names import star_name_format, optimal_star_name, \
+        StringStarName, StarName, star_letters, asterisk_names, asterisk_name_types, star_name_format_many, \
+        string_names_many
+    star_names_module = "autostar.config.default_star_names"
+else:
+    try:
+        from ref.star_names import star_name_format_many, string_names_many
+    except ImportError:
+        # a custom star names module without the batch functions, they are loops over its functions
+
+        def star_name_format_many(star_names, key=None):
+            """ The batch version of star_name_format, see autostar.config.default_star_names."""
+            if hasattr(star_names, "tolist"):
+                star_names = star_names.tolist()
+            formatted_names = []
+            errors = []
+            for star_name in star_names:
+                try:
+                    formatted_names.append(star_name_format(str(star_name), key=key))
+                except Exception as error:
+                    formatted_names.append(None)
+                    errors.append(error)
+                else:
+                    errors.append(None)
+            return formatted_names, errors
+
+        def string_names_many(hypatia_names):
+            """ The batch version of StringStarName, see autostar.config.default_star_names."""
+            string_names_found = []
+            errors = []
+            for hypatia_name in hypatia_names:
+                try:
+                    string_names_found.append(StringStarName(hypatia_name).string_name)
+                except Exception as error:
+                    string_names_found.append(None)
+                    errors.append(error)
+                else:
+                    errors.append(None)
+            return string_names_found, errors
+from autostar.config.default_star_names import StarNameCache
 
 try:
     from ref.ref import star_names_dir
@@ -26,60 +66,195 @@ autostar_dir = os.path.dirname(config_dir)
 packages_dir = os.path.dirname(autostar_dir)
 
 """
-Looking for a configuration toml file (user.toml), or creating one from the default. 
+Looking for a configuration toml file (user.toml), or creating one from the default.
 """
 user_toml_ref = os.path.join(star_names_dir, "user.toml")
 user_toml_local = os.path.join(config_dir, "user.toml")
 user_toml_default = os.path.join(config_dir, "default.toml")
-# If no user.toml file is found, copy the default.toml to be written
-default_config = toml.load(user_toml_default)
-if os.path.exists(user_toml_ref):
-    # First look for a user.toml file installed in a package call "ref"
-    user_toml = user_toml_ref
-elif os.path.exists(os.path.join(config_dir, "user.toml")):
-    # Then look for a user.toml file in the config directory
-    user_toml = user_toml_local
-else:
-    # use location of the autostar package
-    reference_data_dir = os.path.join(autostar_dir, "reference")
-    default_config['reference_data_dir'] = reference_data_dir
-    # save the default config to the config directory
-    with open(user_toml_local, 'w') as f:
-        toml.dump(default_config, f)
-    user_toml = user_toml_local
 
-# Load the user.toml file
-user_config = toml.load(user_toml)
+# reference files, the config key for the file name of each, these are joined to the reference data directory
+reference_filename_keys = {
+    'sb_main_ref_filename': 'sb_main_ref_filename',
+    'sb_save_filename': 'sb_save_filename',
+    'sb_save_coord_filename': 'sb_save_coord_filename',
+    'sb_ref_filename': 'sb_ref_filename',
+    'sb_ref_db_filename': 'sb_ref_db_filename',
+    'sb_not_found_filename': 'sb_not_found_filename',
+    'tic_ref_filename': 'tic_ref_filename',
+    'annoying_names_filename': 'annoying_names_filename',
+    'popular_names_filename': 'popular_names_filename',
+    'exoplanet_archive_filename': 'exoplanet_archive_filename',
+}
+# reference files with a fixed file name
+reference_filenames = {
+    'sb_bad_star_name_ignore_filename': "bad_starname_ignore.csv",
+}
+# order does not matter, this is for contains value checking
+set_config_keys = {'sb_desired_names', 'nea_exo_star_name_columns', 'nea_might_be_zero',
+                   'nea_unphysical_if_zero_params'}
+# order matters for nea_requested_data_types_default
+list_config_keys = {'nea_requested_data_types_default'}
+# the attributes of AutostarConfig that are not values made from the config
+config_state_names = {'user_toml_default', 'user_toml_ref', 'user_toml_local', '_default_config', '_user_config',
+                      '_user_toml'}
+
+
+class AutostarConfig:
+    """
+    The autostar configuration, read from the user.toml file the first time that a value is used.
+
+    Importing autostar does not read or write any files. The user.toml file is found, or written from
+    default.toml, when the first config value is requested. The reference data directory is made when
+    the first reference file path is requested. Values are stored as attributes after they are first made,
+    i.e. config.ref_dir, config.sb_ref_filename, or config.sb_desired_names.
+    """
+    def __init__(self, user_toml_default=user_toml_default, user_toml_ref=user_toml_ref,
+                 user_toml_local=user_toml_local):
+        self.user_toml_default = user_toml_default
+        self.user_toml_ref = user_toml_ref
+        self.user_toml_local = user_toml_local
+        self._default_config = None
+        self._user_config = None
+        self._user_toml = None
+
+    def load(self):
+        # toml is imported on first use, it is not needed to import autostar
+        import toml
+        if star_names_module == "autostar.config.default_star_names":
+            print("Using the Default Star Names")
+        # If no user.toml file is found, copy the default.toml to be written
+        default_config = toml.load(self.user_toml_default)
+        if os.path.exists(self.user_toml_ref):
+            # First look for a user.toml file installed in a package call "ref"
+            user_toml = self.user_toml_ref
+        elif os.path.exists(self.user_toml_local):
+            # Then look for a user.toml file in the config directory
+            user_toml = self.user_toml_local
+        else:
+            # use location of the autostar package
+            reference_data_dir = os.path.join(autostar_dir, "reference")
+            default_config['reference_data_dir'] = reference_data_dir
+            # save the default config to the config directory
+            with open(self.user_toml_local, 'w') as f:
+                toml.dump(default_config, f)
+            user_toml = self.user_toml_local
+        # Load the user.toml file
+        self._user_config = toml.load(user_toml)
+        self._default_config = default_config
+        self._user_toml = user_toml
+        # the star name cache was made at import time with the default size
+        star_name_format.resize(self.get('star_name_cache_size'))
+
+    @property
+    def default_config(self):
+        if self._default_config is None:
+            self.load()
+        return self._default_config
+
+    @property
+    def user_config(self):
+        if self._user_config is None:
+            self.load()
+        return self._user_config
+
+    @property
+    def user_toml(self):
+        if self._user_toml is None:
+            self.load()
+        return self._user_toml
+
+    def get(self, key):
+        """if the user config file does not have all the keys, use the default config"""
+        if key in self.user_config.keys():
+            return self.user_config[key]
+        else:
+            return self.default_config[key]
 
-# set the file paths for import in other files
-ref_dir = user_config['reference_data_dir']
-if not os.path.exists(ref_dir):
-    os.mkdir(ref_dir)
+    def set(self, key, value):
+        """
+        Set a config value for this process only, the user.toml file is not changed.
+        The values made from the config, i.e. the reference file paths, are made again on next use.
+        """
+        self.user_config[key] = value
+        if key == 'star_name_cache_size':
+            star_name_format.resize(value)
+        for name in list(self.__dict__.keys()):
+            if name not in config_state_names:
+                del self.__dict__[name]
+
+    def __getattr__(self, name):
+        # only called for attributes that have not been set yet, each value is set as an attribute when it is made
+        if name == 'ref_dir':
+            value = self.user_config['reference_data_dir']
+            if not os.path.exists(value):
+                os.mkdir(value)
+        elif name in reference_filename_keys:
+            value = os.path.join(self.ref_dir, self.get(reference_filename_keys[name]))
+        elif name in reference_filenames:
+            value = os.path.join(self.ref_dir, reference_filenames[name])
+        elif name in set_config_keys:
+            value = set(self.get(name))
+        elif name in list_config_keys:
+            value = self.get(name)
+        else:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        setattr(self, name, value)
+        return value
+
+    def reset(self):
+        """ Forget the loaded config and the values made from it, the config is read again on next use."""
+        user_toml_paths = self.user_toml_default, self.user_toml_ref, self.user_toml_local
+        self.__dict__.clear()
+        self.__init__(*user_toml_paths)
+
+
+config = AutostarConfig()
 
 
 def get_config_value(key):
     """if the user config file does not have all the keys, use the default config"""
-    if key in user_config.keys():
-        return user_config[key]
-    else:
-        return default_config[key]
-
-
-# reference files name
-sb_bad_star_name_ignore_filename = os.path.join(ref_dir, "bad_starname_ignore.csv")
-sb_main_ref_filename = os.path.join(ref_dir, get_config_value('sb_main_ref_filename'))
-sb_save_filename = os.path.join(ref_dir, get_config_value('sb_save_filename'))
-sb_save_coord_filename = os.path.join(ref_dir, get_config_value('sb_save_coord_filename'))
-sb_ref_filename = os.path.join(ref_dir, get_config_value('sb_ref_filename'))
-tic_ref_filename = os.path.join(ref_dir, get_config_value('tic_ref_filename'))
-annoying_names_filename = os.path.join(ref_dir, get_config_value("annoying_names_filename"))
-popular_names_filename = os.path.join(ref_dir, get_config_value("popular_names_filename"))
-exoplanet_archive_filename = os.path.join(ref_dir, get_config_value("exoplanet_archive_filename"))
+    return config.get(key)
 
-# order does not matter, this is for contains value checking
-sb_desired_names = set(get_config_value('sb_desired_names'))
-nea_exo_star_name_columns = set(get_config_value('nea_exo_star_name_columns'))
-nea_might_be_zero = set(get_config_value('nea_might_be_zero'))
-nea_unphysical_if_zero_params = set(get_config_value('nea_unphysical_if_zero_params'))
-# order matters for nea_requested_data_types_default
-nea_requested_data_types_default = get_config_value('nea_requested_data_types_default')
+
+# star names are parsed over and over when reference data is loaded, the cached version is used everywhere.
+# Parsing a name does not read the config, the cache has star_name_cache_size from default.toml until the config is
+# loaded, then it is resized to the configured star_name_cache_size.
+default_star_name_cache_size = 100000
+star_name_format = StarNameCache(star_name_format, maxsize=default_star_name_cache_size)
+
+# made on first use by star_names_fingerprint
+star_names_digest = None
+
+
+def star_names_fingerprint():
+    """
+    The parsed reference data (see autostar.ref_snapshot) and the hypatia handles depend on the star names module and
+    its star_name_preference, this fingerprint changes when either of them is edited.
+
+    :return: bytes - a 16 byte digest of the star names module's name, its source file, and star_name_preference.
+    """
+    global star_names_digest
+    if star_names_digest is None:
+        star_names = importlib.import_module(star_names_module)
+        digest = hashlib.blake2b(star_names_module.encode("utf-8"), digest_size=16)
+        source_file = getattr(star_names, "__file__", None)
+        if source_file is not None:
+            with open(source_file, 'rb') as f:
+                digest.update(f.read())
+        digest.update("|".join(star_names.star_name_preference).encode("utf-8"))
+        star_names_digest = digest.digest()
+    return star_names_digest
+
+# the names that were module level variables, they are now read from the config object on first use
+config_names = {'default_config', 'user_config', 'user_toml', 'ref_dir'} | set(reference_filename_keys) \
+               | set(reference_filenames) | set_config_keys | list_config_keys
+
+
+def __getattr__(name):
+    if name in config_names:
+        return getattr(config, name)
+    if name == "star_name_preference":
+        star_name_preference = importlib.import_module(star_names_module).star_name_preference
+        globals()["star_name_preference"] = star_name_preference
+        return star_name_preference
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
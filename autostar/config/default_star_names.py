@@ -1,32 +1,15 @@
 import os
-from collections import namedtuple
+import re
+import threading
+from collections import namedtuple, OrderedDict
 
 
-print("Using the Default Star Names")
 # the directory the contains this file
 star_names_dir = os.path.dirname(os.path.realpath(__file__))
 # this is the default that is used if the default_star_names.py file is not found for a given installation
 star_letters = {"a", "b", "c", "d", 'e', "f", 'g', 'h', 'i', "s", "l", "n", "p"}
 double_star_letters = {'ab', 'bc', "bb"}
 
-single_part_star_names = {"hip", "hd", "hr", "ltt", "hic", "gj", "gaia", "gaia dr1", "gaia dr2", 'gaia dr3',
-                          "[bhm2000]", "[bsd96]", "gv", "cvs", "mfjsh2", "ls", 'lhs',
-                          'gcirs', 'sh2', 'pismis', 'plx', 'sb', 'pwm', '[s84]', "ic", "wasp", "ross", "koi",
-                          "kepler", "hii", "corot", "tres", 'kic', "marvels", 'epic', 'azv', "bds", "k2", "kelt", 'toi',
-                          "gl", 'qatar', "sweeps", "wts", "ph", "ngts", "trappist", "wolf", 'pds', "roxs",
-                          "mascara", 'chxr', 'tap', "nsvs", "pots", "csv", "css", 'dmpp', 'ogle-tr',
-                          "uscoctio",  "usco ctio", "usco", "wendelstein", "tic", "cfhtwir-oph", "yses", "coconuts",
-                          "gpx", "nltt", "bpm"}
-multi_part_star_names = {"bd", "cod", 'cd',  "cpd", "tyc", "g", "lp", "gsc", "ucac", 'ntts', 'iras', "htr",
-                         "l", "ag", 'csi', "wd", 'lupus', 'bps cs', "bps bs", "bpscs", 'bpsbs', "cs", 'bs'}
-string_names = {"2mass", "2masx", "apm", "asas", "bas", 'cl*berkeley', 'cl*collinder', 'cl*ic4651', 'cl*melotte',
-                'clmelotte', 'cl melotte', 'cl*terzan', 'cl*trumpler', "ges", 'cmd', 'cl*ic', "sds", "hat", "hats",
-                'v*', "*", "**", 'wise', 'ogle', "xo", "pmc", "wds", "ids", 'moa', "denis", "psr", 'kmt', "name", 'tcp',
-                'em*', 'ukirt', "mxb", "vhs", "lspm", 'ngc', 'cl* ngc', '2massw', "rx", "psr", "he", "gaia", "2massi"}
-
-star_name_types = single_part_star_names | multi_part_star_names | string_names
-names_that_are_listed_without_a_space_sometimes = {'bd', "cd"}
-
 asterisk_names = {'gam', 'rho', 'ome', "tau", 'kap', 'ups', 'bet', "phi", 'omi', "psi", "eps", 'iot', "alf", "oph",
                   "ab", 'ci', 'dp', 'ct', 'dh', 'uz', "yz", "nu", "mu", "rr", 'xi', 'nn', "v830", 'de', 'ny', 'ds',
                   "hn", 'fu', "gu", 'gq', "uz", 'hw', 'hu', 'mic'}
@@ -35,25 +18,293 @@ asterisk_name_types = {'v*', "*", "**", 'em*', "Name"}
 
 StarName = namedtuple("StarName", "type id")
 
-# for sorting.py
-star_name_preference = ["hip", 'gaia dr3', 'gaia dr2', 'gaia dr1', "hd", 'bd', "2mass", "tyc"]
-star_name_preference.extend([star_name for star_name in sorted(star_name_types)
-                             if star_name not in star_name_preference[:]])
+
+def moa_format(stripped_of_name_type):
+    split_name = stripped_of_name_type.split("-")
+    if len(split_name) == 3:
+        year, blg, number = split_name
+        if blg[0] == "{":
+            moa_string = year + "-" + blg[1:-1].upper() + "-" + number.strip()
+        else:
+            moa_string = year + "-" + blg.upper() + "-" + number.strip()
+        if moa_string[-1] == "l":
+            moa_string = moa_string[:-1].strip() + " L"
+        moa_string = " " + moa_string
+    elif len(split_name) == 2:
+        thing, number = split_name
+        moa_string = thing + "-"
+        if "l" == number[-1]:
+            moa_string += number[:-1].strip() + " {L}"
+        else:
+            moa_string += number.upper()
+        moa_string = "-" + moa_string
+    else:
+        raise TypeError("MOA string not of the expected format for parsing: " + stripped_of_name_type)
+    return moa_string
+
+
+def kmt_format(stripped_of_name_type):
+    if stripped_of_name_type[-1] == "l":
+        return stripped_of_name_type[:-1]
+    return stripped_of_name_type
+
+
+def ogle_format(stripped_of_name_type):
+    if stripped_of_name_type[:2] == 'tr':
+        return stripped_of_name_type.replace("-", ' ')
+    return stripped_of_name_type
+
+
+def two_mass_format(stripped_of_name_type):
+    if stripped_of_name_type[0] != "j":
+        return "j" + stripped_of_name_type
+    return stripped_of_name_type
+
+
+"""
+The star name grammar, a table with one row per star name type.
+
+family: the grammar used to parse the star's id, see name_grammar_patterns.
+    'single' - an integer and an optional star letter, i.e. (2310883, "a") or (2310883,)
+    'multi' - two or three integers delimited by a space, '-', or '+', i.e. (1234, 567, 1) for TYC 1234-567-1
+    'signed' - the declination zone's sign, the zone, and a number, i.e. ('-', 13, 872) for BD-13 872
+    'signed_no_space' - 'signed' names that are sometimes listed without a space, i.e. BD-13872
+    'string' - the star's id is kept as a string, i.e. 'j16361119+4636479' for 2MASS J16361119+4636479
+name_type: the name type of the formatted StarName, None uses the name type of the row.
+transform: a function that finishes formatting a 'string' id, None keeps the id as it was parsed.
+
+Adding a catalog is adding a row to this table, the sets of name types below are made from this table.
+"""
+NameGrammar = namedtuple("NameGrammar", "family name_type transform", defaults=(None, None))
+single_part = NameGrammar("single")
+multi_part = NameGrammar("multi")
+string_part = NameGrammar("string")
+
+star_name_grammar = {
+    # single part star names
+    "hip": single_part, "hd": single_part, "hr": single_part, "ltt": single_part, "hic": single_part,
+    "gj": single_part, "gaia": single_part, "gaia dr1": single_part, "gaia dr2": single_part,
+    "gaia dr3": single_part, "[bhm2000]": single_part, "[bsd96]": single_part, "gv": single_part,
+    "cvs": single_part, "mfjsh2": single_part, "ls": single_part, "lhs": single_part, "gcirs": single_part,
+    "sh2": single_part, "pismis": single_part, "plx": single_part, "sb": single_part, "pwm": single_part,
+    "[s84]": single_part, "ic": single_part, "wasp": single_part, "ross": single_part, "koi": single_part,
+    "kepler": single_part, "hii": single_part, "corot": single_part, "tres": single_part, "kic": single_part,
+    "marvels": single_part, "epic": single_part, "azv": single_part, "bds": single_part, "k2": single_part,
+    "kelt": single_part, "toi": single_part, "gl": single_part, "qatar": single_part, "sweeps": single_part,
+    "wts": single_part, "ph": single_part, "ngts": single_part, "trappist": single_part, "wolf": single_part,
+    "pds": single_part, "roxs": single_part, "mascara": single_part, "chxr": single_part, "tap": single_part,
+    "nsvs": single_part, "pots": single_part, "csv": single_part, "css": single_part, "dmpp": single_part,
+    "ogle-tr": single_part, "uscoctio": single_part, "usco ctio": NameGrammar("single", name_type="uscoctio"),
+    "usco": NameGrammar("single", name_type="uscoctio"), "wendelstein": single_part, "tic": single_part,
+    "cfhtwir-oph": single_part, "yses": single_part, "coconuts": single_part, "gpx": single_part,
+    "nltt": single_part, "bpm": single_part,
+    # multi part star names
+    "bd": NameGrammar("signed_no_space"), "cd": NameGrammar("signed_no_space"), "ag": NameGrammar("signed"),
+    "csi": NameGrammar("signed"), "cod": multi_part, "cpd": multi_part, "tyc": multi_part, "g": multi_part,
+    "lp": multi_part, "gsc": multi_part, "ucac": multi_part, "ntts": multi_part, "iras": multi_part,
+    "htr": multi_part, "l": multi_part, "wd": multi_part, "lupus": multi_part, "bps cs": multi_part,
+    "bps bs": multi_part, "bpscs": NameGrammar("multi", name_type="bps cs"),
+    "bpsbs": NameGrammar("multi", name_type="bps bs"), "cs": NameGrammar("multi", name_type="bps cs"),
+    "bs": NameGrammar("multi", name_type="bps bs"),
+    # string star names
+    "2mass": NameGrammar("string", transform=two_mass_format), "2masx": string_part, "apm": string_part,
+    "asas": string_part, "bas": string_part, "cl*berkeley": string_part, "cl*collinder": string_part,
+    "cl*ic4651": string_part, "cl*melotte": string_part, "clmelotte": string_part, "cl melotte": string_part,
+    "cl*terzan": string_part, "cl*trumpler": string_part, "ges": string_part, "cmd": string_part,
+    "cl*ic": string_part, "sds": string_part, "hat": string_part, "hats": string_part, "v*": string_part,
+    "*": string_part, "**": string_part, "wise": string_part, "ogle": NameGrammar("string", transform=ogle_format),
+    "xo": string_part, "pmc": string_part, "wds": string_part, "ids": string_part,
+    "moa": NameGrammar("string", transform=moa_format), "denis": string_part, "psr": string_part,
+    "kmt": NameGrammar("string", transform=kmt_format), "name": string_part, "tcp": string_part,
+    "em*": string_part, "ukirt": string_part, "mxb": string_part, "vhs": string_part, "lspm": string_part,
+    "ngc": string_part, "cl* ngc": string_part, "2massw": string_part, "rx": string_part, "he": string_part,
+    "2massi": string_part,
+}
+
+single_part_star_names = {name_type for name_type, grammar in star_name_grammar.items() if grammar.family == "single"}
+multi_part_star_names = {name_type for name_type, grammar in star_name_grammar.items()
+                         if grammar.family in {"multi", "signed", "signed_no_space"}}
+string_names = {name_type for name_type, grammar in star_name_grammar.items() if grammar.family == "string"}
+
+star_name_types = set(star_name_grammar.keys())
+signed_star_names = {name_type for name_type, grammar in star_name_grammar.items()
+                     if grammar.family in {"signed", "signed_no_space"}}
+names_that_are_listed_without_a_space_sometimes = {name_type for name_type, grammar in star_name_grammar.items()
+                                                   if grammar.family == "signed_no_space"}
+
+
+def formatted_name_type(name_type):
+    # the name type of the formatted StarName, i.e. 'usco' names are formatted as 'uscoctio'
+    grammar = star_name_grammar.get(name_type)
+    if grammar is None or grammar.name_type is None:
+        return name_type
+    return grammar.name_type
+
+
+"""
+The pattern for each grammar family, compiled when the first name of the family is parsed. A pattern is matched to
+the part of a lowercase star name that comes after the name type. Names that do not match are parsed by the more
+lenient functions, one_part_star_names_format, multi_part_star_names_format, and string_star_name_format.
+"""
+star_letters_pattern = "|".join(re.escape(star_letter) for star_letter
+                                in sorted(double_star_letters | star_letters, key=len, reverse=True))
+name_grammar_patterns = {
+    "single": r"-?\s*(?:(\d+\.\d+)|(\d+))(?:\s*(" + star_letters_pattern + r")|\s*)",
+    "multi": r"\s*([-+]?\d+)[-+ ]+(\d+)(?:[-+ ]+(\d+))?(?:\s*(" + star_letters_pattern + r"))?\s*",
+    "signed": r"\s*([-+]?)\s*(\d+) +(\d+)(?:\s*(" + star_letters_pattern + r"))?\s*",
+    "signed_no_space": r"\s*([-+]?)(?:\s*(\d+) +(\d+)(?:\s*(" + star_letters_pattern + r"))?|" +
+                       r"(\d\d)(\d+)(" + star_letters_pattern + r")?)\s*",
+    "string": r"(?s)\s*(?:-|(?![\s-]))\s*(\S(?:.*\S)?)\s*",
+}
+
+
+def single_part_grammar_id(decimal, number, star_letter):
+    if decimal is None:
+        if star_letter is None:
+            return int(number),
+        return int(number), star_letter
+    if star_letter is None:
+        return decimal
+    return decimal, star_letter
+
+
+def multi_part_grammar_id(first, second, third, star_letter):
+    star_id = [int(first), int(second)]
+    if third is not None:
+        star_id.append(int(third))
+    if star_letter is not None:
+        star_id.append(star_letter)
+    return tuple(star_id)
+
+
+def signed_grammar_id(sign, zone, number, star_letter, no_space_zone=None, no_space_number=None,
+                      no_space_star_letter=None):
+    if zone is None:
+        zone, number, star_letter = no_space_zone, no_space_number, no_space_star_letter
+    if star_letter is None:
+        return sign or "+", int(zone), int(number)
+    return sign or "+", int(zone), int(number), star_letter
+
+
+def string_grammar_id(stripped_of_name_type):
+    return stripped_of_name_type
+
+
+grammar_id_functions = {"single": single_part_grammar_id, "multi": multi_part_grammar_id,
+                        "signed": signed_grammar_id, "signed_no_space": signed_grammar_id,
+                        "string": string_grammar_id}
+
+
+# the compiled pattern of each grammar family, shared by the parsers of the family's name types
+grammar_family_patterns = {}
+
+
+def make_grammar_parser(name_type):
+    """
+    Make the parser for one row of the star_name_grammar.
+
+    :return: a function that takes a lowercase star name and returns a StarName, or None when the name does not
+             fit the grammar.
+    """
+    grammar = star_name_grammar[name_type]
+    # each family's pattern is compiled once, for the first name type of the family that is parsed
+    pattern = grammar_family_patterns.get(grammar.family)
+    if pattern is None:
+        pattern = grammar_family_patterns[grammar.family] = re.compile(name_grammar_patterns[grammar.family])
+    grammar_id = grammar_id_functions[grammar.family]
+    transform = grammar.transform
+    star_name_type = grammar.name_type or name_type
+    prefix_len = len(name_type)
+
+    def grammar_parser(star_name_lower):
+        if not star_name_lower.startswith(name_type):
+            return None
+        match = pattern.fullmatch(star_name_lower, prefix_len)
+        if match is None:
+            return None
+        star_id = grammar_id(*match.groups())
+        if transform is not None:
+            star_id = transform(star_id)
+        return StarName(star_name_type, star_id)
+    return grammar_parser
+
+
+class GrammarParsers(dict):
+    """
+    The grammar parser for each name type, made the first time that a name of that type is parsed.
+    Name types that are not in the star_name_grammar have no parser, the value for those is None.
+    """
+    def __missing__(self, name_type):
+        if name_type not in star_name_grammar:
+            return None
+        grammar_parser = self[name_type] = make_grammar_parser(name_type)
+        return grammar_parser
+
+
+grammar_parsers = GrammarParsers()
+
+
+def grammar_star_name_format(star_name_lower, name_type):
+    """
+    Parse a lowercase star name with a single match of the star_name_grammar pattern for its name type.
+
+    :return: StarName or None when the name does not fit the grammar.
+    """
+    grammar_parser = grammar_parsers[name_type]
+    if grammar_parser is None:
+        return None
+    return grammar_parser(star_name_lower)
+
+
+# for sorting.py, star_name_preference is these name types followed by the rest of the star_name_types in sorted order
+star_name_preference_first = ["hip", 'gaia dr3', 'gaia dr2', 'gaia dr1', "hd", 'bd', "2mass", "tyc"]
+
+
+def make_star_name_preference():
+    star_name_preference = list(star_name_preference_first)
+    star_name_preference.extend([star_name for star_name in sorted(star_name_types)
+                                 if star_name not in star_name_preference_first])
+    return star_name_preference
+
+
+def __getattr__(name):
+    # star_name_preference is made the first time it is used, not when this module is imported
+    if name == "star_name_preference":
+        star_name_preference = globals()["star_name_preference"] = make_star_name_preference()
+        return star_name_preference
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def make_name_type_trie(name_types):
+    """
+    Build a prefix trie for the star name types. Each node is a dictionary that maps the next character to a child
+    node. A node that completes a name type stores that name type under the key None.
+    """
+    trie = {}
+    for name_type in name_types:
+        node = trie
+        for char in name_type:
+            node = node.setdefault(char, {})
+        node[None] = name_type
+    return trie
+
+
+name_type_trie = make_name_type_trie(star_name_types)
 
 
 def optimal_star_name(star_name_lower):
-    # find the star's name_type
-    try:
-        name_type, *possible_name_types = [star_name_type for star_name_type in star_name_types
-                                           if star_name_type == star_name_lower[:len(star_name_type)]]
-    except ValueError:
+    # find the star's name_type, the longest name_type that is a prefix of the star name
+    name_type = None
+    node = name_type_trie
+    for char in star_name_lower:
+        node = node.get(char)
+        if node is None:
+            break
+        # This is a catch to make sure GL stars are not classified as G stars, the longest match is kept
+        if None in node:
+            name_type = node[None]
+    if name_type is None:
         raise ValueError(F"No star names type matches for: {star_name_lower}")
-    # This is a catch to make sure GL stars are not classified as G stars
-    name_len = len(name_type)
-    for possible_name_type in possible_name_types:
-        if name_len < len(possible_name_type):
-            name_len = len(possible_name_type)
-            name_type = possible_name_type
     return name_type
 
 
@@ -94,9 +345,7 @@ def one_part_star_names_format(star_name_lower, name_key):
             formatted_name = (int(striped_name.replace(found_star_letter, "")), found_star_letter)
         except ValueError:
             formatted_name = (striped_name.strip().replace(found_star_letter, ""), found_star_letter)
-    if name_key in {"usco ctio", "usco"}:
-        name_key = "uscoctio"
-    return StarName(name_key, formatted_name)
+    return StarName(formatted_name_type(name_key), formatted_name)
 
 
 def split_no_space(a_string):
@@ -112,17 +361,12 @@ def split_no_space(a_string):
 def multi_part_star_names_format(star_name_lower, name_key):
     # format example ((-13, 0872) ,"a") or (((-13, 0872)))
     striped_name = star_name_lower.replace(name_key, "", 1).strip()
-    if name_key in {"cs", "bpscs"}:
-        name_type = 'bps cs'
-    elif name_key in {"bs", 'bpsbs'}:
-        name_type = 'bps bs'
-    else:
-        name_type = name_key
+    name_type = formatted_name_type(name_key)
     # check for star letters, i.e. 'a', 'b', 'c', and 'd'
     striped_name, found_star_letter = star_letter_check(striped_name)
     # plus minus zero star names check
     string_vector = []
-    if name_key in {"bd", "ag", 'cd', "csi"}:
+    if name_key in signed_star_names:
         if striped_name[0] == "-":
             string_vector.append("-")
             striped_name = striped_name[1:]
@@ -165,30 +409,6 @@ def multi_part_star_names_format(star_name_lower, name_key):
     return StarName(name_type, formatted_name)
 
 
-def moa_format(stripped_of_name_type):
-    split_name = stripped_of_name_type.split("-")
-    if len(split_name) == 3:
-        year, blg, number = split_name
-        if blg[0] == "{":
-            moa_string = year + "-" + blg[1:-1].upper() + "-" + number.strip()
-        else:
-            moa_string = year + "-" + blg.upper() + "-" + number.strip()
-        if moa_string[-1] == "l":
-            moa_string = moa_string[:-1].strip() + " L"
-        moa_string = " " + moa_string
-    elif len(split_name) == 2:
-        thing, number = split_name
-        moa_string = thing + "-"
-        if "l" == number[-1]:
-            moa_string += number[:-1].strip() + " {L}"
-        else:
-            moa_string += number.upper()
-        moa_string = "-" + moa_string
-    else:
-        raise TypeError("MOA string not of the expected format for parsing: " + stripped_of_name_type)
-    return moa_string
-
-
 def string_star_name_format(star_name_lower, name_key):
     if name_key == star_name_lower[:len(name_key)]:
         stripped_of_name_type = star_name_lower[len(name_key):].strip()
@@ -197,19 +417,18 @@ def string_star_name_format(star_name_lower, name_key):
     if "-" == stripped_of_name_type[0]:
         stripped_of_name_type = stripped_of_name_type[1:]
     stripped_of_name_type = stripped_of_name_type.strip()
-    if name_key == "moa":
-        stripped_of_name_type = moa_format(stripped_of_name_type)
-    elif name_key == 'kmt' and stripped_of_name_type[-1] == "l":
-        stripped_of_name_type = stripped_of_name_type[:-1]
-    elif name_key == "ogle":
-        if stripped_of_name_type[:2] == 'tr':
-            stripped_of_name_type = stripped_of_name_type.replace("-", ' ')
-    elif name_key == "2mass" and stripped_of_name_type[0] != "j":
-        stripped_of_name_type = "j" + stripped_of_name_type
+    grammar = star_name_grammar.get(name_key)
+    if grammar is not None and grammar.transform is not None:
+        stripped_of_name_type = grammar.transform(stripped_of_name_type)
     return StarName(name_key, stripped_of_name_type)
 
 
-def star_name_format(star_name, key=None):
+def prepare_star_name(star_name, key=None):
+    """
+    Find the name type of a star name and apply the catalog specific catches to the lowercase star name.
+
+    :return: (star_name_lower, name_type)
+    """
     star_name_lower = str(star_name).lower()
     if key is None:
         name_type = optimal_star_name(star_name_lower)
@@ -241,6 +460,10 @@ def star_name_format(star_name, key=None):
             star_name_lower = 'j' + star_name_lower
         elif key == 'hd' and "." in star_name_lower:
             star_name_lower, _ = star_name_lower.split('.')
+    return star_name_lower, name_type
+
+
+def lenient_star_name_format(star_name_lower, name_type, star_name):
     # test if the name is a single number or an ordered tuple
     if name_type in single_part_star_names:
         formatted_name = one_part_star_names_format(star_name_lower, name_type)
@@ -254,6 +477,168 @@ def star_name_format(star_name, key=None):
     return formatted_name
 
 
+def star_name_format(star_name, key=None):
+    star_name_lower, name_type = prepare_star_name(star_name, key=key)
+    # most names are parsed with a single match to the star name grammar
+    grammar_parser = grammar_parsers[name_type]
+    formatted_name = None if grammar_parser is None else grammar_parser(star_name_lower)
+    if formatted_name is None:
+        formatted_name = lenient_star_name_format(star_name_lower, name_type, star_name)
+    return formatted_name
+
+
+def star_name_format_many(star_names, key=None):
+    """
+    Format many star names at once, the batch version of star_name_format.
+
+    Names are grouped by name type so that each name is classified once and the parser of each name type is found
+    once, the names are then parsed one at a time. There is no vectorized path, one regex pass over all the names of
+    a group was timed at about the speed of the parser called for each name.
+    A bad name does not stop the batch, the exception for that name is returned in the errors list.
+
+    :param star_names: iterable of str star names, a numpy string array is accepted and converted to a list.
+    :param key: str - the name type for all the star_names, if None the name type is found for each name.
+    :return: (formatted_names, errors) - two lists aligned with star_names. formatted_names[i] is a StarName or None
+             when errors[i] is the exception raised for star_names[i], errors[i] is None for names that parsed.
+    """
+    if hasattr(star_names, "tolist"):
+        star_names = star_names.tolist()
+    star_names = [str(star_name) for star_name in star_names]
+    formatted_names = [None] * len(star_names)
+    errors = [None] * len(star_names)
+    # group the index of each name by its name type
+    star_names_lower = [None] * len(star_names)
+    indexes_by_type = {}
+    for index, star_name in enumerate(star_names):
+        try:
+            star_names_lower[index], name_type = prepare_star_name(star_name, key=key)
+        except Exception as error:
+            errors[index] = error
+            continue
+        if name_type in indexes_by_type:
+            indexes_by_type[name_type].append(index)
+        else:
+            indexes_by_type[name_type] = [index]
+    for name_type, indexes in indexes_by_type.items():
+        grammar_parser = grammar_parsers[name_type]
+        for index in indexes:
+            star_name_lower = star_names_lower[index]
+            try:
+                formatted_name = None if grammar_parser is None else grammar_parser(star_name_lower)
+                if formatted_name is None:
+                    formatted_name = lenient_star_name_format(star_name_lower, name_type, star_names[index])
+            except Exception as error:
+                errors[index] = error
+            else:
+                formatted_names[index] = formatted_name
+    return formatted_names, errors
+
+
+CacheInfo = namedtuple("CacheInfo", "hits misses evictions maxsize currsize")
+
+
+class StarNameCache:
+    """
+    A least-recently-used cache that wraps a star name formatting function, i.e. star_name_format.
+
+    Formatted StarName tuples are interned, so equal names that are requested with different strings,
+    "HD 1234" and "hd 1234", share a single StarName object. The hit, miss, and eviction counters
+    are available from cache_info().
+
+    maxsize can be a function that returns the size, it is called the first time the cache is used.
+    This keeps the configuration from being read when the cache is made at import time.
+
+    The cache is shared by the threads of a process, a lock is held while the cache is read or changed,
+    the names are formatted without it.
+    """
+    def __init__(self, format_func, maxsize=100000):
+        self.__wrapped__ = format_func
+        self.__doc__ = format_func.__doc__
+        self._maxsize = maxsize
+        self.cache = OrderedDict()
+        # maps a StarName to [the shared StarName, the number of cache entries that use it]
+        self.interned = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, star_name, key=None):
+        cache_key = (str(star_name), key)
+        with self.lock:
+            try:
+                formatted_name = self.cache[cache_key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.cache.move_to_end(cache_key)
+                return formatted_name
+        formatted_name = self.__wrapped__(star_name, key=key)
+        with self.lock:
+            if self.maxsize != 0:
+                if cache_key in self.cache:
+                    # another thread formatted this name at the same time
+                    return self.cache[cache_key]
+                formatted_name = self.intern(formatted_name)
+                self.cache[cache_key] = formatted_name
+                self.evict()
+        return formatted_name
+
+    @property
+    def maxsize(self):
+        if callable(self._maxsize):
+            self._maxsize = self._maxsize()
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        self._maxsize = maxsize
+
+    def intern(self, formatted_name):
+        try:
+            interned_record = self.interned[formatted_name]
+        except KeyError:
+            self.interned[formatted_name] = [formatted_name, 1]
+            return formatted_name
+        interned_record[1] += 1
+        return interned_record[0]
+
+    def evict(self):
+        """ Remove the least recently used names above maxsize, the lock is held."""
+        if self.maxsize is None:
+            return
+        while len(self.cache) > self.maxsize:
+            _cache_key, formatted_name = self.cache.popitem(last=False)
+            self.evictions += 1
+            interned_record = self.interned[formatted_name]
+            interned_record[1] -= 1
+            if interned_record[1] < 1:
+                del self.interned[formatted_name]
+
+    def resize(self, maxsize):
+        """ Set a new bound for the cache, None is unbounded, 0 turns off caching."""
+        with self.lock:
+            self.maxsize = maxsize
+            self.evict()
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.cache))
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        if requests == 0:
+            return 0.0
+        return self.hits / requests
+
+    def cache_clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.interned.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
 format_functions = {}
 
 def string_name(func):
@@ -909,14 +1294,19 @@ rename_dict = {"2mass": 'two_mass',
 rename_set = set(rename_dict.keys())
 
 
+def format_function_name(name_type):
+    # the key in format_functions for a name type
+    if " " in name_type:
+        name_type = name_type.replace(" ", "_")
+    if name_type in rename_set:
+        name_type = rename_dict[name_type]
+    return name_type
+
+
 class StringStarName:
     def __init__(self, hypatia_name):
         self.hypatia_name = hypatia_name
-        self.name_type = self.hypatia_name[0]
-        if " " in self.name_type:
-            self.name_type = self.name_type.replace(" ", "_")
-        if self.name_type in rename_set:
-            self.name_type = rename_dict[self.name_type]
+        self.name_type = format_function_name(self.hypatia_name[0])
         self.name_id = self.hypatia_name[1]
         self.string_name = format_functions[self.name_type](self.name_id)
 
@@ -924,6 +1314,44 @@ class StringStarName:
         return self.string_name
 
 
+def string_names_many(hypatia_names):
+    """
+    Make the string names for many hypatia names at once, the batch version of StringStarName.
+
+    :param hypatia_names: iterable of hypatia names, (name_type, star_id) tuples.
+    :return: (string_names, errors) - two lists aligned with hypatia_names. string_names[i] is None
+             when errors[i] is the exception raised for hypatia_names[i], errors[i] is None otherwise.
+    """
+    hypatia_names = list(hypatia_names)
+    string_names_found = [None] * len(hypatia_names)
+    errors = [None] * len(hypatia_names)
+    # group the index of each name by its name type, so the format function is looked up once per group
+    indexes_by_type = {}
+    for index, hypatia_name in enumerate(hypatia_names):
+        # a name that is not a (name_type, star_id) tuple is an error for that name only
+        try:
+            name_type, _star_id = hypatia_name
+            if name_type in indexes_by_type:
+                indexes_by_type[name_type].append(index)
+            else:
+                indexes_by_type[name_type] = [index]
+        except Exception as error:
+            errors[index] = error
+    for name_type, indexes in indexes_by_type.items():
+        try:
+            format_function = format_functions[format_function_name(name_type)]
+        except KeyError as error:
+            for index in indexes:
+                errors[index] = error
+            continue
+        for index in indexes:
+            try:
+                string_names_found[index] = format_function(hypatia_names[index][1])
+            except Exception as error:
+                errors[index] = error
+    return string_names_found, errors
+
+
 if __name__ == "__main__":
     test = star_name_format("2MASSI J0840424+193357")
     test2 = star_name_format("2MASS 16361119+4636479")
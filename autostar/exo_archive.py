@@ -2,16 +2,16 @@ import time
 from typing import List
 from urllib.request import urlretrieve
 
-from autostar.simbad_names import nc
+from autostar.simbad_names import get_name_correction
 from autostar.table_read import ClassyReader
 from autostar.simbad_query import SimbadLib, StarDict, handle_to_simbad, simbad_to_handle, get_single_name_data, \
-    make_hypatia_handle
-from autostar.config.datapaths import star_letters, star_name_format, asterisk_names, asterisk_name_types, \
-    StringStarName, exoplanet_archive_filename, nea_exo_star_name_columns, nea_might_be_zero, \
-    nea_unphysical_if_zero_params, nea_requested_data_types_default
+    make_hypatia_handle, shared_simbad_lib
+from autostar.config.datapaths import config, star_letters, star_name_format, asterisk_names, \
+    asterisk_name_types, StringStarName
 
 
 def patch_for_exo_org_name(host_name_key):
+    nc = get_name_correction()
     exo_org_name = host_name_key.replace("_", " ")
     if exo_org_name.lower() in nc.annoying_names:
         exo_org_name = nc.sb_names[exo_org_name.lower()]
@@ -43,9 +43,9 @@ def patch_for_exo_org_name(host_name_key):
 class ExoPlanet:
     def __init__(self, exo_data):
         [setattr(self, planet_param, exo_data[planet_param])
-         for planet_param in set(exo_data.keys()) - nea_exo_star_name_columns
+         for planet_param in set(exo_data.keys()) - config.nea_exo_star_name_columns
          if exo_data[planet_param] != ""
-         and not (exo_data[planet_param] == 0 and planet_param in nea_unphysical_if_zero_params)
+         and not (exo_data[planet_param] == 0 and planet_param in config.nea_unphysical_if_zero_params)
          and not (planet_param == "pl_orbeccen" and exo_data[planet_param] == 0 and exo_data["pl_orbeccen"] == 0)]
         self.planet_params = set(self.__dict__.keys())
 
@@ -62,7 +62,7 @@ class ExoPlanetHost:
         # extract the star's names from the Exoplanet class and add those attributes to this class
         star_name_types = set()
         for planet_letter in self.planet_letters:
-            star_name_types = nea_exo_star_name_columns & set(exo_planets_dict[planet_letter].keys())
+            star_name_types = config.nea_exo_star_name_columns & set(exo_planets_dict[planet_letter].keys())
             # these names are the small across all the exoplanet letters.
             break
         self.star_names_dict = StarDict()
@@ -101,15 +101,15 @@ class AllExoPlanets:
                  ref_star_names_from_scratch: bool = True,
                  simbad_go_fast: bool = False):
         if simbad_lib is None:
-            self.simbad_lib = SimbadLib(verbose=verbose, go_fast=simbad_go_fast)
+            self.simbad_lib = shared_simbad_lib(verbose=verbose, go_fast=simbad_go_fast)
         else:
             self.simbad_lib = simbad_lib
         if requested_data_types is None:
-            requested_data_types = nea_requested_data_types_default
+            requested_data_types = config.nea_requested_data_types_default
         self.requested_data_types = requested_data_types
         self.verbose = verbose
         self.ref_star_names_from_scratch = ref_star_names_from_scratch
-        self.exo_ref_file = exoplanet_archive_filename
+        self.exo_ref_file = config.exoplanet_archive_filename
         if refresh_data:
             if self.verbose:
                 print("  Getting the freshest exoplanet data!")
@@ -131,8 +131,10 @@ class AllExoPlanets:
         raw_exo_dict = {}
         self.exo_host_names = set()
         non_host_names = set(raw_exo.keys) - {"pl_letter"}
-        for index, star_name in list(enumerate(raw_exo.hostname)):
-            hypatia_handle, _star_names_dict = self.simbad_lib.get_star_dict(patch_for_exo_org_name(star_name))
+        # each host star is listed once for each planet, the host names are resolved together
+        host_handles = self.simbad_lib.get_star_dict_many([patch_for_exo_org_name(star_name)
+                                                           for star_name in raw_exo.hostname])
+        for index, (hypatia_handle, _star_names_dict) in list(enumerate(host_handles)):
             pl_letter = raw_exo.pl_letter[index]
             data_line_dict = {key: raw_exo.__getattribute__(key)[index] for key in non_host_names}
             if hypatia_handle in self.exo_host_names:
@@ -186,15 +188,11 @@ class AllExoPlanets:
     def load_reference_host_names(self):
         if self.verbose:
             print("  Getting Simbad names for exoplanet host stars...")
-        len_host = len(self.exo_host_names)
-        report_bin = int(len_host / 20)
-        for index, host_name in enumerate(sorted(self.exo_host_names)):
-            if self.verbose and index % report_bin == 0:
-                print("      Getting name info for star:", "%30s" % handle_to_simbad(host_name),
-                      " ", "%5s" % (index + 1), "of", "%5s" % len_host)
-            single_host = self.__getattribute__(host_name)
-            exo_star_names_dict = single_host.star_names_dict
-            hypatia_handle, star_names_dict = self.simbad_lib.get_star_dict_with_star_dict(exo_star_names_dict)
+        single_hosts = [self.__getattribute__(host_name) for host_name in sorted(self.exo_host_names)]
+        if self.verbose:
+            print(f"      Getting name info for {len(single_hosts)} stars.")
+        star_dicts = self.simbad_lib.get_star_dict_many([single_host.star_names_dict for single_host in single_hosts])
+        for single_host, (hypatia_handle, star_names_dict) in zip(single_hosts, star_dicts):
             single_host.__setattr__("hypatia_handle", hypatia_handle)
             single_host.__setattr__("star_names_dict", star_names_dict)
         if self.verbose:
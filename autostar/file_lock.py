@@ -0,0 +1,124 @@
+"""
+Multi-process safe reading and writing of the reference files.
+
+Several processes can use the same reference data directory at once. Each reference file has an advisory lock,
+a file next to it (the file name + '.lock') that is locked with fcntl.flock on Linux and macOS, or with
+msvcrt.locking on Windows. Writers hold the exclusive lock while they read the file again, combine it with their
+new data, and replace it. Readers hold a shared lock (on Windows, all locks are exclusive).
+
+Files are replaced with atomic_write: the new file is written to a temporary file in the same directory and
+moved over the old file with os.replace, so a reader sees the old file or the new file, never part of a file.
+
+file_generation() is the (modification time, size, inode) of a file. A process keeps the generation of the file
+that it read, and when it changes another process has written the file, see SimbadRef.refresh.
+"""
+import os
+import time
+import errno
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+lock_extension = ".lock"
+# the seconds that a lock is waited for on Windows before the error is raised, fcntl.flock waits without a limit
+windows_lock_timeout_seconds = 300.0
+# the lock files that are held by each thread and if they are shared, a lock that is already held is not taken again
+held_locks = threading.local()
+
+
+def file_generation(file_name):
+    """
+    :return: tuple or None - (st_mtime_ns, st_size, st_ino) of the file, None when the file does not exist.
+    """
+    try:
+        file_stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino
+
+
+def lock_fd(fd, shared):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    else:
+        # msvcrt only has exclusive locks of a byte range, the first byte is locked, see unlock_fd
+        deadline = time.monotonic() + windows_lock_timeout_seconds
+        while True:
+            os.lseek(fd, 0, os.SEEK_SET)
+            try:
+                # LK_LOCK tries again for 10 s before EDEADLOCK is raised, the lock is still held by another process
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError as error:
+                if error.errno != getattr(errno, 'EDEADLOCK', errno.EDEADLK) or time.monotonic() > deadline:
+                    raise
+
+
+def unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(file_name, shared=False):
+    """
+    Hold the advisory lock of a reference file. The lock is re-entrant in a thread, a lock that a thread already
+    holds is used as it is when it is exclusive or when a shared lock is asked for. The exclusive lock can not be
+    asked for while the thread holds the shared lock, flock would let other processes take the file in between.
+
+    :param file_name: str - the reference file, the lock file is file_name + '.lock'.
+    :param shared: bool - True for a reader's lock, many processes can hold it at once.
+    :raises RuntimeError: when the exclusive lock is asked for while the thread holds the shared lock.
+    """
+    lock_file_name = os.path.abspath(file_name) + lock_extension
+    # {lock file name: True for a shared lock}
+    thread_locks = held_locks.__dict__.setdefault('lock_file_names', {})
+    if lock_file_name in thread_locks:
+        if thread_locks[lock_file_name] and not shared:
+            raise RuntimeError(f"The exclusive lock of {file_name} was asked for while the shared lock is held, "
+                               f"release the shared lock first.")
+        yield
+        return
+    fd = os.open(lock_file_name, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        lock_fd(fd, shared)
+        # on Windows every lock is exclusive
+        thread_locks[lock_file_name] = shared and fcntl is not None
+        try:
+            yield
+        finally:
+            del thread_locks[lock_file_name]
+            unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(file_name, mode='w'):
+    """
+    Open a temporary file in the directory of file_name for writing, it replaces file_name when the block ends
+    without an error. The temporary file is removed after an error, file_name is not changed.
+
+    :return: the open temporary file.
+    """
+    temp_file_name = f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file_name, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
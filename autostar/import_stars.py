@@ -1,7 +1,7 @@
 import os
 
-from autostar.config.datapaths import ref_dir
-from autostar.simbad_query import SimbadLib
+from autostar.config.datapaths import config
+from autostar.simbad_query import shared_simbad_lib
 from autostar.name_correction import verify_starname
 
 
@@ -37,14 +37,14 @@ class CheckStarNames:
     def update_simbad_ref(self):
         self.list_of_star_names_dicts = []
         self.list_of_hypatia_handles = []
-        self.simbad_lib = SimbadLib(verbose=self.verbose, go_fast=self.simbad_go_fast)
-        for hypatia_name in self.hypatia_formatted_names:
-            hypatia_handle, star_names_dict = self.simbad_lib.get_star_dict(hypatia_name=hypatia_name)
+        self.simbad_lib = shared_simbad_lib(verbose=self.verbose, go_fast=self.simbad_go_fast)
+        # the names that are not in the reference data are resolved together, with bulk Simbad queries
+        for hypatia_handle, star_names_dict in self.simbad_lib.get_star_dict_many(self.hypatia_formatted_names):
             self.list_of_star_names_dicts.append(star_names_dict)
             self.list_of_hypatia_handles.append(hypatia_handle)
 
 
 if __name__ == "__main__":
-    csn = CheckStarNames(file_name=os.path.join(ref_dir, 'planets_2020.04.22_18.13.10.csv'))
+    csn = CheckStarNames(file_name=os.path.join(config.ref_dir, 'planets_2020.04.22_18.13.10.csv'))
     csn.update_simbad_ref()
 
@@ -1,14 +1,25 @@
 import os
 
-from autostar.simbad_query import SimbadLib
-from autostar.config.datapaths import annoying_names_filename, popular_names_filename, star_name_format, StringStarName
+from autostar.simbad_query import shared_simbad_lib
+from autostar.file_lock import file_lock, atomic_write
+from autostar.config.datapaths import config, star_name_format, StringStarName
 
 
 class AnnoyingNames:
     def __init__(self):
-        self.path = annoying_names_filename
-        self.annoying_names = set()
-        self.sb_names = {}
+        self.path = config.annoying_names_filename
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                with atomic_write(self.path) as f:
+                    f.write("name,simbad\n")
+            self.sb_names = self.read_file()
+        self.annoying_names = set(self.sb_names.keys())
+
+    def read_file(self):
+        """
+        :return: dict - {name: simbad_name} from the annoying names file, empty when there is no file.
+        """
+        sb_names = {}
         if os.path.exists(self.path):
             with open(self.path, 'r') as f:
                 first_line = True
@@ -19,17 +30,20 @@ class AnnoyingNames:
                         line = line.strip()
                         if line != "":
                             name, simbad_name = line.split(",")
-                            self.annoying_names.add(name)
-                            self.sb_names[name] = simbad_name
-        else:
-            with open(self.path, 'w') as f:
-                f.write("name,simbad\n")
+                            sb_names[name] = simbad_name
+        return sb_names
 
     def write(self):
-        with open(self.path, 'w') as f:
-            f.write("name,simbad\n")
-            for name in sorted(self.sb_names.keys()):
-                f.write(str(name).lower() + "," + str(self.sb_names[name]) + "\n")
+        with file_lock(self.path):
+            # the names that other processes added since the file was read are kept
+            for name, simbad_name in self.read_file().items():
+                if name not in self.sb_names:
+                    self.sb_names[name] = simbad_name
+                    self.annoying_names.add(name)
+            with atomic_write(self.path) as f:
+                f.write("name,simbad\n")
+                for name in sorted(self.sb_names.keys()):
+                    f.write(str(name).lower() + "," + str(self.sb_names[name]) + "\n")
 
     def append(self, name, simbad_name):
         if name in self.sb_names.keys():
@@ -40,7 +54,7 @@ class AnnoyingNames:
             self.annoying_names.add(name)
             self.annoying_names.add(name)
             self.sb_names[name] = simbad_name
-            with open(self.path, 'a') as f:
+            with file_lock(self.path), open(self.path, 'a') as f:
                 f.write(str(name).lower() + "," + str(self.sb_names[name]) + "\n")
 
 
@@ -49,9 +63,9 @@ class PopNamesLib:
         self.remove_from_pop_name = ['**', "V*", 'v*', "*"]
 
         if simbad_lib is None:
-            simbad_lib = SimbadLib(go_fast=simbad_go_fast)
+            simbad_lib = shared_simbad_lib(go_fast=simbad_go_fast)
         self.simbad_lib = simbad_lib
-        file_name = popular_names_filename
+        file_name = config.popular_names_filename
         with open(file_name, 'r') as f:
             pop_file_data = f.readlines()
         header = pop_file_data[0].strip().split(",")
@@ -91,10 +105,25 @@ class PopNamesLib:
         return None
 
 
-an = AnnoyingNames()
+def get_annoying_names():
+    """
+    The AnnoyingNames that are shared by autostar, available as autostar.name_correction.an.
+    The annoying names file is read the first time this is called, not when this module is imported.
+    """
+    an = globals().get("an")
+    if an is None:
+        an = globals()["an"] = AnnoyingNames()
+    return an
+
+
+def __getattr__(name):
+    if name == "an":
+        return get_annoying_names()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def verify_starname(test_object_name, other_info=None):
+    an = get_annoying_names()
     object_name = None
     # This is catch for star names that are annoying that were previously found and recorded
     if test_object_name.lower() in an.annoying_names:
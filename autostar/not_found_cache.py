@@ -0,0 +1,260 @@
+"""
+A persistent record of the names that Simbad could not resolve, so they are not queried again by every process.
+
+When Simbad does not know a name, SimbadLib only keeps a stub for it in memory, and every new process sent the same
+query again (and waited on the rate limit for it). The names that Simbad did not resolve are written to
+sb_not_found_filename in the reference data directory, one 'name|time' line each, with the time (seconds since the
+epoch) of the query. A name is not queried again until sb_not_found_ttl_days have passed, then it is tried again,
+Simbad is updated and the name may be found. sb_not_found_ttl_days = 0 turns the cache off.
+
+Most of the names that are checked are not in the cache, these are answered by a Bloom filter, a bit array with a
+few bits set for each name in the cache. A name with any of its bits unset is not in the cache, only the names with
+all their bits set (the names in the cache and about sb_not_found_bloom_error of the others) are looked up in the
+table of names and times. The Bloom filter is saved next to the text file (the file name + '.bloom') for the
+generation of the text file it was made from (see autostar.file_lock.file_generation), so a process that only
+checks names reads the small Bloom filter file, and reads the table of names the first time a name is a hit.
+"""
+import os
+import math
+import time
+import struct
+import hashlib
+import threading
+
+from autostar.config.datapaths import config
+from autostar.file_lock import file_lock, atomic_write, file_generation
+
+
+# magic, file format version, text file (st_mtime_ns, st_size, st_ino), the number of bits and of hash functions
+bloom_file_header = struct.Struct("<4sHqqqqH")
+bloom_file_magic = b"ANFB"
+bloom_file_version = 1
+bloom_extension = ".bloom"
+# the smallest Bloom filter, in names, so that the first few names do not make a new filter each
+min_bloom_capacity = 1024
+
+
+def not_found_key(name):
+    """ The cache key of a Simbad name, i.e. 'hd 1234' for "HD  1234"."""
+    return " ".join(name.split()).lower()
+
+
+class BloomFilter:
+    """
+    A set of strings in a bit array that can have false positives but no false negatives, see the module docstring.
+
+    :param capacity: int - the number of strings the filter is sized for.
+    :param error_rate: float - the fraction of false positives when the filter has capacity strings.
+    :param n_bits: int - the size of the bit array, used to rebuild a saved filter.
+    :param n_hashes: int - the number of bits set for each string, used to rebuild a saved filter.
+    :param bits: bytearray - the bit array of a saved filter.
+    """
+    def __init__(self, capacity=min_bloom_capacity, error_rate=0.01, n_bits=None, n_hashes=None, bits=None):
+        if n_bits is None:
+            # the optimal size and number of hash functions for the false positive rate
+            n_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2.0) ** 2))))
+        if n_hashes is None:
+            n_hashes = max(1, int(round(n_bits / capacity * math.log(2.0))))
+        self.n_bits = n_bits
+        self.n_hashes = n_hashes
+        self.capacity = capacity
+        if bits is None:
+            self.bits = bytearray((n_bits + 7) // 8)
+        else:
+            self.bits = bytearray(bits)
+
+    def bit_indexes(self, key):
+        # two 64-bit hashes from one digest make all n_hashes indexes (Kirsch and Mitzenmacher)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        hash_1 = int.from_bytes(digest[:8], "little")
+        hash_2 = int.from_bytes(digest[8:], "little") | 1
+        return [(hash_1 + hash_index * hash_2) % self.n_bits for hash_index in range(self.n_hashes)]
+
+    def add(self, key):
+        for bit_index in self.bit_indexes(key):
+            self.bits[bit_index >> 3] |= 1 << (bit_index & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[bit_index >> 3] & (1 << (bit_index & 7)) for bit_index in self.bit_indexes(key))
+
+
+class NotFoundCache:
+    """
+    The names that Simbad could not resolve and the time of the query, see the module docstring.
+
+    :param file_name: str - the text file, the default is sb_not_found_filename in the config.
+    :param ttl_seconds: float - the time before a name is queried again,
+                        the default is sb_not_found_ttl_days in the config.
+    """
+    def __init__(self, file_name=None, ttl_seconds=None):
+        if file_name is None:
+            self.file_name = config.sb_not_found_filename
+        else:
+            self.file_name = file_name
+        self.bloom_file_name = self.file_name + bloom_extension
+        if ttl_seconds is None:
+            self.ttl_seconds = config.get('sb_not_found_ttl_days') * 86400.0
+        else:
+            self.ttl_seconds = ttl_seconds
+        self.error_rate = config.get('sb_not_found_bloom_error')
+        self.lock = threading.Lock()
+        # the generation of the text file that the Bloom filter and the table were made from
+        self.bloom = None
+        self.bloom_generation = None
+        # {key: time}, read from the text file on the first hit of the Bloom filter
+        self.not_found_times = None
+        self.table_generation = None
+        self.lines_read = 0
+
+    def read_bloom(self, generation):
+        """
+        :return: BloomFilter or None - the saved Bloom filter, None when it was not made from this generation of
+                 the text file.
+        """
+        try:
+            with open(self.bloom_file_name, 'rb') as f:
+                file_bytes = f.read()
+            magic, version, mtime_ns, size, ino, n_bits, n_hashes = bloom_file_header.unpack_from(file_bytes)
+        except (FileNotFoundError, struct.error):
+            return None
+        if magic != bloom_file_magic or version != bloom_file_version or (mtime_ns, size, ino) != generation \
+                or len(file_bytes) - bloom_file_header.size != (n_bits + 7) // 8:
+            return None
+        # the number of names the saved filter was sized for
+        capacity = int(n_bits * math.log(2.0) ** 2 / -math.log(self.error_rate))
+        return BloomFilter(capacity=capacity, n_bits=n_bits, n_hashes=n_hashes,
+                           bits=file_bytes[bloom_file_header.size:])
+
+    def write_bloom(self):
+        generation = file_generation(self.file_name)
+        if generation is None:
+            return
+        with atomic_write(self.bloom_file_name, mode='wb') as f:
+            f.write(bloom_file_header.pack(bloom_file_magic, bloom_file_version, *generation,
+                                           self.bloom.n_bits, self.bloom.n_hashes))
+            f.write(self.bloom.bits)
+        self.bloom_generation = generation
+
+    def read_table(self):
+        """ Read the text file, the last time of each name is kept."""
+        self.not_found_times = {}
+        self.lines_read = 0
+        if os.path.exists(self.file_name):
+            with open(self.file_name, 'r') as f:
+                for line in f:
+                    key, _, stored_time = line.rstrip("\n").rpartition("|")
+                    if key:
+                        try:
+                            self.not_found_times[key] = float(stored_time)
+                        except ValueError:
+                            # a line that was cut short
+                            continue
+                        self.lines_read += 1
+        self.table_generation = file_generation(self.file_name)
+
+    def make_bloom(self):
+        """ A Bloom filter of the names in the table, with room for as many more names."""
+        self.bloom = BloomFilter(capacity=max(min_bloom_capacity, 2 * len(self.not_found_times)),
+                                 error_rate=self.error_rate)
+        for key in self.not_found_times.keys():
+            self.bloom.add(key)
+
+    def refresh(self):
+        """ Read the Bloom filter again when the text file was changed, by this process or another one."""
+        generation = file_generation(self.file_name)
+        if self.bloom is not None and generation == self.bloom_generation:
+            return
+        with file_lock(self.file_name, shared=True):
+            generation = file_generation(self.file_name)
+            bloom = self.read_bloom(generation)
+            if bloom is None:
+                self.read_table()
+                self.make_bloom()
+                self.bloom_generation = generation
+            else:
+                self.bloom = bloom
+                self.bloom_generation = generation
+                if self.table_generation != generation:
+                    # the table is read again at the next hit of the Bloom filter
+                    self.not_found_times = None
+        if bloom is None and generation is not None:
+            with file_lock(self.file_name):
+                if file_generation(self.file_name) == generation:
+                    self.write_bloom()
+
+    def is_not_found(self, name):
+        """
+        :param name: str - a Simbad name, i.e. 'HD 1234'.
+        :return: bool - True when Simbad did not resolve the name in the last sb_not_found_ttl_days.
+        """
+        if not self.ttl_seconds:
+            return False
+        key = not_found_key(name)
+        with self.lock:
+            self.refresh()
+            if key not in self.bloom:
+                return False
+            if self.not_found_times is None or self.table_generation != self.bloom_generation:
+                with file_lock(self.file_name, shared=True):
+                    self.read_table()
+            stored_time = self.not_found_times.get(key)
+        return stored_time is not None and time.time() - stored_time < self.ttl_seconds
+
+    def record(self, names):
+        """
+        Add names that Simbad did not resolve, with the time now. The lines are appended to the text file, the file
+        is rewritten without the expired names when most of its lines are old.
+
+        :param names: iterable of str - Simbad names, i.e. 'HD 1234'.
+        """
+        if not self.ttl_seconds:
+            return
+        keys = [not_found_key(name) for name in names]
+        if not keys:
+            return
+        now = time.time()
+        with self.lock, file_lock(self.file_name):
+            # when the table is read again, the Bloom filter is made again for the names of the other processes
+            bloom_is_current = self.bloom is not None and self.not_found_times is not None \
+                and self.table_generation == file_generation(self.file_name) \
+                and self.bloom_generation == self.table_generation
+            if self.not_found_times is None or self.table_generation != file_generation(self.file_name):
+                self.read_table()
+            with open(self.file_name, 'a') as f:
+                for key in keys:
+                    f.write(f"{key}|{now:.3f}\n")
+                    self.not_found_times[key] = now
+            self.lines_read += len(keys)
+            if self.lines_read > 2 * len(self.not_found_times) + min_bloom_capacity:
+                self.compact()
+            self.table_generation = file_generation(self.file_name)
+            if not bloom_is_current or len(self.not_found_times) > self.bloom.capacity:
+                self.make_bloom()
+            else:
+                for key in keys:
+                    self.bloom.add(key)
+            self.write_bloom()
+
+    def compact(self):
+        """ Rewrite the text file with one line for each name that has not expired, the file lock is held."""
+        now = time.time()
+        self.not_found_times = {key: stored_time for key, stored_time in self.not_found_times.items()
+                                if now - stored_time < self.ttl_seconds}
+        with atomic_write(self.file_name) as f:
+            for key, stored_time in self.not_found_times.items():
+                f.write(f"{key}|{stored_time:.3f}\n")
+        self.lines_read = len(self.not_found_times)
+        self.make_bloom()
+
+
+# the not found cache shared by all the queries in this process, made on first use from the config
+not_found_cache = None
+not_found_cache_lock = threading.Lock()
+
+
+def get_not_found_cache():
+    global not_found_cache
+    with not_found_cache_lock:
+        if not_found_cache is None:
+            not_found_cache = NotFoundCache()
+        return not_found_cache
@@ -4,22 +4,13 @@ from autostar.simbad_query import StarDict
 
 
 class ObjectParams(StarDict):
+    """ The parameters of one object, {param_name: set of SingleParam}, the parameter names are lowercase."""
+    __slots__ = ()
+
     def __setitem__(self, key, value):
-        key = key.lower()
-        if self.__contains__(key):
-            if isinstance(value, set):
-                self.data[str(key)] |= value
-            elif isinstance(value, SingleParam):
-                self.data[str(key)].add(value)
-            else:
-                raise ValueError("SingleParam or set is required")
-        else:
-            if isinstance(value, set):
-                self.data[str(key)] = value
-            elif isinstance(value, SingleParam):
-                self.data[str(key)] = {value}
-            else:
-                raise ValueError("SingleParam or set is required")
+        if not isinstance(value, (set, frozenset, SingleParam)):
+            raise ValueError("SingleParam or set is required")
+        StarDict.__setitem__(self, key.lower(), value)
 
     def update_single_ref_source(self, ref_str, params_dict):
         new_param_dict = {}
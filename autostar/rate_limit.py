@@ -0,0 +1,246 @@
+"""
+Rate limiting for the remote queries to Simbad, the Gaia archive, and MAST.
+
+Each service has one TokenBucket that is shared by every query in the process, see get_rate_limiter().
+A bucket holds up to 'burst' tokens and is refilled at 'rate' tokens per second, each query takes one token.
+A query only waits when the bucket is empty, so an idle server is never made to wait for a fixed sleep.
+
+When a server answers with HTTP 429 (Too Many Requests) or 503 (Service Unavailable) the bucket backs off:
+the rate is halved (to a minimum of min_rate) and no tokens are given out until the server's Retry-After time,
+or backoff_seconds, has passed. The rate recovers a little with each successful query.
+"""
+import re
+import time
+import threading
+from collections import namedtuple
+
+from autostar.config.datapaths import config
+
+
+RateLimitStats = namedtuple("RateLimitStats", "service queries waits wait_seconds query_seconds backoffs rate")
+
+rate_limit_status_codes = {429, 503}
+# http.client based clients (astroquery.utils.tap, used for Gaia) raise errors with only the reason phrase
+rate_limit_reasons = {"too many requests": 429, "service unavailable": 503}
+
+
+def error_status_code(error):
+    """
+    Find the HTTP status code of an exception raised by astroquery, requests, or pyvo.
+
+    :return: int or None when the exception does not have a status code.
+    """
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    if status_code is None:
+        status_code = getattr(error, "code", None)
+    if isinstance(status_code, int):
+        return status_code
+    # some services only give the status in the message, i.e. "503 Server Error: Service Unavailable for url: ..."
+    found = re.search(r"\b(429|503)\b", str(error))
+    if found is not None:
+        return int(found.group(1))
+    message = str(error).lower()
+    for reason, status_code in rate_limit_reasons.items():
+        if reason in message:
+            return status_code
+    return None
+
+
+def retry_after_seconds(error):
+    # the Retry-After header in seconds, the http-date form of the header is not used
+    if isinstance(getattr(error, "retry_after_seconds", None), (int, float)):
+        # pyvo's DALRateLimitError, used by the Simbad client
+        return float(error.retry_after_seconds)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+
+    :param rate: float - tokens added per second, None is no limit.
+    :param burst: int - the most tokens the bucket can hold, the number of queries allowed at once after idle time.
+    :param service: str - the name of the service that is limited, used in the stats.
+    :param min_rate: float - the lowest rate that a back-off can reduce the rate to.
+    :param backoff_seconds: float - the pause after a 429 or 503 that did not include a Retry-After time.
+    :param max_retries: int - the retries of a query after a 429 or 503 in call(), before the error is raised.
+    """
+    def __init__(self, rate=None, burst=1, service=None, min_rate=0.1, backoff_seconds=5.0, max_retries=3):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.service = service
+        self.min_rate = min_rate
+        self.backoff_seconds = backoff_seconds
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        # stats
+        self.queries = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.query_seconds = 0.0
+        self.backoffs = 0
+
+    @property
+    def unlimited(self):
+        return self.rate is None
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, waiting for them when the bucket is empty.
+
+        Tokens are reserved while the lock is held and the wait happens after the lock is released,
+        so threads waiting on the same bucket are served in order and do not block each other.
+
+        :return: float - the seconds spent waiting.
+        """
+        with self.lock:
+            self.queries += 1
+            now = time.monotonic()
+            # a back-off pause is kept even without a rate limit, the server asked for it
+            wait = max(self.paused_until - now, 0.0)
+            if not self.unlimited:
+                # after a back-off the bucket refills from the end of the pause, see backoff()
+                refill_start = max(now, self.last_refill)
+                self.tokens = min(self.burst, self.tokens + max(now - self.last_refill, 0.0) * self.rate)
+                self.last_refill = refill_start
+                self.tokens -= tokens
+                if self.tokens < 0.0:
+                    wait = max(wait, refill_start - now - self.tokens / self.rate)
+        total_wait = 0.0
+        while wait > 0.0:
+            time.sleep(wait)
+            total_wait += wait
+            # a back-off that started while this thread was waiting also applies to it
+            with self.lock:
+                wait = self.paused_until - time.monotonic()
+        if total_wait > 0.0:
+            with self.lock:
+                self.waits += 1
+                self.wait_seconds += total_wait
+        return total_wait
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens from the bucket only if they are available now, this never waits.
+        Servers use this to answer over-limit requests with a 429, see autostar.standin_server.
+
+        :return: float - 0.0 when the tokens were taken, otherwise the seconds until they will be available.
+        """
+        with self.lock:
+            if self.unlimited:
+                return 0.0
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens < tokens:
+                return (tokens - self.tokens) / self.rate
+            self.tokens -= tokens
+            return 0.0
+
+    def backoff(self, retry_after=None):
+        """ Slow down after the server answered with a 429 or 503."""
+        with self.lock:
+            self.backoffs += 1
+            if self.rate is not None:
+                self.rate = max(self.rate / 2.0, self.min_rate)
+            if retry_after is None:
+                retry_after = self.backoff_seconds
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            # the queries after the pause are spaced at the new rate instead of all starting when it ends
+            self.tokens = min(self.tokens, 0.0)
+            self.last_refill = max(self.last_refill, self.paused_until)
+
+    def recover(self):
+        """ Move the rate back toward the configured rate after a successful query."""
+        with self.lock:
+            # the rate is read under the lock, a back-off in another thread may have just halved it
+            if self.rate is None or self.max_rate is None or self.rate >= self.max_rate:
+                return
+            self.rate = min(self.rate * 1.1, self.max_rate)
+
+    def record_query_time(self, seconds):
+        with self.lock:
+            self.query_seconds += seconds
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs) under this rate limit. A 429 or 503 from the server causes a back-off
+        and the query is tried again, up to max_retries times.
+
+        :return: the return value of func
+        """
+        retries = 0
+        while True:
+            self.acquire()
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:
+                self.record_query_time(time.monotonic() - start)
+                if error_status_code(error) not in rate_limit_status_codes or retries >= self.max_retries:
+                    raise
+                retries += 1
+                self.backoff(retry_after_seconds(error))
+            else:
+                self.record_query_time(time.monotonic() - start)
+                self.recover()
+                return result
+
+    def stats(self):
+        with self.lock:
+            return RateLimitStats(self.service, self.queries, self.waits, self.wait_seconds, self.query_seconds,
+                                  self.backoffs, self.rate)
+
+    def reset_stats(self):
+        with self.lock:
+            self.queries = self.waits = self.backoffs = 0
+            self.wait_seconds = self.query_seconds = 0.0
+
+
+# the shared rate limiter for each service, made on first use from the config
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+# limiters without a rate limit, they only wait after a 429 or 503 and they still count the queries
+unlimited_rate_limiters = {}
+
+
+def get_rate_limiter(service, go_fast=False):
+    """
+    The rate limiter that is shared by all the queries to a service in this process.
+
+    The rate and burst are set in the config as <service>_query_rate and <service>_query_burst,
+    a rate of 0 is no limit.
+
+    :param service: str - 'simbad', 'gaia', or 'mast'
+    :param go_fast: bool - when True, a limiter without a rate limit is returned, it still backs off on a 429 or 503.
+    :return: TokenBucket
+    """
+    with rate_limiters_lock:
+        limiters = unlimited_rate_limiters if go_fast else rate_limiters
+        if service not in limiters:
+            if go_fast:
+                limiters[service] = TokenBucket(rate=None, service=service)
+            else:
+                rate = config.get(f"{service}_query_rate")
+                limiters[service] = TokenBucket(rate=rate or None, burst=config.get(f"{service}_query_burst"),
+                                                service=service)
+        return limiters[service]
+
+
+def rate_limit_report():
+    """
+    :return: list of RateLimitStats - the queries made and the time spent waiting and querying for each service.
+    """
+    with rate_limiters_lock:
+        limiters = list(rate_limiters.values()) + list(unlimited_rate_limiters.values())
+    return [limiter.stats() for limiter in limiters]
@@ -3,14 +3,15 @@ import time
 import importlib
 
 import numpy as np
-from astropy import units as u
-from astropy.time import Time
-from astropy.coordinates import SkyCoord, Distance
 
 from autostar.table_read import row_dict
-from autostar.simbad_query import SimbadLib, StarDict
+from autostar.rate_limit import get_rate_limiter
+from autostar.response_cache import cached_query
+from autostar.ref_snapshot import read_snapshot, write_snapshot
+from autostar.file_lock import file_lock, atomic_write, file_generation
+from autostar.simbad_query import shared_simbad_lib, StarDict
 from autostar.object_params import ObjectParams, set_single_param
-from autostar.config.datapaths import ref_dir, star_name_format, StarName, StringStarName
+from autostar.config.datapaths import config, star_name_format, StarName, StringStarName
 
 
 deg_per_mas = 1.0 / (1000.0 * 60.0 * 60.0)
@@ -39,7 +40,7 @@ class GaiaLib:
             self.__setattr__('gaiadr' + str(dr_number) + "_ref",
                              GaiaRef(verbose=self.verbose, dr_number=dr_number))
         if simbad_lib is None:
-            self.simbad_lib = SimbadLib(go_fast=self.simbad_go_fast, verbose=self.verbose)
+            self.simbad_lib = shared_simbad_lib(go_fast=self.simbad_go_fast, verbose=self.verbose)
         else:
             self.simbad_lib = simbad_lib
 
@@ -66,15 +67,20 @@ class GaiaLib:
             hypatia_handle, star_names_dict = self.simbad_lib.get_star_dict_with_star_dict(hypatia_name)
         else:
             hypatia_handle, star_names_dict = self.simbad_lib.get_star_dict(hypatia_name=hypatia_name)
-        gaia_star_names_dict = {star_type: star_names_dict[star_type] for star_type in star_names_dict.keys()
-                                if star_type in self.gaia_name_types}
-        return hypatia_handle, gaia_star_names_dict
+        return hypatia_handle, self.gaia_names(star_names_dict)
+
+    def gaia_names(self, star_names_dict):
+        return {star_type: star_names_dict[star_type] for star_type in star_names_dict.keys()
+                if star_type in self.gaia_name_types}
 
     def get_single_dr_number_data(self, gaia_hypatia_name):
         gaia_name_type, gaia_star_id = gaia_hypatia_name
         dr_number = int(gaia_name_type.replace("gaia dr", "").strip())
         gaia_ref = self.__getattribute__('gaiadr' + str(dr_number) + "_ref")
         test_output = gaia_ref.find(gaia_star_id=gaia_star_id)
+        if test_output is None and gaia_ref.refresh():
+            # another process saved reference data since it was read
+            test_output = gaia_ref.find(gaia_star_id=gaia_star_id)
         if test_output is not None:
             # This is the primary case, data is available in the reference file, and is returned
             return test_output
@@ -104,6 +110,23 @@ class GaiaLib:
         return hypatia_handle, {gaia_hypatia_name: self.get_single_dr_number_data(gaia_hypatia_name)
                                 for gaia_hypatia_name in gaia_hypatia_names}
 
+    def get_many(self, hypatia_names):
+        """
+        The batch version of get, the Simbad names of all the stars are resolved together with
+        SimbadLib.get_star_dict_many.
+
+        :param hypatia_names: iterable of str, (name_type, star_id) StarNames, or StarDicts
+        :return: list of (hypatia_handle, gaia_params_dicts) aligned with hypatia_names.
+        """
+        gaia_data = []
+        for hypatia_handle, star_names_dict in self.simbad_lib.get_star_dict_many(hypatia_names):
+            gaia_star_names_dict = self.gaia_names(star_names_dict)
+            gaia_hypatia_names = [StarName(gaia_name_type, star_id) for gaia_name_type in gaia_star_names_dict.keys()
+                                  for star_id in gaia_star_names_dict[gaia_name_type]]
+            gaia_data.append((hypatia_handle, {gaia_hypatia_name: self.get_single_dr_number_data(gaia_hypatia_name)
+                                               for gaia_hypatia_name in gaia_hypatia_names}))
+        return gaia_data
+
     def convert_to_object_params(self, gaia_params_dicts):
         new_object_params = ObjectParams()
         for gaia_hypatia_name in gaia_params_dicts.keys():
@@ -215,12 +238,28 @@ class GaiaRef:
         self.verbose = verbose
         self.ref_data = None
         self.gaia_name_type = "gaia dr" + str(self.dr_number)
-        self.ref_file = os.path.join(ref_dir, "GaiaDR" + str(self.dr_number) + "_ref.csv")
+        self.ref_file = os.path.join(config.ref_dir, "GaiaDR" + str(self.dr_number) + "_ref.csv")
         self.lookup = None
         self.available_ids = None
+        # the generation of the reference file that was read, see autostar.file_lock
+        self.ref_generation = None
 
     def load(self):
-        self.ref_data = []
+        with file_lock(self.ref_file, shared=True):
+            self.ref_generation = file_generation(self.ref_file)
+            self.ref_data = self.read_ref_data()
+        self.lookup = None
+        self.available_ids = None
+
+    def read_ref_data(self):
+        """
+        :return: list of tuples - (set of gaia star_ids, params dict) for each star in the reference file.
+        """
+        # the parsed reference file, while the reference file is unchanged, see autostar.ref_snapshot
+        snapshot = read_snapshot(self.ref_file, 'gaia_ref')
+        if snapshot is not None:
+            return snapshot
+        ref_data = []
         if os.path.exists(self.ref_file):
             read_ref = row_dict(filename=self.ref_file, key="name", delimiter=",", null_value="", inner_key_remove=True)
             for saved_names in read_ref.keys():
@@ -231,9 +270,35 @@ class GaiaRef:
                     if not gaia_name_type == self.gaia_name_type:
                         raise KeyError("Gaia Data Release," + str(self.gaia_name_type) + ", received:" +
                                        str(gaia_name_type))
-                self.ref_data.append((star_ids, read_ref[saved_names]))
+                ref_data.append((star_ids, read_ref[saved_names]))
+            write_snapshot(self.ref_file, 'gaia_ref', ref_data)
+        return ref_data
+
+    def refresh(self):
+        """
+        Load the reference file again when another process saved it since it was read.
+
+        :return: bool - True when the reference file was loaded again.
+        """
+        if file_generation(self.ref_file) == self.ref_generation:
+            return False
+        self.load()
+        self.make_lookup()
+        return True
 
     def save(self):
+        with file_lock(self.ref_file):
+            ref_generation = file_generation(self.ref_file)
+            if ref_generation is not None and ref_generation != self.ref_generation:
+                # another process saved the file since it was read, the stars that it added are kept
+                self.make_lookup()
+                for star_ids, params in self.read_ref_data():
+                    if not star_ids & self.available_ids:
+                        self.ref_data.append((star_ids, params))
+            self.write_ref_file()
+            self.ref_generation = file_generation(self.ref_file)
+
+    def write_ref_file(self):
         self.make_lookup()
         header_params = set()
         name_string_to_params = {}
@@ -261,7 +326,7 @@ class GaiaRef:
                 else:
                     row_data += ","
             body.append(row_data[:-1] + "\n")
-        with open(self.ref_file, 'w') as f:
+        with atomic_write(self.ref_file) as f:
             f.write(header)
             [f.write(row_data) for row_data in body]
 
@@ -305,8 +370,21 @@ class GaiaQuery:
     def __init__(self, verbose=False):
         # import this package at 'runtime' not 'import time' to avoid an unnecessary connection to the Gaia SQL server
         self.astro_query_gaia = importlib.import_module("astroquery.gaia")
-        self.Gaia = self.astro_query_gaia.Gaia
+        gaia_server_url = config.get('gaia_server_url')
+        if gaia_server_url:
+            # a Gaia TAP server that is not the ESA Gaia archive, i.e. autostar.standin_server
+            self.Gaia = self.astro_query_gaia.GaiaClass(gaia_tap_server=gaia_server_url,
+                                                        gaia_data_server=gaia_server_url, show_server_messages=False)
+        else:
+            self.Gaia = self.astro_query_gaia.Gaia
+        # astropy is needed to move the Gaia positions to the J2000 epoch, it is imported with astroquery.gaia
+        self.u = importlib.import_module("astropy.units")
+        self.Time = importlib.import_module("astropy.time").Time
+        astropy_coordinates = importlib.import_module("astropy.coordinates")
+        self.SkyCoord, self.Distance = astropy_coordinates.SkyCoord, astropy_coordinates.Distance
         self.verbose = verbose
+        # the rate limit is shared by all the Gaia archive queries in this process
+        self.rate_limiter = get_rate_limiter('gaia')
         self.gaia_dr1_data = None
         self.gaia_dr2_data = None
         self.gaia_dr3_data = None
@@ -344,10 +422,24 @@ class GaiaQuery:
                                "distance_gspphot": "[pc]", "distance_gspphot_lower": "[pc]", "distance_gspphot_upper": "[pc]"}
         self.params_with_units = set(self.param_to_units.keys())
 
+    def astroquery_results(self, job_text):
+        """ Run a query on the Gaia archive and wait for the results table."""
+        job = self.Gaia.launch_job_async(job_text)
+        while job._phase != "COMPLETED":
+            time.sleep(1)
+        return job.get_results()
+
+    def query_results(self, job_text):
+        # the results are cached on disk, see autostar.response_cache, only the queries sent to Gaia are rate limited
+        return cached_query('gaia', self.astroquery_results, job_text, rate_limiter=self.rate_limiter)
+
     def astroquery_get_job(self, job, dr_num=2):
         while job._phase != "COMPLETED":
             time.sleep(1)
-        raw_results = job.get_results()
+        return self.results_to_sources_dict(job.get_results(), dr_num=dr_num)
+
+    def results_to_sources_dict(self, raw_results, dr_num=2):
+        u, Time, SkyCoord, Distance = self.u, self.Time, self.SkyCoord, self.Distance
         sources_dict = {}
 
         if dr_num == 1:
@@ -416,14 +508,12 @@ class GaiaQuery:
                         job_text += " OR (g.source_id=" + str(sub_list[list_index]) + " AND d.source_id = g.source_id)"
             else:
                 job_text = simple_job_text(dr_num, sub_list)
-            job = self.Gaia.launch_job_async(job_text)
-            sources_dict = self.astroquery_get_job(job, dr_num=dr_num)
+            sources_dict = self.results_to_sources_dict(self.query_results(job_text), dr_num=dr_num)
             redo_ids = [source_id for source_id in
                         {int(source_id_str) for source_id_str in sub_list} - set(sources_dict.keys())]
             if redo_ids:
                 job_text = simple_job_text(dr_num, redo_ids)
-                job = self.Gaia.launch_job_async(job_text)
-                sources_dict.update(self.astroquery_get_job(job, dr_num=dr_num))
+                sources_dict.update(self.results_to_sources_dict(self.query_results(job_text), dr_num=dr_num))
             self.star_dict.update({(gaia_id_int,): sources_dict[gaia_id_int] for gaia_id_int in sources_dict.keys()})
 
     def astroquery_cone(self, ra_icrs, dec_icrs, radius_deg=1.0):
@@ -433,8 +523,7 @@ class GaiaQuery:
                    "CONTAINS(POINT('ICRS',gaiadr2.gaia_source.ra,gaiadr2.gaia_source.dec)," + \
                    "CIRCLE('ICRS'," + str(ra_icrs) + "," + str(dec_icrs) + "," + str(radius_deg) + "))=1;"
 
-        job = self.Gaia.launch_job_async(job_text)
-        sources_dict = self.astroquery_get_job(job)
+        sources_dict = self.results_to_sources_dict(self.query_results(job_text))
         return sources_dict
 
 
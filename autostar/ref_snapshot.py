@@ -0,0 +1,100 @@
+"""
+Binary snapshots of the parsed reference data, for a fast startup.
+
+The reference files (the Simbad reference, the Gaia reference, and the TIC reference) are text files that are
+parsed back through star_name_format each time they are loaded. After a text file is parsed, the parsed data is
+written next to it in a snapshot file (the text file name + '.snap'). The next load reads the snapshot instead of
+parsing the text file, as long as the text file is unchanged.
+
+A snapshot file is a header followed by the data in the marshal format, which only holds Python's built-in
+types (tuples, sets, dicts, lists, strings, and numbers) and reads them back without running any Python code,
+repeated strings like the name types are stored once. The header has the snapshot format version, the size
+and modification time of the text file that the snapshot was made from, and the fingerprint of the star names
+module (see autostar.config.datapaths.star_names_fingerprint, the parsing and the handles depend on it). A snapshot
+is only used when these match the text file and the star names module, a snapshot made before the star names module
+or its star_name_preference were edited is not used. Snapshots are turned off with reference_snapshots = false in
+the config.
+"""
+import gc
+import os
+import marshal
+import struct
+from contextlib import contextmanager
+
+from autostar.file_lock import atomic_write
+from autostar.config.datapaths import config, star_names_module, star_names_fingerprint
+
+
+# magic, snapshot format version, text file size, text file modification time (ns), star names fingerprint
+snapshot_header = struct.Struct("<4sHqq16s")
+snapshot_magic = b"ASNP"
+snapshot_version = 4
+snapshot_extension = ".snap"
+
+
+@contextmanager
+def gc_paused():
+    """
+    The garbage collector would scan the millions of objects of the reference data many times while they are made,
+    and none of them can be garbage yet, so it is paused while they are read from a snapshot.
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def snapshot_file_name(source_file_name):
+    return source_file_name + snapshot_extension
+
+
+def read_snapshot(source_file_name, kind):
+    """
+    :param source_file_name: str - the text reference file.
+    :param kind: str - the kind of data, i.e. 'simbad_ref', a snapshot of a different kind is not used.
+    :return: the data of the snapshot, or None when there is no snapshot that matches the text file.
+    """
+    if not config.get('reference_snapshots'):
+        return None
+    try:
+        source_stat = os.stat(source_file_name)
+        with open(snapshot_file_name(source_file_name), 'rb') as f:
+            file_bytes = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        magic, version, source_size, source_mtime_ns, fingerprint = snapshot_header.unpack_from(file_bytes)
+        if magic != snapshot_magic or version != snapshot_version \
+                or (source_size, source_mtime_ns) != (source_stat.st_size, source_stat.st_mtime_ns) \
+                or fingerprint != star_names_fingerprint():
+            return None
+        with gc_paused():
+            snapshot_kind, snapshot_star_names_module, data = marshal.loads(file_bytes[snapshot_header.size:])
+    except (struct.error, EOFError, ValueError, TypeError):
+        # a file that was cut short, or that was written by a different Python version
+        return None
+    if snapshot_kind != kind or snapshot_star_names_module != star_names_module:
+        return None
+    return data
+
+
+def write_snapshot(source_file_name, kind, data):
+    """
+    Write a snapshot of data that was parsed from the text file at source_file_name, or that was just written to
+    it. The snapshot is written to a temporary file and moved into place, so a reader never sees part of a file.
+
+    :param data: the parsed data, only Python's built-in types, see the module docstring.
+    """
+    if not config.get('reference_snapshots'):
+        return
+    try:
+        source_stat = os.stat(source_file_name)
+    except FileNotFoundError:
+        return
+    with atomic_write(snapshot_file_name(source_file_name), mode='wb') as f:
+        f.write(snapshot_header.pack(snapshot_magic, snapshot_version, source_stat.st_size, source_stat.st_mtime_ns,
+                                     star_names_fingerprint()))
+        f.write(marshal.dumps((kind, star_names_module, data)))
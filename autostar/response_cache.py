@@ -0,0 +1,308 @@
+"""
+A persistent cache of the responses to the remote queries to Simbad, the Gaia archive, and MAST.
+
+The same queries are sent again each time a pipeline is run before the reference files were written,
+i.e. after a crash. With this cache a rerun replays the responses from disk instead of the network.
+
+Each response table is stored in its own file, named by the SHA-256 hash of the service, the server,
+the query function, and the normalized query arguments (content-addressed). The files are a small header
+followed by the table as a gzip compressed binary VOTable (binary2). Responses expire after a time that is
+set for each service in the config as <service>_cache_ttl_days, 0 turns the cache off for that service.
+The total size of the cache is kept under response_cache_max_mb by removing the least recently used files,
+a file is marked as used by setting its modification time on each cache hit.
+"""
+import io
+import os
+import gzip
+import json
+import time
+import struct
+import hashlib
+import warnings
+import importlib
+import threading
+from collections import namedtuple
+
+from autostar.file_lock import atomic_write
+from autostar.config.datapaths import config
+from autostar.rate_limit import get_rate_limiter
+
+
+CacheStats = namedtuple("CacheStats", "service hits misses expired stores evictions")
+
+# the header of each cache file: the file format version and the time (seconds since the epoch) it was stored
+cache_file_header = struct.Struct("<4sd")
+cache_file_version = b"ARC1"
+cache_file_extension = ".vot.gz"
+# eviction removes files until the cache is this fraction of the size limit, so it does not run on every store
+eviction_low_water = 0.9
+cache_stat_names = ('hits', 'misses', 'expired', 'stores', 'evictions')
+
+
+def normalize_query_value(value):
+    """ Query arguments in a form that is the same for equivalent queries, i.e. "HD  1234" and "HD 1234"."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple, set)):
+        normalized = [normalize_query_value(item) for item in value]
+        return sorted(normalized, key=str) if isinstance(value, set) else normalized
+    if isinstance(value, dict):
+        return {str(key): normalize_query_value(value[key]) for key in sorted(value.keys(), key=str)}
+    if hasattr(value, "colnames"):
+        # an uploaded astropy table
+        return {column_name: normalize_query_value(value[column_name].tolist()) for column_name in value.colnames}
+    if hasattr(value, "item"):
+        # numpy scalars
+        return value.item()
+    return value
+
+
+def query_key(service, query_name, args=(), kwargs=None):
+    """
+    The content address of a query.
+
+    :param service: str - 'simbad', 'gaia', or 'mast'
+    :param query_name: str - the name of the query function, i.e. 'query_objectids'
+    :param args: tuple - the positional arguments of the query.
+    :param kwargs: dict - the keyword arguments of the query.
+    :return: str - a hex SHA-256 hash.
+    """
+    # responses from a different server, i.e. autostar.standin_server, are cached separately
+    key_parts = [service, config.get(f"{service}_server_url"), query_name, normalize_query_value(list(args)),
+                 normalize_query_value(kwargs or {})]
+    return hashlib.sha256(json.dumps(key_parts, default=str).encode("utf-8")).hexdigest()
+
+
+def table_to_bytes(table):
+    buffer = io.BytesIO()
+    table.write(buffer, format="votable", tabledata_format="binary2")
+    return gzip.compress(buffer.getvalue())
+
+
+def bytes_to_table(table_bytes):
+    table_class = importlib.import_module("astropy.table").Table
+    with warnings.catch_warnings():
+        # the VOTable parser warns about the small differences from the VOTable standard in the service responses
+        warnings.simplefilter("ignore")
+        return table_class.read(io.BytesIO(gzip.decompress(table_bytes)), format="votable")
+
+
+class ResponseCache:
+    """
+    A persistent, content-addressed cache of query response tables, see the module docstring.
+
+    :param cache_dir: str - the cache directory, the default is response_cache_dir in the config,
+                      or the 'response_cache' directory in the reference data directory.
+    :param max_bytes: int - the size limit of the cache, the default is response_cache_max_mb in the config.
+    :param ttl_seconds: dict - {service: seconds}, the time that responses are used for,
+                        the default for each service is <service>_cache_ttl_days in the config.
+    """
+    def __init__(self, cache_dir=None, max_bytes=None, ttl_seconds=None):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self.ttl_seconds = dict(ttl_seconds or {})
+        self.lock = threading.Lock()
+        # the total size of the cache files, found with a scan of the cache directory on the first store
+        self.total_bytes = None
+        self.counts = {}
+
+    @property
+    def cache_dir(self):
+        if self._cache_dir is None:
+            self._cache_dir = config.get('response_cache_dir') or os.path.join(config.ref_dir, "response_cache")
+        return self._cache_dir
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is None:
+            self._max_bytes = int(config.get('response_cache_max_mb') * 1.0e6)
+        return self._max_bytes
+
+    def ttl(self, service):
+        if service not in self.ttl_seconds:
+            self.ttl_seconds[service] = config.get(f"{service}_cache_ttl_days") * 86400.0
+        return self.ttl_seconds[service]
+
+    def path(self, service, key):
+        # the first two characters of the hash split the files into sub-directories of a reasonable size
+        return os.path.join(self.cache_dir, service, key[:2], key + cache_file_extension)
+
+    def count(self, service, stat, number=1):
+        with self.lock:
+            service_counts = self.counts.setdefault(service, dict.fromkeys(cache_stat_names, 0))
+            service_counts[stat] += number
+
+    def remove(self, file_path):
+        try:
+            size = os.path.getsize(file_path)
+            os.remove(file_path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes -= size
+
+    def get(self, service, key):
+        """
+        :return: astropy.table.Table or None - the cached response, None when it is not cached or it has expired.
+        """
+        file_path = self.path(service, key)
+        try:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        except FileNotFoundError:
+            self.count(service, 'misses')
+            return None
+        try:
+            version, stored_time = cache_file_header.unpack_from(file_bytes)
+            if version != cache_file_version:
+                raise ValueError(f"Unknown response cache file version {version}")
+            if time.time() - stored_time > self.ttl(service):
+                self.count(service, 'expired')
+                self.count(service, 'misses')
+                self.remove(file_path)
+                return None
+            table = bytes_to_table(file_bytes[cache_file_header.size:])
+        except Exception:
+            # a file that was cut short or is from a different version is removed and the query is made again
+            self.count(service, 'misses')
+            self.remove(file_path)
+            return None
+        try:
+            # the modification time is the last use, for the least recently used eviction
+            os.utime(file_path)
+        except FileNotFoundError:
+            pass
+        self.count(service, 'hits')
+        return table
+
+    def put(self, service, key, table):
+        """ Store a response table, tables that can not be written as a VOTable are not cached."""
+        try:
+            table_bytes = table_to_bytes(table)
+        except Exception as error:
+            warnings.warn(f"The {service} response could not be cached: {error}")
+            return
+        file_path = self.path(service, key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        size = cache_file_header.size + len(table_bytes)
+        try:
+            old_size = os.path.getsize(file_path)
+        except FileNotFoundError:
+            old_size = 0
+        # written to a temporary file and moved into place, so a crash never leaves part of a file in the cache
+        with atomic_write(file_path, mode='wb') as f:
+            f.write(cache_file_header.pack(cache_file_version, time.time()))
+            f.write(table_bytes)
+        self.count(service, 'stores')
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(file_size for _mtime, file_size, _path in self.scan())
+            else:
+                self.total_bytes += size - old_size
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def scan(self):
+        """
+        :return: list of tuples - (modification time, size, path) for every file in the cache.
+        """
+        cache_files = []
+        for dir_path, _dir_names, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if file_name.endswith(cache_file_extension):
+                    file_path = os.path.join(dir_path, file_name)
+                    try:
+                        file_stat = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    cache_files.append((file_stat.st_mtime, file_stat.st_size, file_path))
+        return cache_files
+
+    def evict(self):
+        """ Remove the least recently used files until the cache is under its size limit."""
+        cache_files = sorted(self.scan())
+        total_bytes = sum(file_size for _mtime, file_size, _path in cache_files)
+        target_bytes = self.max_bytes * eviction_low_water
+        for _mtime, file_size, file_path in cache_files:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= file_size
+            service = os.path.relpath(file_path, self.cache_dir).split(os.sep)[0]
+            self.count(service, 'evictions')
+        with self.lock:
+            self.total_bytes = total_bytes
+
+    def clear(self, service=None):
+        """ Remove the cached responses for a service, or for all services when service is None."""
+        for _mtime, _size, file_path in self.scan():
+            if service is None or os.path.relpath(file_path, self.cache_dir).split(os.sep)[0] == service:
+                self.remove(file_path)
+
+    def call(self, service, func, *args, rate_limiter=None, **kwargs):
+        """
+        The cached response to func(*args, **kwargs), or the response from the server when it is not cached.
+        Only the queries that go to the server are rate limited.
+
+        :param service: str - 'simbad', 'gaia', or 'mast'
+        :param func: callable - the query function, it returns an astropy Table.
+        :param rate_limiter: TokenBucket - the rate limit for the queries to the server,
+                             the default is the shared rate limiter for the service.
+        :return: the return value of func
+        """
+        if rate_limiter is None:
+            rate_limiter = get_rate_limiter(service)
+        if not self.ttl(service):
+            return rate_limiter.call(func, *args, **kwargs)
+        key = query_key(service, func.__name__, args, kwargs)
+        table = self.get(service, key)
+        if table is not None:
+            return table
+        response = rate_limiter.call(func, *args, **kwargs)
+        if hasattr(response, "colnames"):
+            self.put(service, key, response)
+        return response
+
+    def stats(self, service):
+        with self.lock:
+            service_counts = self.counts.get(service, dict.fromkeys(cache_stat_names, 0))
+            return CacheStats(service, *(service_counts[stat] for stat in cache_stat_names))
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = {}
+
+
+# the response cache shared by all the queries in this process, made on first use from the config
+response_cache = None
+response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global response_cache
+    with response_cache_lock:
+        if response_cache is None:
+            response_cache = ResponseCache()
+        return response_cache
+
+
+def cached_query(service, func, *args, rate_limiter=None, **kwargs):
+    """
+    func(*args, **kwargs) with the shared response cache, see ResponseCache.call.
+    """
+    return get_response_cache().call(service, func, *args, rate_limiter=rate_limiter, **kwargs)
+
+
+def response_cache_report():
+    """
+    :return: list of CacheStats - the hits, misses, and evictions of the response cache for each service.
+    """
+    cache = get_response_cache()
+    with cache.lock:
+        cache_services = list(cache.counts.keys())
+    return [cache.stats(service) for service in cache_services]
@@ -1,19 +1,30 @@
 import os
 
-from autostar.config.datapaths import ref_dir, star_name_format, StringStarName
+from autostar.file_lock import file_lock, atomic_write
+from autostar.config.datapaths import config, star_name_format, StringStarName
 
 
 class NameCorrection:
     def __init__(self, auto_load=True):
-        self.path = os.path.join(ref_dir, "name_correction.psv")
+        self.path = os.path.join(config.ref_dir, "name_correction.psv")
         self.annoying_names = None
         self.sb_names = None
         if auto_load:
             self.load()
 
     def load(self):
-        self.annoying_names = set()
-        self.sb_names = {}
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                with atomic_write(self.path) as f:
+                    f.write("name,simbad\n")
+            self.sb_names = self.read_file()
+        self.annoying_names = set(self.sb_names.keys())
+
+    def read_file(self):
+        """
+        :return: dict - {name: simbad_name} from the name correction file, empty when there is no file.
+        """
+        sb_names = {}
         if os.path.exists(self.path):
             with open(self.path, 'r') as f:
                 first_line = True
@@ -24,17 +35,18 @@ class NameCorrection:
                         line = line.strip()
                         if line != "":
                             name, simbad_name = line.split("|")
-                            self.annoying_names.add(name)
-                            self.sb_names[name] = simbad_name
-        else:
-            with open(self.path, 'w') as f:
-                f.write("name,simbad\n")
+                            sb_names[name] = simbad_name
+        return sb_names
 
     def write(self):
-        with open(self.path, 'w') as f:
-            f.write("name|simbad\n")
-            for name in sorted(self.sb_names.keys()):
-                f.write(str(name).lower() + "|" + str(self.sb_names[name]) + "\n")
+        with file_lock(self.path):
+            # the names that other processes added since the file was read are kept
+            for name, simbad_name in self.read_file().items():
+                self.sb_names.setdefault(name, simbad_name)
+            with atomic_write(self.path) as f:
+                f.write("name|simbad\n")
+                for name in sorted(self.sb_names.keys()):
+                    f.write(str(name).lower() + "|" + str(self.sb_names[name]) + "\n")
         self.load()
 
     def append(self, name, simbad_name):
@@ -46,14 +58,29 @@ class NameCorrection:
             self.annoying_names.add(name)
             self.annoying_names.add(name)
             self.sb_names[name] = simbad_name
-            with open(self.path, 'a') as f:
-                f.write(str(name).lower() + "," + str(self.sb_names[name]) + "\n")
+            with file_lock(self.path), open(self.path, 'a') as f:
+                f.write(str(name).lower() + "|" + str(self.sb_names[name]) + "\n")
+
+
+def get_name_correction():
+    """
+    The NameCorrection that is shared by autostar, available as autostar.simbad_names.nc.
+    The name_correction.psv file is read the first time this is called, not when this module is imported.
+    """
+    nc = globals().get("nc")
+    if nc is None:
+        nc = globals()["nc"] = NameCorrection()
+    return nc
 
 
-nc = NameCorrection()
+def __getattr__(name):
+    if name == "nc":
+        return get_name_correction()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def verify_starname(test_object_name):
+    nc = get_name_correction()
     object_name = None
     # This is catch for star names that are annoying that were previously found and recorded
     if test_object_name.lower() in nc.annoying_names:
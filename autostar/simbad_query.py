@@ -1,80 +1,587 @@
 import os
+import asyncio
 import warnings
+import importlib
+import threading
 import numpy as np
 from typing import Union, Tuple
-from time import sleep
-from collections import namedtuple, UserDict
-
-from astropy import units as u
-from astropy.coordinates import SkyCoord
-from astroquery.simbad import Simbad
-from astroquery.exceptions import TableParseError
+from functools import partial
+from collections import namedtuple
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from autostar.bad_stars import BadStars
 from autostar.table_read import row_dict
-from autostar.config.datapaths import sb_desired_names, star_name_format, star_name_preference, \
-    StringStarName, StarName, sb_main_ref_filename, sb_ref_filename, optimal_star_name
+from autostar.rate_limit import get_rate_limiter
+from autostar.response_cache import cached_query
+from autostar.not_found_cache import get_not_found_cache
+from autostar.ref_snapshot import read_snapshot, write_snapshot, gc_paused
+from autostar.file_lock import file_lock, atomic_write, file_generation
+from autostar.config import datapaths
+from autostar.config.datapaths import config, star_name_format, StringStarName, StarName, optimal_star_name
 
 
 Star_ID = namedtuple("Star_ID", "catalog type id")
-simbad_count = 1
+
+
+# Simbad clients for the servers set with simbad_server_url in the config, by url
+simbad_clients = {}
+
+
+def make_simbad_client(server_url):
+    """
+    An astroquery Simbad client for a Simbad TAP service at server_url + '/simbad/sim-tap', astroquery only allows
+    the Simbad mirrors in astroquery.simbad.conf.servers_list. This is used with autostar.standin_server.
+    """
+    simbad_class = importlib.import_module("astroquery.simbad").SimbadClass
+    tap_service = importlib.import_module("pyvo.dal").TAPService
+    tap_url = server_url.rstrip("/") + "/simbad/sim-tap"
+
+    class SimbadServerClass(simbad_class):
+        @property
+        def tap(self):
+            if self._tap is None:
+                self._tap = tap_service(baseurl=tap_url, session=self._session)
+            return self._tap
+    return SimbadServerClass()
+
+
+def get_simbad():
+    """
+    The astroquery Simbad client. astroquery is imported at 'runtime' not 'import time', the first time that a
+    remote query is made, so that reading the reference data does not pay for the astroquery and astropy imports.
+    """
+    server_url = config.get('simbad_server_url')
+    if not server_url:
+        return importlib.import_module("astroquery.simbad").Simbad
+    if server_url not in simbad_clients:
+        simbad_clients[server_url] = make_simbad_client(server_url)
+    return simbad_clients[server_url]
+
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine from synchronous code. asyncio.run raises RuntimeError inside a running event loop (i.e. a
+    Jupyter notebook or an async web server), so there the coroutine runs in its own event loop in a worker thread
+    and this thread waits for the result.
+
+    :param coroutine: a coroutine object, i.e. simbad_query.get_main_data_async(formatted_names).
+    :return: the result of the coroutine.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # no event loop is running in this thread
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def is_missing_value(value):
+    if value is None or np.ma.is_masked(value):
+        return True
+    if isinstance(value, str):
+        return value.strip() == ''
+    return isinstance(value, (float, np.floating)) and np.isnan(value)
+
+
+def coord_values(record):
+    """
+    The RA and Dec of a Simbad record, i.e. the table from Simbad.query_object or a SimbadMainRef object dict.
+    Older Simbad services give sexagesimal 'RA' and 'DEC' columns, Simbad TAP gives 'ra' and 'dec' in degrees.
+
+    :return: tuple or None - (ra, dec) as they are in the record, None when the record has no coordinates.
+    """
+    record_keys = record.colnames if hasattr(record, "colnames") else record.keys()
+    for ra_key, dec_key in (("RA", "DEC"), ("ra", "dec")):
+        if ra_key in record_keys and dec_key in record_keys:
+            ra, dec = record[ra_key], record[dec_key]
+            if hasattr(record, "colnames"):
+                if len(record) == 0:
+                    return None
+                ra, dec = ra[0], dec[0]
+            return ra, dec
+    return None
+
+
+def sexagesimal_to_float(value):
+    """
+    Read a space or colon separated sexagesimal string, i.e. Simbad's '12 34 56.78' or '-00 30 00.1',
+    this is much faster than the string parsing in astropy.
+
+    :return: float - the value in the units of the first field, hours or degrees.
+    """
+    fields = value.replace(":", " ").split()
+    if not 1 <= len(fields) <= 3:
+        raise ValueError(f"{value} is not a sexagesimal value")
+    sign = -1.0 if value.lstrip().startswith("-") else 1.0
+    return sign * sum(abs(float(field)) / scale for field, scale in zip(fields, (1.0, 60.0, 3600.0)))
+
+
+def simbad_coords_to_deg(ra_values, dec_values):
+    """
+    Convert many Simbad coordinates at once, with one array SkyCoord for all of them.
+
+    :param ra_values: iterable - RA as sexagesimal hour angle strings, i.e. '12 34 56.78', or as degrees.
+    :param dec_values: iterable - Dec as sexagesimal degree strings, i.e. '+12 34 56.7', or as degrees.
+    :return: tuple - (ra_deg, dec_deg, hmsdms), numpy arrays of RA and Dec in degrees that are nan for the
+             coordinates that are missing or could not be read, and a list of 'hmsdms' strings that are None for them.
+    """
+    # import astropy at 'runtime' not 'import time', only coordinate conversions need it
+    u = importlib.import_module("astropy.units")
+    sky_coord = importlib.import_module("astropy.coordinates").SkyCoord
+    ra_values, dec_values = list(ra_values), list(dec_values)
+    ra_deg = np.full(len(ra_values), np.nan)
+    dec_deg = np.full(len(ra_values), np.nan)
+    # the coordinates that are not numbers or simple sexagesimal strings
+    astropy_indexes = []
+    for index, (ra, dec) in enumerate(zip(ra_values, dec_values)):
+        if is_missing_value(ra) or is_missing_value(dec):
+            continue
+        try:
+            ra_deg[index], dec_deg[index] = float(ra), float(dec)
+        except (TypeError, ValueError):
+            try:
+                ra_deg[index], dec_deg[index] = sexagesimal_to_float(ra) * 15.0, sexagesimal_to_float(dec)
+            except (AttributeError, ValueError):
+                # other formats, i.e. '12h34m56.78s', are read by astropy
+                ra_deg[index] = dec_deg[index] = np.nan
+                astropy_indexes.append(index)
+    if astropy_indexes:
+        ra_strings = [str(ra_values[index]) for index in astropy_indexes]
+        dec_strings = [str(dec_values[index]) for index in astropy_indexes]
+        try:
+            coords = sky_coord(ra_strings, dec_strings, unit=(u.hourangle, u.deg))
+            ra_deg[astropy_indexes], dec_deg[astropy_indexes] = coords.ra.deg, coords.dec.deg
+        except ValueError:
+            # one coordinate that can not be read fails the array, find it by converting them one at a time
+            for index, ra_string, dec_string in zip(astropy_indexes, ra_strings, dec_strings):
+                try:
+                    coord = sky_coord(ra_string, dec_string, unit=(u.hourangle, u.deg))
+                except ValueError:
+                    continue
+                ra_deg[index], dec_deg[index] = coord.ra.deg, coord.dec.deg
+    hmsdms = [None] * len(ra_values)
+    found_indexes = np.flatnonzero(~(np.isnan(ra_deg) | np.isnan(dec_deg)))
+    if len(found_indexes) > 0:
+        coords = sky_coord(ra=ra_deg[found_indexes] * u.deg, dec=dec_deg[found_indexes] * u.deg)
+        for index, hmsdms_string in zip(found_indexes, coords.to_string('hmsdms')):
+            hmsdms[index] = hmsdms_string
+    return ra_deg, dec_deg, hmsdms
 
 
 def simbad_coord_to_deg(ra_string, dec_string):
-    *_, hms = str(ra_string).split('\n')
-    *_, dms = str(dec_string).split('\n')
-    c = SkyCoord(hms + " " + dms, unit=(u.hourangle, u.deg))
-    return c.ra.deg, c.dec.deg, c.to_string('hmsdms')
+    """ The single coordinate version of simbad_coords_to_deg, a ValueError is raised when it can not be read."""
+    ra_deg, dec_deg, hmsdms = simbad_coords_to_deg([ra_string], [dec_string])
+    if hmsdms[0] is None:
+        raise ValueError(f"The Simbad coordinates RA={ra_string} DEC={dec_string} could not be read.")
+    return float(ra_deg[0]), float(dec_deg[0]), hmsdms[0]
 
 
-def get_single_name_data(formatted_name):
+def names_to_star_dict(names_list, desired_name_types=None):
+    """
+    Make a StarDict from the Simbad identifiers of one object, only the name types in desired_name_types are kept.
+
+    :param names_list: iterable of str - Simbad identifiers, i.e. the ids from Simbad.query_objectids
+    :param desired_name_types: set of str - the name types to keep, the default is sb_desired_names in the config.
+    :return: StarDict
+    """
+    if desired_name_types is None:
+        desired_name_types = config.sb_desired_names
     found_names = StarDict()
-    raw_results = Simbad.query_objectids(formatted_name)
-    if raw_results is not None:
-        names_list = list(raw_results.columns["ID"])
-        for test_name in names_list:
-            try:
-                name_type = optimal_star_name(star_name_lower=test_name.lower())
-            except ValueError:
-                pass
-            else:
-                if name_type in sb_desired_names:
-                    new_hypatia_name = star_name_format(test_name)
-                    found_names[name_type] = new_hypatia_name.id
+    for test_name in names_list:
+        try:
+            name_type = optimal_star_name(star_name_lower=test_name.lower())
+        except ValueError:
+            pass
+        else:
+            if name_type in desired_name_types:
+                new_hypatia_name = star_name_format(test_name)
+                found_names[name_type] = new_hypatia_name.id
     return found_names
 
 
-def get_query_object(formatted_name):
+def ids_column(results_table):
+    # the column is 'ID' in the astroquery versions that used the Simbad script interface and 'id' for Simbad TAP
+    if "id" in results_table.colnames:
+        return results_table["id"]
+    return results_table["ID"]
+
+
+def get_single_name_data(formatted_name, rate_limiter=None):
+    not_found_cache = get_not_found_cache()
+    if not_found_cache.is_not_found(formatted_name):
+        # Simbad did not resolve this name recently, see autostar.not_found_cache
+        return StarDict()
+    # the response is cached, see autostar.response_cache, only the queries sent to Simbad are rate limited
+    raw_results = cached_query('simbad', get_simbad().query_objectids, formatted_name, rate_limiter=rate_limiter)
+    if raw_results is None:
+        star_dict = StarDict()
+    else:
+        star_dict = names_to_star_dict([str(test_name) for test_name in ids_column(raw_results)])
+    if not star_dict:
+        not_found_cache.record([formatted_name])
+    return star_dict
+
+
+# Simbad objects have tens of identifiers, the row limit of a bulk query allows this many identifiers per object
+max_ids_per_object = 200
+
+
+def query_ids_many(formatted_names, rate_limiter=None):
+    """
+    Get all the Simbad identifiers for many objects with one Simbad TAP (ADQL) query.
+
+    The names are uploaded as a table that is joined to Simbad's ident table, once to find each object and a
+    second time to get all the identifiers of that object.
+
+    :param formatted_names: list of str - names that will match Simbad records.
+    :param rate_limiter: TokenBucket - the rate limit for the query, the default is the shared Simbad rate limit.
+    :return: list of lists - the Simbad identifiers for each name in formatted_names, an empty list for names that
+             Simbad does not know.
+    """
+    simbad = get_simbad()
+    table = importlib.import_module("astropy.table").Table
+    upload = table({"user_specified_id": list(formatted_names),
+                    "object_number_id": list(range(len(formatted_names)))})
+    query = "SELECT names.object_number_id, ident.id " \
+            "FROM TAP_UPLOAD.names AS names " \
+            "JOIN ident AS id_typed ON names.user_specified_id = id_typed.id " \
+            "JOIN ident ON id_typed.oidref = ident.oidref"
+    maxrec = max(len(formatted_names) * max_ids_per_object, 10000)
+    raw_results = cached_query('simbad', simbad.query_tap, query, maxrec=maxrec, names=upload,
+                               rate_limiter=rate_limiter)
+    if len(raw_results) >= maxrec:
+        warnings.warn(f"The bulk Simbad identifier query returned the row limit of {maxrec} rows, "
+                      f"some identifiers may be missing. Use a smaller batch size.")
+    ids_by_object = [[] for _ in formatted_names]
+    for object_number_id, simbad_id in zip(raw_results["object_number_id"], ids_column(raw_results)):
+        ids_by_object[int(object_number_id)].append(str(simbad_id))
+    return ids_by_object
+
+
+def get_many_name_data(formatted_names, batch_size=None, rate_limiter=None):
+    """
+    The bulk version of get_single_name_data, the names are resolved with one Simbad TAP query per batch.
+
+    :param formatted_names: iterable of str - names that will match Simbad records.
+    :param batch_size: int - the number of names in each query, the default is sb_bulk_batch_size in the config.
+    :param rate_limiter: TokenBucket - the rate limit for the queries, the default is the shared Simbad rate limit.
+    :return: list of StarDict aligned with formatted_names, the StarDict is empty for names that were not found.
+    """
+    formatted_names = list(formatted_names)
+    if batch_size is None:
+        batch_size = config.get('sb_bulk_batch_size')
+    # the names that Simbad did not resolve recently are not queried, see autostar.not_found_cache
+    not_found_cache = get_not_found_cache()
+    query_names = [formatted_name for formatted_name in formatted_names
+                   if not not_found_cache.is_not_found(formatted_name)]
+    found_names_by_name = {}
+    for batch_start in range(0, len(query_names), batch_size):
+        batch = query_names[batch_start:batch_start + batch_size]
+        found_names_list = [names_to_star_dict(names_list)
+                            for names_list in query_ids_many(batch, rate_limiter=rate_limiter)]
+        not_found_cache.record([formatted_name for formatted_name, found_names in zip(batch, found_names_list)
+                                if not found_names])
+        found_names_by_name.update(zip(batch, found_names_list))
+    return [found_names_by_name.get(formatted_name, StarDict()) for formatted_name in formatted_names]
+
+
+# Simbad TAP column names that are not the upper case of the column names of the older Simbad service
+simbad_tap_column_names = {'coo_err_maj': 'COO_ERR_MAJA', 'coo_err_min': 'COO_ERR_MINA'}
+
+
+def simbad_column_name(column_name):
+    """ The older Simbad service column name, i.e. 'MAIN_ID', for a Simbad TAP column name, i.e. 'main_id'."""
+    return simbad_tap_column_names.get(column_name, column_name.upper())
+
+
+class SimbadRow(Mapping):
+    """
+    A read-only view of one row of a SimbadResult, it is used like a dict of {column name: value}.
+    The values are read from the result's column arrays, nothing is copied.
+    """
+    __slots__ = ('result', 'index')
+
+    def __init__(self, result, index):
+        self.result = result
+        self.index = index
+
+    def __getitem__(self, column_name):
+        return self.result.columns[column_name][self.index]
+
+    def __iter__(self):
+        return iter(self.result.columns)
+
+    def __len__(self):
+        return len(self.result.columns)
+
+    def __repr__(self):
+        return f"SimbadRow({dict(self)})"
+
+
+class SimbadResult:
+    """
+    The columns of a Simbad query result as numpy arrays, with row views for each object.
+
+    :param columns: dict - {column name: numpy array}, the arrays all have the same length.
+    """
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_table(cls, results_table):
+        """
+        The columns of an astropy table from astroquery. The column names are the names of the older Simbad service,
+        i.e. 'MAIN_ID', 'RA', 'DEC', see simbad_column_name. Masked values are '' for text and nan for numbers.
+        """
+        columns = {}
+        for column_name in results_table.colnames:
+            column = results_table[column_name]
+            if getattr(column, "mask", None) is not None and np.any(column.mask):
+                if column.dtype.kind in "iuf":
+                    column_array = np.ma.filled(column.astype(float), np.nan)
+                elif column.dtype.kind in "USO":
+                    column_array = np.ma.filled(column, "")
+                else:
+                    column_array = np.asarray(column)
+            else:
+                column_array = np.asarray(column)
+            columns[simbad_column_name(column_name)] = column_array
+        return cls(columns)
+
+    @property
+    def column_names(self):
+        return list(self.columns.keys())
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"row {index} is out of range for a SimbadResult with {len(self)} rows")
+        return SimbadRow(self, index % len(self))
+
+    def __iter__(self):
+        return (SimbadRow(self, index) for index in range(len(self)))
+
+    def rows(self):
+        return list(self)
+
+
+def get_query_object(formatted_name, rate_limiter=None):
     """
     This is the primary query type for Simbad, it gives the star's Main Simbad ID,
     and it's coordinates.
 
     :param formatted_name: str - a formatted string that will match a Simbad record.
-    :return: list of dicts for multiple objects or a dictionary object with the query data
-             for a single query.
+    :param rate_limiter: TokenBucket - the rate limit for the query, the default is the shared Simbad rate limit.
+    :return: SimbadResult or None - the columns of the query results, with one row for each object that was found,
+             None when Simbad did not find an object.
     """
+    simbad = get_simbad()
+    table_parse_error = importlib.import_module("astroquery.exceptions").TableParseError
     try:
-        results_table = Simbad.query_object(formatted_name)
-    except TableParseError:
+        results_table = cached_query('simbad', simbad.query_object, formatted_name, rate_limiter=rate_limiter)
+    except table_parse_error:
         print(f'\nSimbad Query Exception for {formatted_name}\n')
         return None
-    if results_table is None:
+    if results_table is None or len(results_table) == 0:
         return None
-    results_dict = dict(results_table)
-
-    data_len = len(np.array(results_dict['MAIN_ID']))
-    if data_len != 1:
-        results_per_object = []
-        for object_index in range(data_len):
-            data_this_object = {}
-            for results_key in results_dict.keys():
-                data_this_object[results_key] = np.array(results_dict[results_key])[object_index]
-            results_per_object.append(data_this_object)
-        return results_per_object
-    else:
-        data_this_object = {results_key: np.array(results_dict[results_key])[0]
-                            for results_key in results_dict.keys()}
-        return data_this_object
+    return SimbadResult.from_table(results_table)
+
+
+# the Simbad TAP columns of the main query, the same columns as Simbad.query_object
+main_tap_columns = ['main_id', 'ra', 'dec', 'coo_err_maj', 'coo_err_min', 'coo_err_angle', 'coo_wavelength',
+                    'coo_bibcode']
+
+
+def query_main_many(formatted_names, rate_limiter=None):
+    """
+    The bulk version of get_query_object, the main data of many objects with one Simbad TAP (ADQL) query.
+
+    The names are uploaded as a table that is joined to Simbad's ident table to find each object,
+    and to the basic table for its main data.
+
+    :param formatted_names: list of str - names that will match Simbad records.
+    :param rate_limiter: TokenBucket - the rate limit for the query, the default is the shared Simbad rate limit.
+    :return: SimbadResult - the columns with one row for each name in formatted_names, the rows of the names that
+             Simbad does not know have an empty 'MAIN_ID', '' for the text columns, and nan for the numbers.
+    """
+    simbad = get_simbad()
+    table = importlib.import_module("astropy.table").Table
+    upload = table({"user_specified_id": list(formatted_names),
+                    "object_number_id": list(range(len(formatted_names)))})
+    select_list = ", ".join(f'basic."{column_name}"' for column_name in main_tap_columns)
+    query = f"SELECT names.object_number_id, {select_list} " \
+            f"FROM TAP_UPLOAD.names AS names " \
+            f"JOIN ident ON names.user_specified_id = ident.id " \
+            f"JOIN basic ON ident.oidref = basic.oid"
+    maxrec = max(len(formatted_names), 10000)
+    raw_results = cached_query('simbad', simbad.query_tap, query, maxrec=maxrec, names=upload,
+                               rate_limiter=rate_limiter)
+    found_result = SimbadResult.from_table(raw_results)
+    object_number_ids = np.asarray(found_result.columns.pop('OBJECT_NUMBER_ID'), dtype=int)
+    columns = {}
+    for column_name, column in found_result.columns.items():
+        if column.dtype.kind in "iufb":
+            columns[column_name] = np.full(len(formatted_names), np.nan)
+        else:
+            columns[column_name] = np.full(len(formatted_names), "", dtype=object)
+        columns[column_name][object_number_ids] = column
+    return SimbadResult(columns)
+
+
+def number_column(values):
+    """ The values as a float array, nan for the missing values and for the values that are not numbers."""
+    values = np.asarray(values)
+    if values.dtype.kind in "iufb":
+        return values.astype(float)
+    if values.dtype.kind == "U":
+        missing = np.char.strip(values) == ""
+        numbers = np.full(len(values), np.nan)
+        try:
+            numbers[~missing] = values[~missing].astype(float)
+            return numbers
+        except ValueError:
+            pass
+    numbers = np.full(len(values), np.nan)
+    for index, value in enumerate(values):
+        if not is_missing_value(value):
+            try:
+                numbers[index] = float(value)
+            except (TypeError, ValueError):
+                continue
+    return numbers
+
+
+def text_column(values):
+    """ The values as an object array of str, '' for the missing values."""
+    values = np.asarray(values)
+    if values.dtype.kind == "U":
+        return np.char.strip(values).astype(object)
+    return np.array(["" if is_missing_value(value) else str(value).strip() for value in values], dtype=object)
+
+
+class SimbadMainTable(Mapping):
+    """
+    The Simbad main data of many objects in columns, it is used like a dict of {handle: SimbadRow or None}, where
+    None is an object that Simbad did not find (a row without a MAIN_ID).
+
+    The number columns are numpy float arrays with nan for the missing values, the text columns are numpy object
+    arrays of str with '' for the missing values. The arrays have room for more rows and grow by doubling,
+    so adding rows one at a time does not copy the table each time.
+
+    :param column_names: list of str - the columns, i.e. SimbadMainRef.main_ref_params.
+    :param number_columns: set of str - the columns of numbers, the others are text.
+    :param integer_columns: set of str - the number columns that are written as integers.
+    """
+    def __init__(self, column_names, number_columns, integer_columns=None):
+        self.column_names = list(column_names)
+        self.number_columns = set(number_columns)
+        self.integer_columns = set() if integer_columns is None else set(integer_columns)
+        self.handles = []
+        self.index_by_handle = {}
+        self.columns = {column_name: self.missing_column(column_name, 64) for column_name in self.column_names}
+
+    def missing_column(self, column_name, n_rows):
+        if column_name in self.number_columns:
+            return np.full(n_rows, np.nan)
+        return np.full(n_rows, "", dtype=object)
+
+    def __getitem__(self, handle):
+        index = self.index_by_handle[handle]
+        if self.columns['MAIN_ID'][index] == "":
+            return None
+        return SimbadRow(self, index)
+
+    def __contains__(self, handle):
+        return handle in self.index_by_handle
+
+    def __iter__(self):
+        return iter(self.handles)
+
+    def __len__(self):
+        return len(self.handles)
+
+    def row_indexes(self, handles):
+        """ :return: numpy array - the row index of each handle, the handles that are not in the table are added."""
+        new_handles = [handle for handle in dict.fromkeys(handles) if handle not in self.index_by_handle]
+        if new_handles:
+            n_rows = len(self.handles) + len(new_handles)
+            capacity = len(self.columns[self.column_names[0]])
+            if n_rows > capacity:
+                while capacity < n_rows:
+                    capacity *= 2
+                for column_name, column in self.columns.items():
+                    grown_column = self.missing_column(column_name, capacity)
+                    grown_column[:len(self.handles)] = column[:len(self.handles)]
+                    self.columns[column_name] = grown_column
+            self.index_by_handle.update((handle, index) for index, handle in enumerate(new_handles, len(self.handles)))
+            self.handles.extend(new_handles)
+        return np.fromiter((self.index_by_handle[handle] for handle in handles), dtype=int, count=len(handles))
+
+    def set_columns(self, handles, columns):
+        """
+        Set the rows of many objects at once, the rows of the handles that are in the table are replaced.
+
+        :param handles: list of str - the handle of each row.
+        :param columns: dict - {column name: values aligned with handles}, the columns that are not in
+                        columns are missing values. RA and DEC are degrees, or the sexagesimal strings of the
+                        older Simbad service.
+        """
+        handles = list(handles)
+        indexes = self.row_indexes(handles)
+        for column_name in self.column_names:
+            values = columns.get(column_name)
+            if values is None:
+                self.columns[column_name][indexes] = self.missing_column(column_name, len(handles))
+            elif column_name in self.number_columns:
+                self.columns[column_name][indexes] = number_column(values)
+            else:
+                self.columns[column_name][indexes] = text_column(values)
+        if 'RA' in columns and 'DEC' in columns and np.asarray(columns['RA']).dtype.kind not in "iufb":
+            # the sexagesimal coordinates of the older Simbad service, i.e. '12 34 56.78', are not numbers
+            sexagesimal_rows = np.flatnonzero(np.isnan(self.columns['RA'][indexes])
+                                              & (text_column(columns['RA']) != ""))
+            if len(sexagesimal_rows) > 0:
+                ra_deg, dec_deg, _hmsdms = simbad_coords_to_deg([columns['RA'][row] for row in sexagesimal_rows],
+                                                                [columns['DEC'][row] for row in sexagesimal_rows])
+                self.columns['RA'][indexes[sexagesimal_rows]] = ra_deg
+                self.columns['DEC'][indexes[sexagesimal_rows]] = dec_deg
+
+    def set_row(self, handle, object_dict):
+        """ Set one row from a dict or SimbadRow of {column name: value}, None for an object Simbad did not find."""
+        if object_dict is None:
+            self.set_columns([handle], {})
+        else:
+            self.set_columns([handle], {column_name: [object_dict[column_name]] for column_name in self.column_names
+                                        if column_name in object_dict})
+
+    def column(self, column_name, handles=None):
+        """
+        :param column_name: str - i.e. 'RA'.
+        :param handles: iterable of str - the rows, the default is every row in the order they were added.
+        :return: numpy array - a view of the column for every row, or a copy for the rows of handles.
+        """
+        if handles is None:
+            return self.columns[column_name][:len(self.handles)]
+        return self.columns[column_name][[self.index_by_handle[handle] for handle in handles]]
+
+    def text(self, column_name, indexes):
+        """ :return: numpy object array - the column as the text of the reference file, '' for missing values."""
+        values = self.columns[column_name][indexes]
+        if column_name not in self.number_columns:
+            return values
+        text_values = np.full(len(values), "", dtype=object)
+        found = ~np.isnan(values)
+        if column_name in self.integer_columns:
+            text_values[found] = values[found].astype(np.int64).astype(str)
+        else:
+            text_values[found] = values[found].astype(str)
+        return text_values
 
 
 def simbad_to_handle(simbad_formatted_name):
@@ -87,20 +594,22 @@ def handle_to_simbad(handle):
         .replace("TWOMASS", "2MASS").replace("point", ".").replace("leftsqbracket", "[").replace("rightsqbracket", "]")
 
 
-def make_hypatia_handle(star_names_dict):
+def preferred_string_name(star_names_dict):
+    """ The string name of the star that the hypatia_handle is made from, i.e. 'HIP 1234'."""
     star_type_keys_this_star = set(star_names_dict.keys())
     # select the name to reference this star's data within this class
     star_types_this_star = star_type_keys_this_star - {"star_name_index"}
-    for preferred_name in star_name_preference:
+    for preferred_name in datapaths.star_name_preference:
         if preferred_name in star_types_this_star:
             possible_star_reference_names = sorted([StringStarName((preferred_name, star_id)).string_name
                                                     for star_id in star_names_dict[preferred_name]])
-            star_reference_name = simbad_to_handle(possible_star_reference_names[0])
-            break
-    else:
-        # self.star_name_preference includes all the allowed name types, this error should never be raised
-        raise KeyError("This is no overlap between the star names and the star_name preferences.")
-    return star_reference_name
+            return possible_star_reference_names[0]
+    # self.star_name_preference includes all the allowed name types, this error should never be raised
+    raise KeyError("This is no overlap between the star names and the star_name preferences.")
+
+
+def make_hypatia_handle(star_names_dict):
+    return simbad_to_handle(preferred_string_name(star_names_dict))
 
 
 class SimbadMainRef:
@@ -113,20 +622,27 @@ class SimbadMainRef:
 
     main_ref_params = ['MAIN_ID', 'RA', 'DEC', 'RA_PREC', 'DEC_PREC', 'COO_ERR_MAJA', 'COO_ERR_MINA', 'COO_ERR_ANGLE',
                        'COO_QUAL', 'COO_WAVELENGTH', 'COO_BIBCODE', 'SCRIPT_NUMBER_ID']
+    # the columns that are kept in numpy float arrays, RA and DEC are in degrees
+    main_ref_number_params = {'RA', 'DEC', 'RA_PREC', 'DEC_PREC', 'COO_ERR_MAJA', 'COO_ERR_MINA', 'COO_ERR_ANGLE',
+                              'SCRIPT_NUMBER_ID'}
+    main_ref_integer_params = {'RA_PREC', 'DEC_PREC', 'COO_ERR_ANGLE', 'SCRIPT_NUMBER_ID'}
 
     def __init__(self, ref_path=None, simbad_lib=None):
         if ref_path is None:
-            self.ref_path = sb_main_ref_filename
+            self.ref_path = config.sb_main_ref_filename
         else:
             self.ref_path = ref_path
         if simbad_lib is None:
-            self.simbad_lib = SimbadLib()
+            self.simbad_lib = shared_simbad_lib()
         else:
             self.simbad_lib = simbad_lib
         self.simbad_query = SimbadQuery()
 
-        # data storage
-        self.main_obj_by_handle = {}
+        # data storage, columns of the objects that are used like a dict of {handle: SimbadRow or None}
+        self.main_obj_by_handle = SimbadMainTable(self.main_ref_params, number_columns=self.main_ref_number_params,
+                                                  integer_columns=self.main_ref_integer_params)
+        # the generation of the reference file that was read, see autostar.file_lock
+        self.ref_generation = None
         # operational Flags
         self.write_write_flag = False
 
@@ -142,20 +658,87 @@ class SimbadMainRef:
         return
 
     def str_to_handle(self, string_name):
-        object_handle = make_hypatia_handle(self.simbad_lib.get_star_dict(string_name))
+        object_handle, _star_names_dict = self.simbad_lib.get_star_dict(string_name)
         return object_handle
 
     def add_star(self, string_name, object_handle=None):
         if object_handle is None:
             object_handle = self.str_to_handle(string_name=string_name)
-        if object_handle in self.main_obj_by_handle.keys():
+        if object_handle in self.main_obj_by_handle:
             return False
         else:
-            simbad_string = handle_to_simbad(object_handle)
+            simbad_string = self.simbad_lib.handle_to_string_name(object_handle)
             object_dict = self.simbad_query.get_main_data(formatted_name=simbad_string)
-            self.main_obj_by_handle[object_handle] = object_dict
+            self.main_obj_by_handle.set_row(object_handle, object_dict)
             return True
 
+    def update_many(self, object_handles, batch_size=None):
+        """
+        Get the main data of many objects again, with one Simbad TAP query per batch of objects,
+        the rows of the objects that are in the reference data are replaced.
+
+        :param object_handles: iterable of str - the handles of the objects.
+        :param batch_size: int - the number of objects in each query, the default is sb_bulk_batch_size in the config.
+        """
+        object_handles = list(dict.fromkeys(object_handles))
+        if not object_handles:
+            return
+        formatted_names = [self.simbad_lib.handle_to_string_name(object_handle) for object_handle in object_handles]
+        query_result = self.simbad_query.get_main_data_bulk(formatted_names, batch_size=batch_size)
+        self.main_obj_by_handle.set_columns(object_handles, query_result.columns)
+        self.write_write_flag = True
+
+    def add_stars(self, string_names, batch_size=None):
+        """
+        The bulk version of add_star, the main data for the stars that are not in the reference data are
+        found with one Simbad query per batch, see update_many.
+
+        :param string_names: iterable of str - star names.
+        :param batch_size: int - the number of objects in each query, the default is sb_bulk_batch_size in the config.
+        :return: list of str - the handles of string_names, in the same order.
+        """
+        string_names = list(string_names)
+        # one bulk Simbad query for the names that are not in the Simbad reference data
+        self.simbad_lib.batch_update(string_names)
+        object_handles = [self.simbad_lib.get_star_dict(string_name)[0] for string_name in string_names]
+        self.update_many([object_handle for object_handle in object_handles
+                          if object_handle not in self.main_obj_by_handle], batch_size=batch_size)
+        return object_handles
+
+    def get_objects(self, string_names, batch_size=None):
+        """ The bulk version of get_object, the results are in the order of string_names."""
+        return [self.main_obj_by_handle[object_handle]
+                for object_handle in self.add_stars(string_names, batch_size=batch_size)]
+
+    def column(self, column_name, object_handles=None):
+        """
+        One column of the reference data as a numpy array, i.e. self.column('RA') for the RA of every object
+        in degrees. The number columns are float arrays with nan for missing values, the text columns are
+        object arrays of str with '' for missing values.
+
+        :param column_name: str - one of main_ref_params.
+        :param object_handles: iterable of str - the handles, the default is every object in the reference data in
+                               the order of self.main_obj_by_handle.handles.
+        :return: numpy array
+        """
+        return self.main_obj_by_handle.column(column_name, object_handles)
+
+    def get_coords(self, object_handles=None):
+        """
+        The RA and Dec of many objects in the reference data, with the 'hmsdms' strings from one array SkyCoord.
+
+        :param object_handles: iterable of str - the handles, the default is every object in the reference data.
+        :return: dict - {handle: (ra_deg, dec_deg, hmsdms)} for the objects that have coordinates.
+        """
+        if object_handles is None:
+            object_handles = sorted(self.main_obj_by_handle.keys())
+        found_handles = [object_handle for object_handle in object_handles if object_handle in self.main_obj_by_handle]
+        ra_deg, dec_deg, hmsdms = simbad_coords_to_deg(self.column('RA', found_handles),
+                                                       self.column('DEC', found_handles))
+        return {object_handle: (float(ra), float(dec), hmsdms_string)
+                for object_handle, ra, dec, hmsdms_string in zip(found_handles, ra_deg, dec_deg, hmsdms)
+                if hmsdms_string is not None}
+
     def get_object(self, string_name, object_handle=None):
         if object_handle is None:
             object_handle = self.str_to_handle(string_name=string_name)
@@ -165,44 +748,66 @@ class SimbadMainRef:
 
     def write(self):
         print(f'Writing the Simbad main query reference file at: {self.ref_path}')
-        with open(self.ref_path, 'w') as f:
-            header_line = f'handle'
-            for simbad_column in self.main_ref_params:
-                header_line += f',{simbad_column}'
-            f.write(header_line + '\n')
-            for object_handle in sorted(self.main_obj_by_handle.keys()):
-                object_data = self.main_obj_by_handle[object_handle]
-                line = f'{object_handle}'
-                for simbad_column in self.main_ref_params:
-                    if object_data is None:
-                        line += f','
-                    elif simbad_column not in object_data.keys():
-                        line += f','
-                    elif isinstance(object_data[simbad_column], str) and object_data[simbad_column] == '':
-                        line += f','
-                    elif isinstance(object_data[simbad_column], (float, int)) and np.isnan(object_data[simbad_column]):
-                        line += f','
-                    else:
-                        line += f',{object_data[simbad_column]}'
-                f.write(line + '\n')
+        with file_lock(self.ref_path):
+            ref_generation = file_generation(self.ref_path)
+            if ref_generation is not None and ref_generation != self.ref_generation:
+                # another process wrote the file since it was read, its new objects are kept
+                self.read(overwrite=False)
+            with atomic_write(self.ref_path) as f:
+                self.write_lines(f)
+            self.ref_generation = file_generation(self.ref_path)
         self.write_write_flag = False
         print(f'  ...writing complete')
 
-    def read(self):
+    def write_lines(self, f):
+        f.write(','.join(['handle'] + self.main_ref_params) + '\n')
+        # the columns are made into text all at once, in the order of the sorted handles
+        handles = np.array(self.main_obj_by_handle.handles, dtype=object)
+        sorted_indexes = np.argsort(handles.astype(str), kind='stable')
+        text_columns = [self.main_obj_by_handle.text(simbad_column, sorted_indexes)
+                        for simbad_column in self.main_ref_params]
+        f.writelines(','.join(line_values) + '\n' for line_values in zip(handles[sorted_indexes], *text_columns))
+
+    def read(self, overwrite=True):
+        """
+        :param overwrite: bool - when False, only the objects that are not in memory are read from the file.
+        """
         print(f'Read the Simbad main query reference file at: {self.ref_path}')
-        file_data = row_dict(filename=self.ref_path, key='handle', null_value='',
-                             inner_key_remove=True)
-        formatted_data = {}
-        for handle in file_data.keys():
-            file_record = file_data[handle]
-            if file_record == {}:
-                formatted_data[handle] = None
-            else:
-                formatted_data[handle] = file_record
-        self.main_obj_by_handle.update(formatted_data)
+        column_names = None
+        rows = []
+        with file_lock(self.ref_path, shared=True):
+            self.ref_generation = file_generation(self.ref_path)
+            with open(self.ref_path, 'r') as f:
+                for line in f:
+                    if line.strip() == '' or line[0] == '#':
+                        continue
+                    # the values are stripped by column, see number_column and text_column
+                    values = line.rstrip('\r\n').split(',')
+                    if column_names is None:
+                        column_names = [value.strip() for value in values]
+                    else:
+                        # a line without its last empty values
+                        rows.append(values + [''] * (len(column_names) - len(values)))
+        if column_names is None or not rows:
+            return
+        file_columns = dict(zip(column_names, (np.array(column, dtype=str) for column in zip(*rows))))
+        handles = np.char.strip(file_columns.pop('handle'))
+        if not overwrite:
+            new_rows = np.array([handle not in self.main_obj_by_handle for handle in handles], dtype=bool)
+            handles = handles[new_rows]
+            file_columns = {column_name: column[new_rows] for column_name, column in file_columns.items()}
+        self.main_obj_by_handle.set_columns(handles.tolist(), file_columns)
 
 
 class SimbadLib:
+    """
+    The names of each star, from the Simbad reference data or from Simbad, found by any of the star's names.
+
+    A SimbadLib can be used from many threads. The lock guards the lookup dicts of this class and its simbad_ref,
+    and it is not held during the queries to Simbad. A name is only queried by one thread at a time, the other
+    threads that ask for the same name while the query is in flight wait for it and share its result. See
+    shared_simbad_lib for the SimbadLib that the other classes of autostar use by default.
+    """
     def __init__(self, ref_file_name=None, verbose=True, go_fast=False, test_bad_stars=False, auto_load=True):
         self.test_bad_stars = test_bad_stars
         self.verbose = verbose
@@ -210,24 +815,38 @@ class SimbadLib:
         self.simbad_query = None
         self.ref_file_name = ref_file_name
 
-        self.simbad_ref = SimbadRef(ref_file_name=self.ref_file_name)
+        self.simbad_ref = simbad_ref_storage(ref_file_name=self.ref_file_name)
         self.bad_stars = None
 
         self.reference_lookup = {}
         self.available_reference_ids = {}
         self.available_name_types = set()
+        # {hypatia_handle: star_names_dict} for the stars in the lookup
+        self.handle_lookup = {}
         self.handle_to_output_name = None
 
+        self.lock = threading.RLock()
+        # {StarName: Future} for the names that are being queried, the Future is done when the query is saved
+        self.in_flight = {}
+
         if auto_load:
             self.load()
 
     def load(self):
-        self.simbad_ref.load()
-        self.simbad_ref.make_lookup()
-        self.bad_stars = BadStars()
+        with self.lock:
+            self.simbad_ref.load()
+            self.simbad_ref.make_lookup()
+            self.bad_stars = BadStars()
 
-    def update_lookup(self, star_names_dict):
-        hypatia_handle = make_hypatia_handle(star_names_dict)
+    def update_lookup(self, star_names_dict, hypatia_handle=None):
+        """
+        :param star_names_dict: StarDict - the names of one star.
+        :param hypatia_handle: str - the star's handle when it is known, i.e. from the Simbad reference data,
+                               otherwise it is made with make_hypatia_handle.
+        """
+        if hypatia_handle is None:
+            hypatia_handle = make_hypatia_handle(star_names_dict)
+        self.handle_lookup[hypatia_handle] = star_names_dict
         for name_type in star_names_dict.keys():
             star_ids = star_names_dict[name_type]
             if name_type in self.available_name_types:
@@ -240,6 +859,63 @@ class SimbadLib:
             for star_id in star_names_dict[name_type]:
                 self.reference_lookup[name_type][star_id] = hypatia_handle, star_names_dict
 
+    def in_lookup(self, hypatia_name):
+        name_type, star_id = hypatia_name
+        return name_type in self.available_name_types and star_id in self.available_reference_ids[name_type]
+
+    def find_star_dict(self, hypatia_name):
+        """
+        Case 1 and Case 2 of get_star_dict, the lock is held.
+
+        :return: (hypatia_handle, star_names_dict) or None - None when the name is not in the reference data.
+        """
+        name_type, star_id = hypatia_name
+        # check this class's reference_data to see if this has been requested before
+        if self.in_lookup(hypatia_name):
+            # Case 1, when we have looked up this reference data before
+            return self.reference_lookup[name_type][star_id]
+        # No ref data found yet
+        # Check to see if the data can be found and made from the simbad reference csv file
+        found = self.simbad_ref.get_star_dict_and_handle(hypatia_name)
+        if found is None and self.simbad_ref.refresh():
+            # another process added reference data since it was read
+            found = self.simbad_ref.get_star_dict_and_handle(hypatia_name)
+        if found is not None:
+            # Case 2, a star_dict was found in the simbad ref csv file
+            # update the lookup dicts for this class and the name is now found at Case 1
+            hypatia_handle, star_names_dict = found
+            self.update_lookup(star_names_dict, hypatia_handle)
+            return self.reference_lookup[name_type][star_id]
+        return None
+
+    def get_star_dict_from_handle(self, hypatia_handle):
+        """
+        The reverse of get_star_dict, the names of a star from its hypatia_handle.
+
+        :param hypatia_handle: str - i.e. 'HIP_1234'
+        :return: StarDict - the star's names. A handle that is not in the reference data is converted to a star name
+                 with handle_to_simbad and found with get_star_dict.
+        """
+        with self.lock:
+            star_names_dict = self.handle_lookup.get(hypatia_handle)
+            if star_names_dict is None:
+                star_names_dict = self.simbad_ref.get_star_dict_from_handle(hypatia_handle)
+                if star_names_dict is not None:
+                    self.update_lookup(star_names_dict, hypatia_handle)
+        if star_names_dict is None:
+            _hypatia_handle, star_names_dict = self.get_star_dict(handle_to_simbad(hypatia_handle))
+        return star_names_dict
+
+    def handle_to_string_name(self, hypatia_handle):
+        """ The Simbad name that a hypatia_handle was made from, i.e. 'HIP 1234' for 'HIP_1234'."""
+        with self.lock:
+            star_names_dict = self.handle_lookup.get(hypatia_handle)
+            if star_names_dict is None:
+                star_names_dict = self.simbad_ref.get_star_dict_from_handle(hypatia_handle)
+        if star_names_dict is None:
+            return handle_to_simbad(hypatia_handle)
+        return preferred_string_name(star_names_dict)
+
     def get_star_dict(self, hypatia_name: Union[str, Tuple]):
         """
         :param hypatia_name:
@@ -247,50 +923,196 @@ class SimbadLib:
         """
         if type(hypatia_name) == str:
             hypatia_name = star_name_format(hypatia_name)
+        with self.lock:
+            found = self.find_star_dict(hypatia_name)
+        if found is not None:
+            return found
+        # The data was not in the simbad reference csv file, we will try to get data from the Simbad website
+        self.resolve_names([hypatia_name], bulk=False)
+        # Case 3 or Case 4 updated the lookup dicts for this class, the name is now found at Case 1
+        with self.lock:
+            return self.find_star_dict(hypatia_name)
+
+    def resolve_names(self, hypatia_names, bulk=True, batch_size=None, concurrent=False, max_in_flight=None):
+        """
+        Query Simbad for names that are not in the reference data. The names that another thread is already querying
+        are not queried again, this waits for that thread's query to be saved.
+
+        :param hypatia_names: list of (name_type, star_id) StarNames
+        :param bulk: bool - True for bulk Simbad TAP queries, False for one query per name.
+        :param batch_size: int - the number of names in each bulk query, the default is sb_bulk_batch_size.
+        :param concurrent: bool - when True, the queries are one per name and run concurrently.
+        :param max_in_flight: int - the most concurrent queries, the default is simbad_max_in_flight.
+        :return: list of StarNames - the names that the queries of this thread did not find.
+        """
+        with self.lock:
+            other_flights = {self.in_flight[hypatia_name] for hypatia_name in hypatia_names
+                             if hypatia_name in self.in_flight}
+            own_names = [hypatia_name for hypatia_name in hypatia_names
+                         if hypatia_name not in self.in_flight and not self.in_lookup(hypatia_name)]
+            flight = Future()
+            for hypatia_name in own_names:
+                self.in_flight[hypatia_name] = flight
+        not_found_names = []
+        if own_names:
+            try:
+                not_found_names = self.query_names(own_names, bulk=bulk, batch_size=batch_size, concurrent=concurrent,
+                                                   max_in_flight=max_in_flight)
+            except BaseException as error:
+                # the threads waiting for these names get the same error
+                flight.set_exception(error)
+                raise
+            else:
+                flight.set_result(None)
+            finally:
+                with self.lock:
+                    for hypatia_name in own_names:
+                        del self.in_flight[hypatia_name]
+        for other_flight in other_flights:
+            other_flight.result()
+        return not_found_names
+
+    def query_names(self, hypatia_names, bulk=True, batch_size=None, concurrent=False, max_in_flight=None):
+        """ The queries of resolve_names, the lock is only held to save the results."""
+        # a shortcut to Case 4 for some star know to no have Simbad information
+        query_names = [hypatia_name for hypatia_name in hypatia_names if self.should_query(hypatia_name)]
+        simbad_query = SimbadQuery(verbose=self.verbose, go_fast=self.go_fast)
+        if query_names:
+            simbad_name_list = [StringStarName(hypatia_name).string_name for hypatia_name in query_names]
+            if concurrent:
+                run_coroutine(simbad_query.get_name_data_async(simbad_name_list=simbad_name_list,
+                                                               max_in_flight=max_in_flight))
+            elif bulk:
+                simbad_query.get_name_data_bulk(simbad_name_list=simbad_name_list, batch_size=batch_size)
+            else:
+                simbad_query.get_name_data(simbad_name_list=simbad_name_list)
+        with self.lock:
+            self.simbad_query = simbad_query
+            not_found_names = hypatia_names
+            if simbad_query.stars_found:
+                # Case 3 we got new simbad data from the website.
+                # all the new data is saved to the reference file with one write
+                self.simbad_ref.add_star_dicts(star_dict_list=simbad_query.stars_found)
+                if self.verbose:
+                    if len(query_names) == 1:
+                        print("New reference data found for " + simbad_name_list[0] + ".")
+                    else:
+                        print(f"New reference data found for {len(simbad_query.stars_found)} of "
+                              f"{len(query_names)} stars.")
+                not_found_names = self.update_lookup_from_ref(hypatia_names)
+            for hypatia_name in not_found_names:
+                # Case 4 getting reference data from Simbad has failed.
+                self.not_found(hypatia_name)
+        return not_found_names
+
+    def should_query(self, hypatia_name):
+        """
+        :return: bool - False for the known bad stars, and for the names that Simbad did not resolve in the last
+                 sb_not_found_ttl_days, see autostar.not_found_cache.
+        """
+        if not self.test_bad_stars and hypatia_name in self.bad_stars.hypatia_names:
+            return False
+        return not get_not_found_cache().is_not_found(StringStarName(hypatia_name).string_name)
+
+    def not_found(self, hypatia_name):
+        """ Record a star that has no Simbad reference data, the star's only name is hypatia_name."""
         name_type, star_id = hypatia_name
-        # check this class's reference_data to see if this has been requested before
-        if name_type in self.available_name_types and star_id in self.available_reference_ids[name_type]:
-            # Case 1, when we have looked up this reference data before
-            return self.reference_lookup[name_type][star_id]
+        # is this a star we know about?
+        if hypatia_name in self.bad_stars.hypatia_names:
+            if self.verbose:
+                print("\nKnown Issue: The star " + StringStarName(hypatia_name).string_name + "\n" +
+                      "  is a reported 'bad star name', reason:",
+                      self.bad_stars.hyp_name_to_reason_dict[hypatia_name], "\n")
         else:
-            # No ref data found yet
-            # Check to see if the data can be found and made from the simbad reference csv file
-            star_names_dict = self.simbad_ref.get_star_dict(hypatia_name)
-            if star_names_dict is not None:
-                # Case 2, a star_dict was found in the simbad ref csv file
-                # update the lookup dicts for this class and the method will now exit at case 1
-                self.update_lookup(star_names_dict)
-                return self.get_star_dict(hypatia_name)
-            else:
-                # The data was not in the simbad reference csv file, we will try to get data from the Simbad website
-                self.simbad_query = SimbadQuery(verbose=self.verbose, go_fast=self.go_fast)
-                # a shortcut to Case 4 for some star know to no have Simbad information
-                if self.test_bad_stars or hypatia_name not in self.bad_stars.hypatia_names:
-                    self.simbad_query.get_name_data(simbad_name_list=[StringStarName(hypatia_name).string_name])
-                if self.simbad_query.stars_found:
-                    # Case 3 we got new simbad data from the website.
-                    # we need to save it and update the reference file
-                    self.simbad_ref.add_star_dicts(star_dict_list=self.simbad_query.stars_found)
-                    if self.verbose:
-                        print("New reference data found for " + StringStarName(hypatia_name).string_name + ".")
-                    # with the reference data updated, this should now exit Case 2
-                    return self.get_star_dict(hypatia_name)
+            warnings.warn("\nThe star name '" + StringStarName(hypatia_name).string_name +
+                          " was not found in the reference data!\n")
+        star_names_dict = StarDict()
+        star_names_dict[name_type] = star_id
+        self.update_lookup(star_names_dict)
+
+    def batch_update(self, hypatia_names, batch_size=None, concurrent=False, max_in_flight=None):
+        """
+        Resolve the names that are not in the reference data with bulk Simbad queries, and add the results to the
+        reference data with a single write. After this, get_star_dict answers all these names without a query.
+
+        :param hypatia_names: iterable of str or (name_type, star_id) StarNames
+        :param batch_size: int - the number of names in each Simbad query, the default is sb_bulk_batch_size.
+        :param concurrent: bool - when True, each name is its own Simbad query and the queries run concurrently,
+                           instead of the bulk TAP queries.
+        :param max_in_flight: int - the most concurrent queries, the default is simbad_max_in_flight.
+        :return: list of StarNames - the names that Simbad did not find, not counting the names that were
+                 queried by other threads.
+        """
+        missing_names = []
+        missing_set = set()
+        with self.lock:
+            for hypatia_name in hypatia_names:
+                if isinstance(hypatia_name, str):
+                    hypatia_name = star_name_format(hypatia_name)
+                if self.in_lookup(hypatia_name):
+                    # Case 1 of get_star_dict
+                    continue
+                if hypatia_name in missing_set:
+                    continue
+                found = self.simbad_ref.get_star_dict_and_handle(hypatia_name)
+                if found is not None:
+                    # Case 2 of get_star_dict, the lookup dicts are updated so get_star_dict exits at Case 1
+                    hypatia_handle, star_names_dict = found
+                    self.update_lookup(star_names_dict, hypatia_handle)
                 else:
-                    # Case 4 getting reference data from Simbad has failed.
-                    # is this a star we know about?
-                    if hypatia_name in self.bad_stars.hypatia_names:
-                        if self.verbose:
-                            print("\nKnown Issue: The star " + StringStarName(hypatia_name).string_name + "\n" +
-                                  "  is a reported 'bad star name', reason:",
-                                  self.bad_stars.hyp_name_to_reason_dict[hypatia_name], "\n")
-                    else:
-                        warnings.warn("\nThe star name '" + StringStarName(hypatia_name).string_name +
-                                      " was not found in the reference data!\n")
-                    star_names_dict = StarDict()
-                    star_names_dict[name_type] = star_id
-                    # update the lookup dicts for this class, and the method will now exit at case 1
-                    self.update_lookup(star_names_dict)
-                    return self.get_star_dict(hypatia_name)
+                    missing_names.append(hypatia_name)
+                    missing_set.add(hypatia_name)
+            if missing_names and self.simbad_ref.refresh():
+                # another process added reference data since it was read
+                missing_names = self.update_lookup_from_ref(missing_names)
+        if not missing_names:
+            return []
+        return self.resolve_names(missing_names, batch_size=batch_size, concurrent=concurrent,
+                                  max_in_flight=max_in_flight)
+
+    def update_lookup_from_ref(self, hypatia_names):
+        """
+        :param hypatia_names: list of (name_type, star_id) StarNames
+        :return: list of StarNames - the names that are not in the Simbad reference data, the lookup dicts of this
+                 class are updated with the others.
+        """
+        not_in_ref = []
+        for hypatia_name in hypatia_names:
+            found = self.simbad_ref.get_star_dict_and_handle(hypatia_name)
+            if found is None:
+                not_in_ref.append(hypatia_name)
+            else:
+                hypatia_handle, star_names_dict = found
+                self.update_lookup(star_names_dict, hypatia_handle)
+        return not_in_ref
+
+    def get_star_dict_many(self, hypatia_names, batch_size=None, concurrent=False, max_in_flight=None):
+        """
+        The batch version of get_star_dict. The names in the reference data are found in one pass, and the rest are
+        resolved together with bulk Simbad queries and saved with one write, see batch_update.
+
+        :param hypatia_names: iterable of str, (name_type, star_id) StarNames, or StarDicts - a StarDict is resolved
+                              with get_star_dict_with_star_dict, after all of its names are resolved.
+        :param batch_size: int - the number of names in each Simbad query, the default is sb_bulk_batch_size.
+        :param concurrent: bool - when True, the Simbad queries are one per name and run concurrently.
+        :param max_in_flight: int - the most concurrent queries, the default is simbad_max_in_flight.
+        :return: list of (hypatia_handle, star_names_dict) aligned with hypatia_names.
+        """
+        requested_names = []
+        names_to_resolve = []
+        for hypatia_name in hypatia_names:
+            if isinstance(hypatia_name, Mapping):
+                names_to_resolve.extend(StarName(name_type, star_id) for name_type in hypatia_name.keys()
+                                        for star_id in hypatia_name[name_type])
+            else:
+                if isinstance(hypatia_name, str):
+                    hypatia_name = star_name_format(hypatia_name)
+                names_to_resolve.append(hypatia_name)
+            requested_names.append(hypatia_name)
+        self.batch_update(names_to_resolve, batch_size=batch_size, concurrent=concurrent,
+                          max_in_flight=max_in_flight)
+        return [self.get_star_dict_with_star_dict(hypatia_name) if isinstance(hypatia_name, Mapping)
+                else self.get_star_dict(hypatia_name) for hypatia_name in requested_names]
 
     def get_star_dict_with_star_dict(self, input_star_names_dict):
         name_types_found = []
@@ -300,7 +1122,8 @@ class SimbadLib:
         for name_type in input_star_names_dict.keys():
             for star_id in list(input_star_names_dict[name_type]):
                 hypatia_name = StarName(name_type, star_id)
-                requested_star_names_dict = self.simbad_ref.get_star_dict(hypatia_name)
+                with self.lock:
+                    requested_star_names_dict = self.simbad_ref.get_star_dict(hypatia_name)
                 if requested_star_names_dict is None:
                     name_types_found.append(False)
                     new_hypatia_names.append(hypatia_name)
@@ -330,140 +1153,451 @@ class SimbadLib:
                 for name_type in simbad_search_star_names_dict:
                     for star_id in simbad_search_star_names_dict[name_type]:
                         max_names_dict[name_type] = star_id
-            self.simbad_ref.add_star_dicts([max_names_dict])
+            with self.lock:
+                self.simbad_ref.add_star_dicts([max_names_dict])
             return self.get_star_dict_with_star_dict(input_star_names_dict)
         else:
             raise KeyError("input_star_names_dict was None or empty.")
 
 
+# the SimbadLibs shared by the classes of autostar in this process, by (ref_file_name, verbose, go_fast)
+shared_simbad_libs = {}
+shared_simbad_libs_lock = threading.Lock()
+
+
+def shared_simbad_lib(ref_file_name=None, verbose=True, go_fast=False):
+    """
+    The SimbadLib for this process, made on first use. GaiaLib, TicQuery, SimbadMainRef, PopNamesLib,
+    AllExoPlanets, and CheckStarNames use it when they are not given a SimbadLib, so the reference data is
+    loaded once and each star is looked up once, also from many threads.
+
+    :param ref_file_name: str - the Simbad reference file, the default is sb_ref_filename in the config.
+    :param verbose: bool - the verbose setting of the SimbadLib when it is made by this call.
+    :param go_fast: bool - True turns off the waiting for the Simbad rate limit.
+    :return: SimbadLib - the same SimbadLib for each call with the same reference file and go_fast,
+             the first call sets its verbose setting.
+    """
+    if ref_file_name is None:
+        ref_file_name = config.sb_ref_filename
+    # one SimbadLib for each reference file, however the file name is written
+    key = (os.path.abspath(ref_file_name), go_fast)
+    with shared_simbad_libs_lock:
+        if key not in shared_simbad_libs:
+            shared_simbad_libs[key] = SimbadLib(ref_file_name=key[0], verbose=verbose, go_fast=go_fast)
+        return shared_simbad_libs[key]
+
+
 class SimbadQuery:
     def __init__(self, verbose=True, go_fast=False, desired_name_types=None):
         self.verbose = verbose
         if desired_name_types is None:
-            self.desired_name_types = sb_desired_names
+            self.desired_name_types = config.sb_desired_names
         else:
             self.desired_name_types = desired_name_types
         self.stars_found = []
         self.stars_not_found = []
 
-        self.count = None
+        # the rate limit is shared by all the Simbad queries in this process, go_fast turns off the waiting
+        self.rate_limiter = get_rate_limiter('simbad', go_fast=go_fast)
+        self.coord_star_info = None
+
+    @property
+    def count(self):
+        # the number of Simbad queries made in this process
+        return self.rate_limiter.queries
 
-        self.count_per_big_sleep = 50
-        if go_fast:
-            self.big_sleep_time = 0
-            self.small_sleep_time = 0
+    def record_name_data(self, sb_name_string, star_dict):
+        # the name that was queried is added to the names that Simbad returned
+        if star_dict != StarDict():
+            try:
+                name_type, name_id = star_name_format(sb_name_string)
+            except ValueError:
+                pass
+            else:
+                star_dict[name_type] = name_id
+            self.stars_found.append(star_dict)
         else:
-            self.big_sleep_time = 30
-            self.small_sleep_time = 0.30
-        self.coord_star_info = None
+            self.stars_not_found.append(sb_name_string)
 
     def get_name_data(self, simbad_name_list=None):
-        global simbad_count
         for index, sb_name_string in list(enumerate(simbad_name_list)):
-            simbad_count += 1
             if self.verbose:
                 print("Getting name info for star:", "%30s" % sb_name_string, " ", "%5s" % (index + 1), "of",
                       "%5s" % len(simbad_name_list))
-            star_dict = get_single_name_data(sb_name_string)
-            if star_dict != StarDict():
-                try:
-                    name_type, name_id = star_name_format(sb_name_string)
-                except ValueError:
-                    pass
-                else:
-                    star_dict[name_type] = name_id
-                self.stars_found.append(star_dict)
-            else:
-                self.stars_not_found.append(sb_name_string)
-            if 0 == simbad_count % self.count_per_big_sleep:
-                if self.verbose:
-                    print("\nBig Simbad Sleep:", self.big_sleep_time, 'seconds.\n')
-                sleep(self.big_sleep_time)
+            star_dict = get_single_name_data(sb_name_string, rate_limiter=self.rate_limiter)
+            self.record_name_data(sb_name_string, star_dict)
+
+    def get_name_data_bulk(self, simbad_name_list=None, batch_size=None):
+        """
+        The bulk version of get_name_data, the names are resolved with one Simbad TAP query per batch
+        instead of one query per name. The results are added to self.stars_found and self.stars_not_found.
+
+        :param simbad_name_list: list of str - names that will match Simbad records.
+        :param batch_size: int - the number of names in each query, the default is sb_bulk_batch_size in the config.
+        """
+        simbad_name_list = list(simbad_name_list)
+        if batch_size is None:
+            batch_size = config.get('sb_bulk_batch_size')
+        for batch_start in range(0, len(simbad_name_list), batch_size):
+            batch = simbad_name_list[batch_start:batch_start + batch_size]
+            if self.verbose:
+                print(f"Getting name info for stars {batch_start + 1} to {batch_start + len(batch)} of "
+                      f"{len(simbad_name_list)} in one Simbad query.")
+            star_dicts = get_many_name_data(batch, batch_size=batch_size, rate_limiter=self.rate_limiter)
+            for sb_name_string, star_dict in zip(batch, star_dicts):
+                self.record_name_data(sb_name_string, star_dict)
+
+    def query_coords(self, name_string):
+        """
+        The coordinates of one star as Simbad gives them, see coord_values.
+
+        :param name_string: str - a formatted string that will match a Simbad record.
+        :return: tuple or None - (ra, dec), None when Simbad did not find the star.
+        """
+        result_table = cached_query('simbad', get_simbad().query_object, name_string,
+                                    rate_limiter=self.rate_limiter)
+        if result_table is None:
+            return None
+        return coord_values(result_table)
+
+    @staticmethod
+    def coord_dicts(raw_coords):
+        """
+        Convert the coordinates from query_coords for a batch of stars at once.
+
+        :param raw_coords: list of tuples - (ra, dec) or None for each star.
+        :return: list of dict or None - {'ra': deg, 'dec': deg, 'hmsdms': str} for each star, None when the star
+                 was not found or it has no coordinates.
+        """
+        found_indexes = [index for index, raw_coord in enumerate(raw_coords) if raw_coord is not None]
+        ra_deg, dec_deg, hmsdms = simbad_coords_to_deg([raw_coords[index][0] for index in found_indexes],
+                                                       [raw_coords[index][1] for index in found_indexes])
+        result_dicts = [None] * len(raw_coords)
+        for found_index, index in enumerate(found_indexes):
+            if hmsdms[found_index] is not None:
+                result_dicts[index] = {'ra': float(ra_deg[found_index]), 'dec': float(dec_deg[found_index]),
+                                       'hmsdms': hmsdms[found_index]}
+        return result_dicts
+
+    def record_coord_data(self, name_string, result_dict):
+        if result_dict is not None:
+            try:
+                hypatia_name = star_name_format(name_string)
+            except ValueError:
+                pass
             else:
-                sleep(self.small_sleep_time)
-        self.count = simbad_count
+                self.coord_star_info[hypatia_name] = result_dict
 
     def get_coord_data(self, simbad_name_list=None):
+        """
+        The coordinates and the identifiers of each star, the results are in self.coord_star_info as
+        {hypatia_name: {'ra': deg, 'dec': deg, 'hmsdms': str, 'star_names': StarDict}}.
+        The coordinates of all the stars are converted together after they are queried.
+        """
         self.coord_star_info = {}
         len_names_list = len(simbad_name_list)
-        global simbad_count
+        raw_coords = []
         for index, name_string in list(enumerate(simbad_name_list)):
-            if 0 == simbad_count % self.count_per_big_sleep:
-                if self.verbose:
-                    print("\nBig Simbad Sleep:", self.big_sleep_time, 'seconds.\n')
-                sleep(self.big_sleep_time)
-            else:
-                sleep(self.small_sleep_time)
             if self.verbose:
                 print("Getting data for star:", "%30s" % name_string, " ", "%5s" % (index + 1), "of",
                       "%5s" % len_names_list)
-            result_table = Simbad.query_object(name_string)
-            simbad_count += 1
-            if result_table is not None:
-                try:
-                    ra_deg, dec_deg, hmsdms = simbad_coord_to_deg(result_table.columns["RA"],
-                                                                       result_table.columns["DEC"])
-                    result_dict = {'ra': ra_deg, 'dec': dec_deg, 'hmsdms': hmsdms,
-                                   'star_names': get_single_name_data(name_string)}
-                    hypatia_name = star_name_format(name_string)
-                    self.coord_star_info[hypatia_name] = result_dict
-                except ValueError:
-                    pass
-        self.count = simbad_count
-
-    def get_main_data(self, formatted_name):
-        """ This is the primary query type for Simbad, it gives the star's Main Simbad ID,
-            and it's coordinates.
+            raw_coords.append(self.query_coords(name_string))
+        for name_string, result_dict in zip(simbad_name_list, self.coord_dicts(raw_coords)):
+            if result_dict is not None:
+                result_dict['star_names'] = get_single_name_data(name_string, rate_limiter=self.rate_limiter)
+            self.record_coord_data(name_string, result_dict)
 
-        :param formatted_name: str - a formatted string that will match a Simbad record.
-        :return: dict - A dictionary object with the query data for a single query.
+    def query_main_data(self, formatted_name):
         """
-        global simbad_count
-        if 0 == simbad_count % self.count_per_big_sleep:
-            if self.verbose:
-                print("\nBig Simbad Sleep:", self.big_sleep_time, 'seconds.\n')
-            sleep(self.big_sleep_time)
-        else:
-            sleep(self.small_sleep_time)
-        object_dict = get_query_object(formatted_name=formatted_name)
-        simbad_count += 1
-        if isinstance(object_dict, list):
-            raise TypeError(f"only single object queries are allows, this query resulted in {len(object_dict)} " +
+        :return: SimbadRow or None - the row of the main query result, None when Simbad did not find the star.
+        """
+        query_result = get_query_object(formatted_name, rate_limiter=self.rate_limiter)
+        if query_result is None:
+            return None
+        if len(query_result) != 1:
+            raise TypeError(f"only single object queries are allows, this query resulted in {len(query_result)} " +
                             "objects returned.")
+        return query_result[0]
+
+    def record_main_data(self, formatted_name, object_dict):
         if object_dict is None:
             print(f"No Simbad Main Query data for {formatted_name}.")
         else:
             print(f'Found data from Main Simbad Query. Query:{formatted_name}  ' +
                   f"Main_ID:{object_dict['MAIN_ID']}")
+
+    def get_main_data(self, formatted_name):
+        """ This is the primary query type for Simbad, it gives the star's Main Simbad ID,
+            and it's coordinates.
+
+        :param formatted_name: str - a formatted string that will match a Simbad record.
+        :return: SimbadRow or None - the query data for a single object, used like a dict of {column name: value}.
+        """
+        object_dict = self.query_main_data(formatted_name)
+        self.record_main_data(formatted_name, object_dict)
         return object_dict
 
+    def get_main_data_bulk(self, formatted_names, batch_size=None):
+        """
+        The bulk version of get_main_data, with one Simbad TAP query per batch of names instead of one query
+        per name, see query_main_many.
+
+        :param formatted_names: list of str - formatted strings that will match Simbad records.
+        :param batch_size: int - the number of names in each query, the default is sb_bulk_batch_size in the config.
+        :return: SimbadResult - the columns with one row for each name in formatted_names, the rows of the names that
+                 Simbad did not find have an empty 'MAIN_ID'.
+        """
+        formatted_names = list(formatted_names)
+        if batch_size is None:
+            batch_size = config.get('sb_bulk_batch_size')
+        batch_results = []
+        for batch_start in range(0, len(formatted_names), batch_size):
+            batch = formatted_names[batch_start:batch_start + batch_size]
+            batch_result = query_main_many(batch, rate_limiter=self.rate_limiter)
+            if self.verbose:
+                n_found = int(np.count_nonzero(batch_result.columns['MAIN_ID'] != ""))
+                print(f"Found data from the Main Simbad Query for {n_found} of the names {batch_start + 1} to "
+                      f"{batch_start + len(batch)} of {len(formatted_names)} in one Simbad query.")
+            batch_results.append(batch_result)
+        if not batch_results:
+            return SimbadResult({})
+        return SimbadResult({column_name: np.concatenate([batch_result.columns[column_name]
+                                                          for batch_result in batch_results])
+                             for column_name in batch_results[0].columns.keys()})
+
+    async def run_queries_async(self, query_func, query_args, max_in_flight=None):
+        """
+        Run query_func(query_arg) for each of query_args concurrently.
+
+        astroquery is not async, each query runs in a worker thread and at most max_in_flight queries wait on the
+        network at once. The queries still take tokens from the shared rate limiter, so the rate budget for Simbad
+        is kept no matter how many queries are in flight.
+
+        :param query_func: callable - a function of one argument that makes the rate limited query.
+        :param query_args: iterable - the argument for each query.
+        :param max_in_flight: int - the most queries at once, the default is simbad_max_in_flight in the config.
+        :return: list - the result of each query, in the order of query_args.
+        """
+        if max_in_flight is None:
+            max_in_flight = config.get('simbad_max_in_flight')
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_in_flight)
+        executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+        async def run_query(query_arg):
+            async with semaphore:
+                return await loop.run_in_executor(executor, query_func, query_arg)
+        try:
+            # gather returns the results in the order of the awaitables, not the order the queries finished
+            return await asyncio.gather(*[run_query(query_arg) for query_arg in query_args])
+        finally:
+            executor.shutdown(wait=False)
+
+    async def get_name_data_async(self, simbad_name_list=None, max_in_flight=None):
+        """
+        The concurrent version of get_name_data, the results are added to self.stars_found and
+        self.stars_not_found in the order of simbad_name_list.
+
+        :param simbad_name_list: list of str - names that will match Simbad records.
+        :param max_in_flight: int - the most queries at once, the default is simbad_max_in_flight in the config.
+        :return: list of StarDict aligned with simbad_name_list, the StarDict is empty for names that were not found.
+        """
+        simbad_name_list = list(simbad_name_list)
+        if self.verbose:
+            print(f"Getting name info for {len(simbad_name_list)} stars with concurrent Simbad queries.")
+        star_dicts = await self.run_queries_async(partial(get_single_name_data, rate_limiter=self.rate_limiter),
+                                                  simbad_name_list, max_in_flight=max_in_flight)
+        for sb_name_string, star_dict in zip(simbad_name_list, star_dicts):
+            self.record_name_data(sb_name_string, star_dict)
+        return star_dicts
+
+    async def get_coord_data_async(self, simbad_name_list=None, max_in_flight=None):
+        """ The concurrent version of get_coord_data, the results are in self.coord_star_info."""
+        simbad_name_list = list(simbad_name_list)
+        self.coord_star_info = {}
+        if self.verbose:
+            print(f"Getting data for {len(simbad_name_list)} stars with concurrent Simbad queries.")
+        raw_coords = await self.run_queries_async(self.query_coords, simbad_name_list, max_in_flight=max_in_flight)
+        result_dicts = self.coord_dicts(raw_coords)
+        found_names = [name_string for name_string, result_dict in zip(simbad_name_list, result_dicts)
+                       if result_dict is not None]
+        star_dicts = await self.run_queries_async(partial(get_single_name_data, rate_limiter=self.rate_limiter),
+                                                  found_names, max_in_flight=max_in_flight)
+        star_dicts_by_name = dict(zip(found_names, star_dicts))
+        for name_string, result_dict in zip(simbad_name_list, result_dicts):
+            if result_dict is not None:
+                result_dict['star_names'] = star_dicts_by_name[name_string]
+            self.record_coord_data(name_string, result_dict)
+
+    async def get_main_data_async(self, formatted_names, max_in_flight=None):
+        """
+        The concurrent version of get_main_data.
+
+        :param formatted_names: list of str - formatted strings that will match Simbad records.
+        :param max_in_flight: int - the most queries at once, the default is simbad_max_in_flight in the config.
+        :return: list of SimbadRow - the query data for each name in the order of formatted_names,
+                 None for names that Simbad did not find.
+        """
+        formatted_names = list(formatted_names)
+        object_dicts = await self.run_queries_async(self.query_main_data, formatted_names,
+                                                    max_in_flight=max_in_flight)
+        for formatted_name, object_dict in zip(formatted_names, object_dicts):
+            self.record_main_data(formatted_name, object_dict)
+        return object_dicts
+
+    def get_main_data_many(self, formatted_names, max_in_flight=None):
+        """
+        Run get_main_data_async from synchronous code, see run_coroutine. Inside a running event loop
+        (i.e. a Jupyter notebook) get_main_data_async can be awaited instead, without the extra thread.
+        """
+        return run_coroutine(self.get_main_data_async(formatted_names, max_in_flight=max_in_flight))
+
+
+def line_to_star_dict(line):
+    """ A StarDict from a line of the Simbad reference file, the star names are separated by '|'."""
+    star_dict = StarDict()
+    for string_name in line.strip().split("|"):
+        name_type, star_id = star_name_format(string_name)
+        star_dict[name_type] = star_id
+    return star_dict
+
+
+def star_dict_to_line(star_dict):
+    """ The line of the Simbad reference file for a StarDict, without the newline."""
+    string_names = []
+    for name_type in sorted(star_dict.keys()):
+        string_names.extend(sorted([StringStarName((name_type, star_id)).string_name
+                                    for star_id in star_dict[name_type]], reverse=True))
+    return "|".join(string_names)
+
 
 class SimbadRef:
+    """
+    The Simbad reference data, the names of each star in the file at ref_file_name (one star per line).
+
+    New star dictionaries are appended to a journal file next to the reference file (ref_file_name + '.journal')
+    and merged into the lookup in memory, so adding stars does not rewrite the reference file. The journal is read
+    after the reference file by load(). compact() writes the combined data to the reference file and removes the
+    journal, this is done when the journal has sb_ref_journal_max_lines records.
+
+    The parsed reference file and its lookup are kept in a binary snapshot next to the reference file, see
+    autostar.ref_snapshot, which load() reads instead of the reference file while the reference file is unchanged.
+    The hypatia_handle of each star (see make_hypatia_handle) is made once, when the star is combined into the
+    lookup, and it is kept in the snapshot with the lookup.
+
+    Many processes can share the reference files, see autostar.file_lock. Appending to the journal and compaction
+    hold the reference file's lock, and refresh() reads the records that other processes added since the last read.
+    """
     def __init__(self, ref_file_name=None):
         if ref_file_name is None:
-            self.ref_file_name = sb_ref_filename
+            self.ref_file_name = config.sb_ref_filename
         else:
             self.ref_file_name = ref_file_name
+        self.journal_file_name = self.ref_file_name + ".journal"
+        self.journal_records = 0
+        # the bytes of the journal that have been read, and the generation of the reference file that was read
+        self.journal_offset = 0
+        self.ref_generation = None
         self.star_dict_list = None
         self.available_name_types = None
         self.lookup_dicts = None
         self.found_ids = None
+        # the hypatia_handle of each star in self.star_dict_list, and {hypatia_handle: index}
+        self.handles = None
+        self.handle_index = None
+        # True when self.lookup_dicts is up-to-date with self.star_dict_list, see make_lookup
+        self.lookup_current = False
 
     def load(self):
         self.available_name_types = set()
-        self.star_dict_list = []
-        if os.path.exists(self.ref_file_name):
-            with open(self.ref_file_name, 'r') as f:
-                for line in f.readlines():
-                    star_dict = StarDict()
-                    ref_line_list = line.strip().split("|")
-                    for string_name in ref_line_list:
-                        name_type, star_id = star_name_format(string_name)
-                        star_dict[name_type] = star_id
+        self.lookup_dicts = None
+        self.found_ids = None
+        self.handles = None
+        self.handle_index = None
+        self.lookup_current = False
+        with file_lock(self.ref_file_name, shared=True):
+            self.ref_generation = file_generation(self.ref_file_name)
+            with gc_paused():
+                snapshot = read_snapshot(self.ref_file_name, 'simbad_ref')
+                if snapshot is not None:
+                    self.load_snapshot(snapshot)
+            if snapshot is None:
+                self.star_dict_list = []
+                if os.path.exists(self.ref_file_name):
+                    with open(self.ref_file_name, 'r') as f:
+                        for line in f.readlines():
+                            self.star_dict_list.append(line_to_star_dict(line))
+                    # the snapshot is of the reference file alone, it is written before the journal is read
+                    self.make_lookup()
+                    self.write_snapshot()
+            # the records that were added since the last compaction
+            self.journal_records = 0
+            self.journal_offset = 0
+            self.read_journal()
+
+    def read_journal(self):
+        """ Add the journal records after self.journal_offset, the records added since the journal was last read."""
+        try:
+            with open(self.journal_file_name, 'rb') as f:
+                f.seek(self.journal_offset)
+                journal_bytes = f.read()
+        except FileNotFoundError:
+            return
+        # a line without a newline is cut short, i.e. by a crash, it is removed before the next append
+        complete_bytes = journal_bytes.rfind(b"\n") + 1
+        for line in journal_bytes[:complete_bytes].decode("utf-8").splitlines():
+            if line.strip():
+                star_dict = line_to_star_dict(line)
+                if self.lookup_current:
+                    self.add_to_lookup(star_dict)
+                else:
                     self.star_dict_list.append(star_dict)
+                self.journal_records += 1
+        self.journal_offset += complete_bytes
+
+    def refresh(self):
+        """
+        Read the changes that other processes made to the reference data since it was read. Only the new journal
+        records are read, unless the reference file was replaced (compacted), then everything is loaded again.
+
+        :return: bool - True when there was new reference data.
+        """
+        if self.star_dict_list is None:
+            self.load()
+            return True
+        with file_lock(self.ref_file_name, shared=True):
+            if file_generation(self.ref_file_name) != self.ref_generation:
+                self.load()
+                return True
+            journal_records = self.journal_records
+            self.read_journal()
+            return self.journal_records > journal_records
+
+    def load_snapshot(self, snapshot):
+        star_names_dicts, self.lookup_dicts, self.handles = snapshot
+        self.handle_index = {hypatia_handle: index for index, hypatia_handle in enumerate(self.handles)}
+        self.star_dict_list = []
+        for star_names_dict in star_names_dicts:
+            star_dict = StarDict()
+            star_dict.data = star_names_dict
+            self.star_dict_list.append(star_dict)
+        self.available_name_types = set(self.lookup_dicts.keys())
+        self.found_ids = {name_type: lookup_this_type.keys()
+                          for name_type, lookup_this_type in self.lookup_dicts.items()}
+        self.lookup_current = True
+
+    def write_snapshot(self, write_name=None):
+        """ Write the binary snapshot of the reference file at write_name, with the lookup."""
+        if write_name is None:
+            write_name = self.ref_file_name
+        if self.lookup_current:
+            write_snapshot(write_name, 'simbad_ref',
+                           ([star_dict.data for star_dict in self.star_dict_list], self.lookup_dicts, self.handles))
 
     def load_csv(self):
         self.available_name_types = set()
+        self.handles = None
+        self.lookup_current = False
         if os.path.exists(self.ref_file_name):
             ref_list = row_dict(self.ref_file_name, null_value="")
         else:
@@ -490,41 +1624,87 @@ class SimbadRef:
         name_type, star_id = hypatia_name
         star_dict = self.star_dict_list[self.lookup_dicts[name_type][star_id]]
 
-        This method will combine star dictionaries in self.star_dict_list and remove one of the copies after
-        combination of dictionaries that wer found to have overlapping data for the same object.
+        This method will combine star dictionaries in self.star_dict_list that were found to have overlapping data
+        for the same object, and remove the copies after combination. Overlaps are found in one pass with a
+        union-find (disjoint-set) of the list indexes, so the star dictionaries that are joined through other
+        star dictionaries (A and B share an HD name, B and C share a HIP name) are all combined. The combined
+        star dictionary takes the place of the first of its copies in the list.
+
+        The lookup is not made again when it is already up-to-date, i.e. after load() read a snapshot.
 
         :return:
         """
         if self.star_dict_list is None:
             self.load()
+        if self.lookup_current:
+            return
+        # the union-find parent of each index of self.star_dict_list, the root of each set is its smallest index
+        parents = list(range(len(self.star_dict_list)))
+
+        def find(index):
+            root = index
+            while parents[root] != root:
+                root = parents[root]
+            # path compression, the next find for these indexes is one step
+            while parents[index] != root:
+                parents[index], index = root, parents[index]
+            return root
+
+        # {name_type: {star_id: the first index with this star_id}}
+        first_indexes = {}
+        for index, star_dict in enumerate(self.star_dict_list):
+            # the StarDict's dict is used directly, this loop runs for every name in the reference data
+            for name_type, star_ids in star_dict.data.items():
+                first_indexes_this_type = first_indexes.setdefault(name_type, {})
+                if type(star_ids) is not frozenset:
+                    # a single star_id, see StarDict
+                    star_ids = (star_ids,)
+                for star_id in star_ids:
+                    other_index = first_indexes_this_type.setdefault(star_id, index)
+                    if other_index != index:
+                        root, other_root = find(index), find(other_index)
+                        if root < other_root:
+                            parents[other_root] = root
+                        elif other_root < root:
+                            parents[root] = other_root
+        roots = [find(index) for index in range(len(parents))]
+        # combine the copies into the star dictionary at the root index, only add new names, do not overwrite
+        new_star_dict_list = []
+        new_indexes = []
+        combined_roots = set()
+        for index, (root, star_dict) in enumerate(zip(roots, self.star_dict_list)):
+            if root == index:
+                new_indexes.append(len(new_star_dict_list))
+                new_star_dict_list.append(star_dict)
+            else:
+                # roots are always before the indexes of their set, so the root's new index is already known
+                new_indexes.append(new_indexes[root])
+                combined_roots.add(root)
+                root_star_dict = self.star_dict_list[root]
+                for name_type, star_ids in star_dict.items():
+                    root_star_dict[name_type] = set(star_ids)
+        # the handles are only made for the stars that are new or were combined, the star dictionaries are only
+        # appended to self.star_dict_list after the last make_lookup, so the known handles are at the same indexes
+        old_handles = self.handles or []
+        self.handles = [old_handles[index] if index < len(old_handles) and index not in combined_roots
+                        else make_hypatia_handle(star_dict)
+                        for index, (root, star_dict) in enumerate(zip(roots, self.star_dict_list)) if root == index]
+        self.handle_index = {hypatia_handle: index for index, hypatia_handle in enumerate(self.handles)}
+        if len(new_star_dict_list) < len(self.star_dict_list):
+            print(f"Duplicate data found, {len(self.star_dict_list) - len(new_star_dict_list)} star names dictionaries "
+                  f"were combined by the Simbad reference file tool: make_lookup")
+            self.star_dict_list = new_star_dict_list
+        if self.available_name_types is None:
+            self.available_name_types = set()
+        self.available_name_types |= set(first_indexes.keys())
         self.lookup_dicts = {name_type: {} for name_type in self.available_name_types}
-        self.found_ids = {name_type: set() for name_type in self.available_name_types}
-        for index, star_dict in list(enumerate(self.star_dict_list)):
-            found_index = None
-            name_types_this_star = set(star_dict.keys())
-            for name_type in name_types_this_star:
-                for star_id in star_dict[name_type]:
-                    if name_type in self.available_name_types:
-                        if star_id in self.found_ids[name_type]:
-                            found_index = self.lookup_dicts[name_type][star_id]
-                            break
-                        else:
-                            self.lookup_dicts[name_type][star_id] = index
-                            self.found_ids[name_type].add(star_id)
-                    else:
-                        self.available_name_types.add(name_type)
-                        self.lookup_dicts[name_type] = {star_id: index}
-                        self.found_ids[name_type] = {star_id}
-            if found_index is not None:
-                # only add new types, do not overwrite
-                print("Duplicate_data data found, updating and restarting the Simbad reference file tool: make_lookup")
-                for name_type in name_types_this_star:
-                    self.star_dict_list[found_index][name_type] = star_dict[name_type]
-                    self.available_name_types.add(name_type)
-                self.star_dict_list.pop(index)
-                # run this again with a duplicate entry removed.
-                self.make_lookup()
-                break
+        for name_type, first_indexes_this_type in first_indexes.items():
+            self.lookup_dicts[name_type] = {star_id: new_indexes[index]
+                                            for star_id, index in first_indexes_this_type.items()}
+        # the keys views are sets of the star_ids that are always in sync with self.lookup_dicts
+        self.found_ids = {name_type: lookup_this_type.keys()
+                          for name_type, lookup_this_type in self.lookup_dicts.items()}
+        self.lookup_current = True
 
     def get_star_dict(self, hypatia_name):
         if type(hypatia_name) == str:
@@ -537,14 +1717,113 @@ class SimbadRef:
             star_dict = self.star_dict_list[self.lookup_dicts[name_type][star_id]]
         return star_dict
 
+    def get_star_dict_and_handle(self, hypatia_name):
+        """
+        :return: (hypatia_handle, star_dict) or None - None when the name is not in the reference data.
+        """
+        if type(hypatia_name) == str:
+            hypatia_name = star_name_format(hypatia_name)
+        name_type, star_id = hypatia_name
+        if self.lookup_dicts is None:
+            self.make_lookup()
+        if name_type in self.available_name_types and star_id in self.found_ids[name_type]:
+            index = self.lookup_dicts[name_type][star_id]
+            return self.handles[index], self.star_dict_list[index]
+        return None
+
+    def get_star_dict_from_handle(self, hypatia_handle):
+        """
+        :return: StarDict or None - the names of the star with this hypatia_handle, None when it is not in the
+                 reference data.
+        """
+        if self.lookup_dicts is None:
+            self.make_lookup()
+        index = self.handle_index.get(hypatia_handle)
+        if index is None:
+            return None
+        return self.star_dict_list[index]
+
+    def set_handle(self, index):
+        """ Make the handle of the star at index, after names were added to it."""
+        hypatia_handle = make_hypatia_handle(self.star_dict_list[index])
+        if index < len(self.handles):
+            old_handle = self.handles[index]
+            if old_handle != hypatia_handle and self.handle_index.get(old_handle) == index:
+                del self.handle_index[old_handle]
+            self.handles[index] = hypatia_handle
+        else:
+            self.handles.append(hypatia_handle)
+        self.handle_index[hypatia_handle] = index
+
+    def add_to_lookup(self, star_dict):
+        """ Add one star dictionary to self.star_dict_list and the lookup, combined with the entry it overlaps."""
+        found_indexes = set()
+        for name_type, star_ids in star_dict.items():
+            lookup_this_type = self.lookup_dicts.get(name_type)
+            if lookup_this_type is not None:
+                for star_id in star_ids:
+                    found_index = lookup_this_type.get(star_id)
+                    if found_index is not None:
+                        found_indexes.add(found_index)
+        if len(found_indexes) > 1:
+            # the new names join entries that were separate, the indexes change when they are combined
+            self.star_dict_list.append(star_dict)
+            self.lookup_current = False
+            self.make_lookup()
+            return
+        if found_indexes:
+            # only add new names, do not overwrite
+            index = found_indexes.pop()
+            for name_type, star_ids in star_dict.items():
+                self.star_dict_list[index][name_type] = set(star_ids)
+        else:
+            index = len(self.star_dict_list)
+            self.star_dict_list.append(star_dict)
+        self.set_handle(index)
+        for name_type, star_ids in star_dict.items():
+            if name_type not in self.lookup_dicts:
+                self.available_name_types.add(name_type)
+                self.lookup_dicts[name_type] = {}
+                self.found_ids[name_type] = self.lookup_dicts[name_type].keys()
+            for star_id in star_ids:
+                self.lookup_dicts[name_type][star_id] = index
+
     def add_star_dicts(self, star_dict_list):
-        if self.star_dict_list is None:
-            self.load()
-        self.star_dict_list.extend(star_dict_list)
-        self.make_lookup()
-        self.write()
-        self.load()
-        self.make_lookup()
+        """
+        Add star dictionaries to the reference data. Each one is appended to the journal file and merged into the
+        lookup in memory, the reference file is only written when the journal is compacted, see compact().
+
+        :param star_dict_list: iterable of StarDict - the names of each new star.
+        """
+        star_dict_list = [star_dict for star_dict in star_dict_list if star_dict]
+        journal_bytes = "".join([star_dict_to_line(star_dict) + "\n" for star_dict in star_dict_list]).encode("utf-8")
+        with file_lock(self.ref_file_name):
+            # the records of the other processes are read first, they are before these records in the journal
+            self.refresh()
+            self.make_lookup()
+            if os.path.exists(self.journal_file_name) and os.path.getsize(self.journal_file_name) > self.journal_offset:
+                # everything after the records that were read is a line that was cut short
+                os.truncate(self.journal_file_name, self.journal_offset)
+            with open(self.journal_file_name, 'ab') as f:
+                f.write(journal_bytes)
+            self.journal_offset += len(journal_bytes)
+            self.journal_records += len(star_dict_list)
+            for star_dict in star_dict_list:
+                self.add_to_lookup(star_dict)
+            if self.journal_records >= config.get('sb_ref_journal_max_lines'):
+                self.compact()
+
+    def compact(self):
+        """ Write the reference data, with the journal records combined into it, to the reference file and remove
+        the journal."""
+        with file_lock(self.ref_file_name):
+            self.refresh()
+            self.make_lookup()
+            self.write()
+            if os.path.exists(self.journal_file_name):
+                os.remove(self.journal_file_name)
+            self.journal_records = 0
+            self.journal_offset = 0
 
     def write(self, write_name=None):
         if write_name is None:
@@ -552,18 +1831,14 @@ class SimbadRef:
         body = []
         # write the star_name reference data
         for star_dict in self.star_dict_list:
-            a_line = ""
-            for name_type in sorted(star_dict.keys()):
-                names_list_this_type = sorted([StringStarName((name_type, star_id)).string_name
-                                               for star_id in star_dict[name_type]], reverse=True)
-                for string_name in names_list_this_type:
-                    a_line += string_name + "|"
-
-            body.append(a_line[:-1] + "\n")
-        # The file writing code
-        with open(write_name, 'w') as f:
+            body.append(star_dict_to_line(star_dict) + "\n")
+        # The file writing code, the file is replaced, so readers never see part of it
+        with file_lock(write_name), atomic_write(write_name) as f:
             for a_line in body:
                 f.write(a_line)
+        if write_name == self.ref_file_name:
+            self.ref_generation = file_generation(write_name)
+        self.write_snapshot(write_name)
 
     def write_csv(self, write_name=None):
         if write_name is None:
@@ -607,26 +1882,102 @@ class SimbadRef:
                 f.write(a_line)
 
 
-class StarDict(UserDict):
-    def __missing__(self, key):
-        if isinstance(key, str):
-            raise KeyError
-        return self[str(key)]
+def simbad_ref_storage(ref_file_name=None):
+    """
+    The Simbad reference data with the storage engine set by sb_ref_backend in the config, 'txt' for SimbadRef or
+    'sqlite' for autostar.simbad_ref_db.SimbadRefDB. Both have load, make_lookup, get_star_dict, and add_star_dicts.
+
+    :param ref_file_name: str - the text reference file, for 'sqlite' this fills a new database.
+    """
+    backend = config.get('sb_ref_backend')
+    if backend == 'txt':
+        return SimbadRef(ref_file_name=ref_file_name)
+    elif backend == 'sqlite':
+        return importlib.import_module("autostar.simbad_ref_db").SimbadRefDB(txt_file_name=ref_file_name)
+    raise ValueError(f"Unknown sb_ref_backend '{backend}', expected 'txt' or 'sqlite'")
+
+
+class StarDict(MutableMapping):
+    """
+    The names of one star, {name_type: set of star_ids}.
+
+    Setting a name adds it to the star_ids of the name type, it does not replace them, i.e.
+    star_dict['hd'] = (1234,) and star_dict['hd'] = {(1234,), (1235,)}. Getting a name type returns a frozenset.
+    Keys that are not strings are used as str(key).
+
+    Most stars have one star_id for each name type, so the star_ids are stored in self.data as the star_id itself,
+    and only as a frozenset for the name types that have more than one. A star_id is a tuple or a string,
+    never a frozenset.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, star_names=None):
+        self.data = {}
+        if star_names is not None:
+            self.update(star_names)
+
+    def __getitem__(self, key):
+        star_ids = self.data[key if type(key) is str else str(key)]
+        if type(star_ids) is frozenset:
+            return star_ids
+        return frozenset((star_ids,))
 
     def __contains__(self, key):
-        return str(key) in self.data
+        return (key if type(key) is str else str(key)) in self.data
 
     def __setitem__(self, key, value):
-        if not self.__contains__(key):
-            if isinstance(value, set):
-                self.data[str(key)] = value
-            else:
-                self.data[str(key)] = {value}
-        if isinstance(value, set):
-            self.data[str(key)] |= value
+        if type(key) is not str:
+            key = str(key)
+        data = self.data
+        if isinstance(value, (set, frozenset)):
+            new_ids = value
+        elif key not in data:
+            data[key] = value
+            return
         else:
-            self.data[str(key)].add(value)
+            new_ids = (value,)
+        if key not in data:
+            star_ids = frozenset(new_ids)
+        elif type(data[key]) is frozenset:
+            star_ids = data[key].union(new_ids)
+        else:
+            star_ids = frozenset(new_ids).union((data[key],))
+        # a single star_id is stored as itself
+        data[key] = next(iter(star_ids)) if len(star_ids) == 1 else star_ids
+
+    def __delitem__(self, key):
+        del self.data[key if type(key) is str else str(key)]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        if isinstance(other, StarDict):
+            # single star_ids are always stored as themselves, so equal StarDicts have equal data
+            return self.data == other.data
+        return super().__eq__(other)
 
+    def __repr__(self):
+        return repr({name_type: set(star_ids) for name_type, star_ids in self.items()})
+
+    def __getstate__(self):
+        return self.data
+
+    def __setstate__(self, state):
+        self.data = {}
+        if isinstance(state, dict) and isinstance(state.get('data'), dict):
+            # a pickle of the earlier UserDict StarDict, {'data': {name_type: set of star_ids}}
+            self.update(state['data'])
+        else:
+            self.data = state
+
+    def copy(self):
+        star_dict = type(self)()
+        star_dict.data = self.data.copy()
+        return star_dict
 
 if __name__ == "__main__":
     # obj_data = get_query_object()
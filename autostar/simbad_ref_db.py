@@ -0,0 +1,327 @@
+"""
+A SQLite storage engine for the Simbad reference data, with the same interface as SimbadRef.
+
+The text reference file (config.sb_ref_filename, one star per line) is read in full into Python lists and
+dictionaries. In the database each name is a row of the identifiers table, indexed on (name_type, star_id),
+that points to a row of the star_groups table (one star). A lookup is one indexed query, so nothing is read
+at startup. Stars are added in a transaction, and the database is in write-ahead-log mode, so many readers
+(threads or processes) can read while one writer adds stars.
+
+The engine is chosen with sb_ref_backend in the config, 'txt' (the default) or 'sqlite', see
+autostar.simbad_query.simbad_ref_storage. The first time the database is loaded it is filled from the text
+reference file, if there is one. Each star's hypatia_handle is kept in the star_groups table, it is made when the
+star is added or combined, and again for all the stars when the star names module or its star_name_preference is
+changed (the handles depend on them, see autostar.config.datapaths.star_names_fingerprint). import_txt() and
+write() move data between the two formats:
+    python -m autostar.simbad_ref_db import simbad_ref_data.txt
+    python -m autostar.simbad_ref_db export simbad_ref_data.txt
+"""
+import os
+import ast
+import sys
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from autostar.file_lock import file_lock, atomic_write
+from autostar.config.datapaths import config, star_name_format, star_names_fingerprint
+from autostar.simbad_query import SimbadRef, StarDict, star_dict_to_line, make_hypatia_handle
+
+
+schema_statements = [
+    "CREATE TABLE IF NOT EXISTS star_groups (group_id INTEGER PRIMARY KEY, handle TEXT)",
+    # one row per name, star_id is the repr of the star_id from star_name_format, i.e. '(1234,)' or "'j0123+4567'"
+    "CREATE TABLE IF NOT EXISTS identifiers (name_type TEXT NOT NULL, star_id TEXT NOT NULL, "
+    "group_id INTEGER NOT NULL REFERENCES star_groups (group_id), PRIMARY KEY (name_type, star_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS identifiers_group_id ON identifiers (group_id)",
+    "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)",
+]
+# made after the handle column is added to a database that was made before the column
+handle_index_statement = "CREATE INDEX IF NOT EXISTS star_groups_handle ON star_groups (handle)"
+# the seconds that a connection waits for another process's write transaction to finish
+busy_timeout_seconds = 30.0
+
+
+def star_id_to_text(star_id):
+    return repr(star_id)
+
+
+def text_to_star_id(star_id_text):
+    return ast.literal_eval(star_id_text)
+
+
+class SimbadRefDB:
+    """
+    The Simbad reference data in a SQLite database, see the module docstring.
+
+    :param db_file_name: str - the database file, the default is sb_ref_db_filename in the config.
+    :param txt_file_name: str - the text reference file that fills a new database,
+                          the default is sb_ref_filename in the config.
+    """
+    def __init__(self, db_file_name=None, txt_file_name=None):
+        if db_file_name is None:
+            self.db_file_name = config.sb_ref_db_filename
+        else:
+            self.db_file_name = db_file_name
+        if txt_file_name is None:
+            self.txt_file_name = config.sb_ref_filename
+        else:
+            self.txt_file_name = txt_file_name
+        # sqlite3 connections are used by the thread that made them, each thread has its own
+        self.local = threading.local()
+        self.loaded = False
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # the transactions are started explicitly, see transaction
+            connection = sqlite3.connect(self.db_file_name, timeout=busy_timeout_seconds, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    @contextmanager
+    def transaction(self):
+        """
+        A write transaction that takes the database's write lock before its first statement (BEGIN IMMEDIATE),
+        so the lookups of the names of a new star and the inserts that depend on them see the same data, another
+        process's stars can not be added in between. It waits up to busy_timeout_seconds for another writer.
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def create_tables(self):
+        with self.transaction() as connection:
+            for statement in schema_statements:
+                connection.execute(statement)
+            star_group_columns = {column_info[1] for column_info
+                                  in connection.execute("PRAGMA table_info(star_groups)")}
+            if 'handle' not in star_group_columns:
+                connection.execute("ALTER TABLE star_groups ADD COLUMN handle TEXT")
+            connection.execute(handle_index_statement)
+            # the handles are made again when the star names module is not the one that made them, or it was edited
+            fingerprint = star_names_fingerprint().hex()
+            found = connection.execute("SELECT value FROM settings WHERE name = 'star_names_fingerprint'").fetchone()
+            if found is None or found[0] != fingerprint:
+                connection.execute("UPDATE star_groups SET handle = NULL")
+                connection.execute("DELETE FROM settings WHERE name = 'star_names_module'")
+                connection.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('star_names_fingerprint', ?)",
+                                   (fingerprint,))
+        self.loaded = True
+
+    def load(self):
+        """ Make the tables, and fill a new database from the text reference file when that file exists."""
+        self.create_tables()
+        if self.count_stars() == 0 and os.path.exists(self.txt_file_name):
+            self.import_txt(self.txt_file_name)
+        self.make_handles()
+
+    def make_handles(self):
+        """ Make the handles of the stars that do not have one, i.e. in a database made before the handle column."""
+        with self.transaction() as connection:
+            group_ids = [group_id for group_id, in connection.execute(
+                "SELECT group_id FROM star_groups WHERE handle IS NULL")]
+            connection.executemany("UPDATE star_groups SET handle = ? WHERE group_id = ?",
+                                   [(make_hypatia_handle(self.group_star_dict(group_id)), group_id)
+                                    for group_id in group_ids])
+
+    def make_lookup(self):
+        """ The identifiers table is the lookup and stars are combined when they are added, only load is needed."""
+        if not self.loaded:
+            self.load()
+
+    def refresh(self):
+        """
+        The queries always read the latest data in the database, there is nothing to read again.
+
+        :return: bool - always False.
+        """
+        return False
+
+    def count_stars(self):
+        if not self.loaded:
+            self.load()
+        return self.connection.execute("SELECT COUNT(*) FROM star_groups").fetchone()[0]
+
+    @property
+    def available_name_types(self):
+        if not self.loaded:
+            self.load()
+        return {name_type for name_type, in self.connection.execute("SELECT DISTINCT name_type FROM identifiers")}
+
+    @property
+    def star_dict_list(self):
+        """ All the stars, this reads the whole table, use get_star_dict to find stars."""
+        if not self.loaded:
+            self.load()
+        star_dict_list = []
+        last_group_id = None
+        star_dict = None
+        for group_id, name_type, star_id_text in self.connection.execute(
+                "SELECT group_id, name_type, star_id FROM identifiers ORDER BY group_id"):
+            if group_id != last_group_id:
+                star_dict = StarDict()
+                star_dict_list.append(star_dict)
+                last_group_id = group_id
+            star_dict[name_type] = text_to_star_id(star_id_text)
+        return star_dict_list
+
+    def group_star_dict(self, group_id):
+        star_dict = StarDict()
+        for name_type, star_id_text in self.connection.execute(
+                "SELECT name_type, star_id FROM identifiers WHERE group_id = ?", (group_id,)):
+            star_dict[name_type] = text_to_star_id(star_id_text)
+        return star_dict
+
+    def get_star_dict(self, hypatia_name):
+        """
+        :param hypatia_name: str or (name_type, star_id) StarName
+        :return: StarDict or None - all the names of the star, None when the name is not in the reference data.
+        """
+        found = self.get_star_dict_and_handle(hypatia_name)
+        if found is None:
+            return None
+        return found[1]
+
+    def get_star_dict_and_handle(self, hypatia_name):
+        """
+        :param hypatia_name: str or (name_type, star_id) StarName
+        :return: (hypatia_handle, StarDict) or None - None when the name is not in the reference data.
+        """
+        if type(hypatia_name) == str:
+            hypatia_name = star_name_format(hypatia_name)
+        name_type, star_id = hypatia_name
+        if not self.loaded:
+            self.load()
+        found = self.connection.execute("SELECT star_groups.group_id, star_groups.handle FROM identifiers "
+                                        "JOIN star_groups ON identifiers.group_id = star_groups.group_id "
+                                        "WHERE name_type = ? AND star_id = ?",
+                                        (name_type, star_id_to_text(star_id))).fetchone()
+        if found is None:
+            return None
+        group_id, hypatia_handle = found
+        star_dict = self.group_star_dict(group_id)
+        if hypatia_handle is None:
+            # added by another process that was made before the handle column
+            hypatia_handle = make_hypatia_handle(star_dict)
+        return hypatia_handle, star_dict
+
+    def get_star_dict_from_handle(self, hypatia_handle):
+        """
+        :return: StarDict or None - the names of the star with this hypatia_handle, None when it is not in the
+                 reference data.
+        """
+        if not self.loaded:
+            self.load()
+        found = self.connection.execute("SELECT group_id FROM star_groups WHERE handle = ?",
+                                        (hypatia_handle,)).fetchone()
+        if found is None:
+            return None
+        return self.group_star_dict(found[0])
+
+    def add_star_dict(self, connection, star_dict):
+        """ Add one star in the open transaction, combined with every star that it shares a name with."""
+        rows = [(name_type, star_id_to_text(star_id)) for name_type, star_ids in star_dict.items()
+                for star_id in star_ids]
+        group_ids = set()
+        for row in rows:
+            found = connection.execute("SELECT group_id FROM identifiers WHERE name_type = ? AND star_id = ?",
+                                       row).fetchone()
+            if found is not None:
+                group_ids.add(found[0])
+        if group_ids:
+            # the new names can join stars that were separate, they are combined into the first of them
+            group_id = min(group_ids)
+            for other_group_id in group_ids - {group_id}:
+                connection.execute("UPDATE identifiers SET group_id = ? WHERE group_id = ?",
+                                   (group_id, other_group_id))
+                connection.execute("DELETE FROM star_groups WHERE group_id = ?", (other_group_id,))
+        else:
+            group_id = connection.execute("INSERT INTO star_groups DEFAULT VALUES").lastrowid
+        # only add new names, do not overwrite
+        connection.executemany("INSERT OR IGNORE INTO identifiers (name_type, star_id, group_id) VALUES (?, ?, ?)",
+                               [(name_type, star_id_text, group_id) for name_type, star_id_text in rows])
+        # the handle of the combined star
+        connection.execute("UPDATE star_groups SET handle = ? WHERE group_id = ?",
+                           (make_hypatia_handle(self.group_star_dict(group_id)), group_id))
+
+    def add_star_dicts(self, star_dict_list):
+        """
+        Add star dictionaries to the reference data in one transaction, each is combined with the stars it
+        shares a name with.
+
+        :param star_dict_list: iterable of StarDict - the names of each new star.
+        """
+        if not self.loaded:
+            self.load()
+        with self.transaction() as connection:
+            for star_dict in star_dict_list:
+                if star_dict:
+                    self.add_star_dict(connection, star_dict)
+
+    def import_txt(self, txt_file_name=None):
+        """
+        Add the stars of a text reference file (one star per line, the names separated by '|').
+        The stars are combined by SimbadRef.make_lookup first, so they are inserted without lookups
+        when the database is empty.
+        """
+        if txt_file_name is None:
+            txt_file_name = self.txt_file_name
+        if not self.loaded:
+            self.create_tables()
+        simbad_ref = SimbadRef(ref_file_name=txt_file_name)
+        simbad_ref.load()
+        simbad_ref.make_lookup()
+        with self.transaction() as connection:
+            if connection.execute("SELECT COUNT(*) FROM star_groups").fetchone()[0]:
+                for star_dict in simbad_ref.star_dict_list:
+                    self.add_star_dict(connection, star_dict)
+            else:
+                identifier_rows = []
+                for group_id, star_dict in enumerate(simbad_ref.star_dict_list, start=1):
+                    identifier_rows.extend((name_type, star_id_to_text(star_id), group_id)
+                                           for name_type, star_ids in star_dict.items() for star_id in star_ids)
+                connection.executemany("INSERT INTO star_groups (group_id, handle) VALUES (?, ?)",
+                                       list(enumerate(simbad_ref.handles, start=1)))
+                connection.executemany("INSERT INTO identifiers (name_type, star_id, group_id) VALUES (?, ?, ?)",
+                                       identifier_rows)
+
+    def write(self, write_name=None):
+        """ Export the reference data to a text reference file, the format of SimbadRef.write."""
+        if write_name is None:
+            write_name = self.txt_file_name
+        with file_lock(write_name), atomic_write(write_name) as f:
+            for star_dict in self.star_dict_list:
+                f.write(star_dict_to_line(star_dict) + "\n")
+
+    def compact(self):
+        """ Write the write-ahead log into the database file."""
+        if not self.loaded:
+            self.load()
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in {'import', 'export'}:
+        print("usage: python -m autostar.simbad_ref_db import|export <text reference file>")
+        sys.exit(1)
+    simbad_ref_db = SimbadRefDB()
+    if sys.argv[1] == 'import':
+        simbad_ref_db.import_txt(sys.argv[2])
+    else:
+        simbad_ref_db.write(sys.argv[2])
+    print(f"{simbad_ref_db.count_stars()} stars in {simbad_ref_db.db_file_name}")
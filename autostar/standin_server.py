@@ -0,0 +1,752 @@
+"""
+An offline stand-in for the Simbad TAP, Gaia TAP, and MAST services that autostar queries.
+
+The server speaks enough of each protocol for astroquery to talk to it unchanged:
+    Simbad TAP (pyvo):      GET  /simbad/sim-tap/capabilities
+                            POST /simbad/sim-tap/sync  (query_objectids, query_object, and TAP_UPLOAD queries)
+    Gaia TAP (TapPlus):     POST /tap-server/tap/async, then GET .../async/<jobid>/phase and .../results/result
+    MAST Portal API:        POST /api/v0/invoke  (Mast.Catalogs.TIC.Cone) and /portal/Mashup/Mashup.asmx/columnsconfig
+    MAST name resolver:     GET  http://mastresolver.stsci.edu/Santa-war/query  (received as an HTTP proxy)
+
+The answers come from fixture tables (StandinData), a JSON fixture file, the Simbad reference file, or synthetic
+stars. Each service has its own latency, error injection, and server side rate limit (ServiceSettings), so the
+rate limiting, retries, and concurrency of the autostar clients can be measured without a network.
+
+Start a server from the command line:
+    python -m autostar.standin_server --synthetic 1000 --latency 0.05 --error-rate 0.01 --rate 6
+or in Python, where use_standin_server() points the autostar clients at it:
+    with StandinServer(StandinData.synthetic(1000)) as server, use_standin_server(server.url):
+        ...
+"""
+import os
+import re
+import io
+import sys
+import json
+import gzip
+import math
+import time
+import uuid
+import random
+import argparse
+import importlib
+import threading
+from email import policy
+from contextlib import contextmanager
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from autostar.config.datapaths import config
+from autostar.rate_limit import TokenBucket
+
+
+services = ['simbad', 'gaia', 'mast']
+
+simbad_capabilities = """<?xml version="1.0" encoding="UTF-8"?>
+<vosi:capabilities xmlns:vosi="http://www.ivoa.net/xml/VOSICapabilities/v1.0"
+                   xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+                   xmlns:vod="http://www.ivoa.net/xml/VODataService/v1.1"
+                   xmlns:tr="http://www.ivoa.net/xml/TAPRegExt/v1.0">
+  <capability standardID="ivo://ivoa.net/std/TAP" xsi:type="tr:TableAccess">
+    <interface xsi:type="vod:ParamHTTP" role="std">
+      <accessURL use="base">{tap_url}</accessURL>
+    </interface>
+    <language>
+      <name>ADQL</name>
+      <version ivo-id="ivo://ivoa.net/std/ADQL#v2.0">2.0</version>
+    </language>
+    <outputFormat><mime>application/x-votable+xml</mime></outputFormat>
+    <uploadMethod ivo-id="ivo://ivoa.net/std/TAPRegExt#upload-inline"/>
+    <executionDuration><hard>{execution_duration}</hard></executionDuration>
+    <outputLimit>
+      <default unit="row">{hard_limit}</default>
+      <hard unit="row">{hard_limit}</hard>
+    </outputLimit>
+    <uploadLimit><hard unit="row">{upload_limit}</hard></uploadLimit>
+  </capability>
+</vosi:capabilities>
+"""
+
+votable_error = """<?xml version="1.0" encoding="UTF-8"?>
+<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">
+  <RESOURCE type="results">
+    <INFO name="QUERY_STATUS" value="ERROR">{message}</INFO>
+  </RESOURCE>
+</VOTABLE>
+"""
+
+
+def normalize_identifier(identifier):
+    # Simbad matches identifiers without regard to case, spacing, or leading zeros, i.e. 'HD 000001' is 'hd 1'
+    return " ".join(token.lstrip("0") or "0" if token.isdigit() else token for token in str(identifier).upper().split())
+
+
+def adql_string(quoted):
+    # the value of an ADQL string literal, a single quote is escaped as two single quotes
+    return quoted.replace("''", "'")
+
+
+def angular_distance_deg(ra1, dec1, ra2, dec2):
+    ra1, dec1, ra2, dec2 = map(np.radians, (ra1, dec1, ra2, dec2))
+    cos_angle = np.sin(dec1) * np.sin(dec2) + np.cos(dec1) * np.cos(dec2) * np.cos(ra1 - ra2)
+    return np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+
+
+def python_value(value):
+    # numpy scalars are not JSON serializable
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def rows_to_table(column_names, rows):
+    """
+    An astropy Table from rows of values, None is a masked value.
+
+    :param column_names: list of str
+    :param rows: list of tuples - the values of each row in the order of column_names.
+    :return: astropy.table.Table
+    """
+    table_module = importlib.import_module("astropy.table")
+    columns = []
+    for column_index, column_name in enumerate(column_names):
+        values = [row[column_index] for row in rows]
+        present = [value for value in values if value is not None]
+        if not present or any(isinstance(value, str) for value in present):
+            fill_value, dtype = "", str
+        elif any(isinstance(value, (float, np.floating)) for value in present):
+            fill_value, dtype = np.nan, float
+        elif all(isinstance(value, (bool, np.bool_)) for value in present):
+            fill_value, dtype = False, bool
+        else:
+            fill_value, dtype = 0, np.int64
+        mask = [value is None for value in values]
+        data = np.array([fill_value if value is None else value for value in values], dtype=dtype)
+        columns.append(table_module.MaskedColumn(data, name=column_name, mask=mask))
+    return table_module.Table(columns, masked=True)
+
+
+def votable_bytes(column_names, rows, overflow=False):
+    """ A TAP results VOTable, with the QUERY_STATUS INFO element that pyvo reads."""
+    votable = importlib.import_module("astropy.io.votable")
+    votable_file = votable.from_table(rows_to_table(column_names, rows))
+    resource = votable_file.resources[0]
+    resource.type = "results"
+    resource.infos.append(votable.tree.Info(name="QUERY_STATUS", value="OVERFLOW" if overflow else "OK"))
+    buffer = io.BytesIO()
+    votable_file.to_xml(buffer)
+    return buffer.getvalue()
+
+
+def read_votable(votable_bytes_in):
+    table = importlib.import_module("astropy.table").Table
+    return table.read(io.BytesIO(votable_bytes_in), format="votable")
+
+
+class StandinData:
+    """
+    The fixture tables that the stand-in server answers from.
+
+    :param simbad_objects: list of dict - one per Simbad object, the 'ids' key has the list of identifiers and the
+                           other keys are Simbad basic columns, i.e. 'main_id', 'ra', 'dec'.
+    :param gaia_rows: dict - {data release number: list of dict}, the Gaia source rows with a 'source_id' key.
+    :param tic_rows: list of dict - TIC rows with 'ra' and 'dec' keys, the name columns are 'HIP', 'TYC', 'GAIA',
+                     and 'TWOMASS'.
+    """
+    def __init__(self, simbad_objects=None, gaia_rows=None, tic_rows=None):
+        self.simbad_objects = list(simbad_objects or [])
+        self.gaia_rows = {int(dr_num): list(rows) for dr_num, rows in (gaia_rows or {}).items()}
+        self.tic_rows = list(tic_rows or [])
+        self.object_by_identifier = None
+        self.gaia_by_source_id = None
+        self.tic_ra = None
+        self.tic_dec = None
+        self.make_index()
+
+    def make_index(self):
+        self.object_by_identifier = {}
+        for simbad_object in self.simbad_objects:
+            for identifier in simbad_object['ids']:
+                self.object_by_identifier[normalize_identifier(identifier)] = simbad_object
+        self.gaia_by_source_id = {dr_num: {int(row['source_id']): row for row in rows}
+                                  for dr_num, rows in self.gaia_rows.items()}
+        self.tic_ra = np.array([row['ra'] for row in self.tic_rows], dtype=float)
+        self.tic_dec = np.array([row['dec'] for row in self.tic_rows], dtype=float)
+
+    def __len__(self):
+        return len(self.simbad_objects)
+
+    @classmethod
+    def from_names(cls, names_per_star, seed=0):
+        """
+        Fixtures for stars with the given identifiers, the coordinates and the Gaia and TIC values are random.
+
+        :param names_per_star: list of lists of str - the Simbad identifiers of each star, the first is the main id.
+        :param seed: int - the seed of the random values.
+        :return: StandinData
+        """
+        rng = np.random.default_rng(seed)
+        simbad_objects = []
+        gaia_rows = {1: [], 2: [], 3: []}
+        tic_rows = []
+        for star_index, names in enumerate(names_per_star):
+            ra = float(rng.uniform(0.0, 360.0))
+            dec = float(np.degrees(np.arcsin(rng.uniform(-1.0, 1.0))))
+            simbad_objects.append({'ids': list(names), 'main_id': names[0], 'ra': ra, 'dec': dec,
+                                   'coo_err_maj': float(rng.uniform(0.01, 1.0)),
+                                   'coo_err_min': float(rng.uniform(0.01, 1.0)),
+                                   'coo_err_angle': int(rng.integers(0, 180)), 'coo_wavelength': 'O',
+                                   'coo_bibcode': '2020yCat.1350....0G', 'otype': '*'})
+            tic_row = {'ID': str(100000000 + star_index), 'ra': ra, 'dec': dec, 'objType': 'STAR'}
+            parallax = float(rng.uniform(1.0, 100.0))
+            for name in names:
+                name_type, _, star_id = name.partition(" ")
+                if name.startswith("Gaia DR"):
+                    dr_num = int(name[len("Gaia DR")])
+                    source_id = int(name.split()[-1])
+                    gaia_rows[dr_num].append(gaia_row(rng, dr_num, source_id, ra, dec, parallax))
+                    if dr_num == 2:
+                        tic_row['GAIA'] = str(source_id)
+                elif name_type == "2MASS":
+                    tic_row['TWOMASS'] = star_id.lstrip("J")
+                elif name_type in {"HIP", "TYC"}:
+                    tic_row[name_type] = star_id
+            if len(tic_row) > 4:
+                tic_row.update({'Teff': float(rng.uniform(3000.0, 8000.0)), 'e_Teff': float(rng.uniform(50.0, 200.0)),
+                                'logg': float(rng.uniform(3.5, 5.0)), 'e_logg': float(rng.uniform(0.05, 0.2)),
+                                'mass': float(rng.uniform(0.2, 2.0)), 'e_mass': float(rng.uniform(0.01, 0.2)),
+                                'rad': float(rng.uniform(0.2, 3.0)), 'e_rad': float(rng.uniform(0.01, 0.2))})
+                tic_rows.append(tic_row)
+        return cls(simbad_objects=simbad_objects, gaia_rows=gaia_rows, tic_rows=tic_rows)
+
+    @classmethod
+    def synthetic(cls, n_stars=1000, seed=0):
+        """
+        Fixtures for n_stars synthetic stars, each has HD, HIP, TYC, 2MASS, Gaia DR2, and Gaia DR3 identifiers.
+        The names are written the way autostar formats them, 'HD 1', 'HIP 1', 'TYC 0002-00001-1', ..., so the
+        names that autostar sends to MAST match the TIC name columns.
+        """
+        names_per_star = [[f"HD {star_number}", f"HIP {star_number}",
+                           f"TYC {1 + star_number % 9000:04d}-{1 + star_number // 9000:05d}-1",
+                           f"2MASS J{star_number:08d}+{star_number % 10000000:07d}",
+                           f"Gaia DR2 {3000000000000000000 + star_number}",
+                           f"Gaia DR3 {4000000000000000000 + star_number}"]
+                          for star_number in range(1, n_stars + 1)]
+        return cls.from_names(names_per_star, seed=seed)
+
+    @classmethod
+    def from_simbad_ref(cls, ref_file_name=None, seed=0):
+        """
+        Fixtures for the stars in a Simbad reference file (one star per line, the names separated by '|'),
+        i.e. the sb_ref_filename in the config. The names are used as they are, the other values are random.
+        """
+        if ref_file_name is None:
+            ref_file_name = config.sb_ref_filename
+        with open(ref_file_name, 'r') as f:
+            names_per_star = [[name.strip() for name in line.split("|") if name.strip()] for line in f]
+        return cls.from_names([names for names in names_per_star if names], seed=seed)
+
+    @classmethod
+    def from_json(cls, json_file_name):
+        """ Fixtures from a JSON file, {"simbad": [...], "gaia": {"2": [...], "3": [...]}, "tic": [...]}"""
+        with open(json_file_name, 'r') as f:
+            fixtures = json.load(f)
+        return cls(simbad_objects=fixtures.get('simbad'), gaia_rows=fixtures.get('gaia'), tic_rows=fixtures.get('tic'))
+
+    def to_json(self, json_file_name):
+        fixtures = {'simbad': self.simbad_objects,
+                    'gaia': {str(dr_num): rows for dr_num, rows in self.gaia_rows.items()},
+                    'tic': self.tic_rows}
+        with open(json_file_name, 'w') as f:
+            json.dump(fixtures, f, default=python_value)
+
+    def find_object(self, identifier):
+        return self.object_by_identifier.get(normalize_identifier(identifier))
+
+    def simbad_tap(self, query, uploads=None):
+        """
+        Answer the ADQL queries that astroquery's Simbad client and autostar.simbad_query send.
+
+        :param query: str - the ADQL query.
+        :param uploads: dict - {table name: astropy Table} for the TAP_UPLOAD tables.
+        :return: (column_names, rows)
+        :raises ValueError: for the queries that the stand-in does not understand.
+        """
+        upload_name = re.search(r"TAP_UPLOAD\.(\w+)", query)
+        if upload_name is not None:
+            upload = (uploads or {}).get(upload_name.group(1))
+            if upload is None:
+                raise ValueError(f"The TAP_UPLOAD table {upload_name.group(1)} was not uploaded.")
+            if re.search(r"\bJOIN\s+basic\b", query):
+                # autostar.simbad_query.query_main_many, the basic columns of each uploaded name
+                select_list = query[:re.search(r"\bFROM\b", query).start()]
+                columns = re.findall(r'(\w+)\."?(\w+)"?', select_list)
+                rows = []
+                for object_number_id, user_specified_id in zip(upload['object_number_id'],
+                                                               upload['user_specified_id']):
+                    simbad_object = self.find_object(user_specified_id)
+                    if simbad_object is not None:
+                        rows.append(tuple(int(object_number_id) if column_name == 'object_number_id'
+                                          else simbad_object.get(column_name) for _table, column_name in columns))
+                return [column_name for _table, column_name in columns], rows
+            # autostar.simbad_query.query_ids_many, all the identifiers of each uploaded name
+            rows = []
+            for object_number_id, user_specified_id in zip(upload['object_number_id'], upload['user_specified_id']):
+                simbad_object = self.find_object(user_specified_id)
+                if simbad_object is not None:
+                    rows.extend((int(object_number_id), identifier) for identifier in simbad_object['ids'])
+            return ['object_number_id', 'id'], rows
+        found = re.search(r"id_typed\.id\s*=\s*'((?:[^']|'')*)'", query)
+        if found is not None:
+            # Simbad.query_objectids
+            simbad_object = self.find_object(adql_string(found.group(1)))
+            if simbad_object is None:
+                return ['id'], []
+            return ['id'], [(identifier,) for identifier in simbad_object['ids']]
+        found = re.search(r"\bWHERE\s+id\s*=\s*'((?:[^']|'')*)'", query)
+        if found is not None:
+            # Simbad.query_object, the output columns are in the SELECT list as table."column" AS "alias"
+            identifier = adql_string(found.group(1))
+            select_list = query[:re.search(r"\bFROM\b", query).start()]
+            columns = re.findall(r'(\w+)\."(\w+)"(?:\s+AS\s+"(\w+)")?', select_list)
+            column_names = [alias or column_name for _table, column_name, alias in columns]
+            simbad_object = self.find_object(identifier)
+            if simbad_object is None:
+                return column_names, []
+            matched_id = next(name for name in simbad_object['ids']
+                              if normalize_identifier(name) == normalize_identifier(identifier))
+            row = tuple(matched_id if (table_name, column_name) == ('ident', 'id') else simbad_object.get(column_name)
+                        for table_name, column_name, _alias in columns)
+            return column_names, [row]
+        raise ValueError(f"The stand-in Simbad server does not support this query: {query}")
+
+    def gaia_adql(self, query):
+        """
+        Answer the ADQL queries of autostar.read_gaia.GaiaQuery, source_id lists and cone searches.
+
+        :return: (column_names, rows)
+        """
+        dr_match = re.search(r"gaiadr(\d)", query)
+        if dr_match is None:
+            raise ValueError(f"The stand-in Gaia server does not support this query: {query}")
+        dr_num = int(dr_match.group(1))
+        rows_by_source_id = self.gaia_by_source_id.get(dr_num, {})
+        circle = re.search(r"CIRCLE\('ICRS',\s*([-+.\deE]+),\s*([-+.\deE]+),\s*([-+.\deE]+)\)", query)
+        if circle is not None:
+            ra, dec, radius_deg = (float(value) for value in circle.groups())
+            rows = [row for row in rows_by_source_id.values()
+                    if angular_distance_deg(ra, dec, row['ra'], row['dec']) <= radius_deg]
+        else:
+            source_ids = [int(source_id) for source_id in re.findall(r"source_id\s*=\s*(\d+)", query)]
+            if not source_ids:
+                raise ValueError(f"The stand-in Gaia server does not support this query: {query}")
+            rows = [rows_by_source_id[source_id] for source_id in dict.fromkeys(source_ids)
+                    if source_id in rows_by_source_id]
+        column_names = list(dict.fromkeys(column_name for row in rows for column_name in row.keys()))
+        if not column_names:
+            column_names = ['source_id']
+        return column_names, [tuple(row.get(column_name) for column_name in column_names) for row in rows]
+
+    def tic_cone(self, ra, dec, radius_deg):
+        """ The TIC rows in a cone, nearest first, with the distance in the dstArcSec column like MAST."""
+        if not self.tic_rows:
+            return []
+        distances = angular_distance_deg(ra, dec, self.tic_ra, self.tic_dec)
+        in_cone = np.flatnonzero(distances <= radius_deg)
+        return [dict(self.tic_rows[row_index], dstArcSec=float(distances[row_index] * 3600.0))
+                for row_index in in_cone[np.argsort(distances[in_cone])]]
+
+
+def gaia_row(rng, dr_num, source_id, ra, dec, parallax):
+    # a Gaia source with the columns that autostar.read_gaia.GaiaQuery reads for each data release
+    row = {'source_id': source_id, 'ra': ra, 'ra_error': float(rng.uniform(0.01, 0.5)), 'dec': dec,
+           'dec_error': float(rng.uniform(0.01, 0.5)), 'ref_epoch': {1: 2015.0, 2: 2015.5, 3: 2016.0}[dr_num],
+           'parallax': parallax, 'parallax_error': float(rng.uniform(0.01, 0.5)),
+           'pmra': float(rng.normal(0.0, 50.0)), 'pmra_error': float(rng.uniform(0.01, 0.5)),
+           'pmdec': float(rng.normal(0.0, 50.0)), 'pmdec_error': float(rng.uniform(0.01, 0.5)),
+           'duplicated_source': False, 'phot_g_mean_flux': float(rng.uniform(1.0e3, 1.0e7)),
+           'phot_g_mean_flux_error': float(rng.uniform(1.0, 100.0)),
+           'phot_g_mean_mag': float(rng.uniform(4.0, 18.0))}
+    if dr_num > 1:
+        row.update({'radial_velocity': float(rng.normal(0.0, 30.0)),
+                    'radial_velocity_error': float(rng.uniform(0.1, 5.0))})
+    teff = float(rng.uniform(3000.0, 8000.0))
+    distance = 1000.0 / parallax
+    if dr_num == 2:
+        row.update({'teff_val': teff, 'teff_percentile_lower': teff - 100.0, 'teff_percentile_upper': teff + 100.0,
+                    'r_est': distance, 'r_lo': distance * 0.95, 'r_hi': distance * 1.05})
+    elif dr_num == 3:
+        row.update({'teff_gspphot': teff, 'teff_gspphot_lower': teff - 100.0, 'teff_gspphot_upper': teff + 100.0,
+                    'distance_gspphot': distance, 'distance_gspphot_lower': distance * 0.95,
+                    'distance_gspphot_upper': distance * 1.05})
+    return row
+
+
+class ServiceSettings:
+    """
+    How one stand-in service behaves.
+
+    :param latency: float - the seconds before each query is answered.
+    :param jitter: float - a random number of seconds, up to jitter, is added to the latency.
+    :param error_rate: float - the fraction of queries answered with error_status instead of the data.
+    :param error_status: int - the HTTP status of the injected errors, 503 is retried by autostar.rate_limit.
+    :param rate: float - the queries per second the service allows, over-limit queries get a 429. None is no limit.
+    :param burst: int - the queries allowed at once after idle time.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, rate=None, burst=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate = rate
+        self.burst = burst
+
+
+class StandinServer:
+    """
+    A threaded HTTP server that stands in for Simbad, the Gaia archive, and MAST.
+
+    :param data: StandinData - the fixture tables.
+    :param settings: ServiceSettings or dict of {'simbad', 'gaia', 'mast': ServiceSettings}.
+    :param host: str - the address to listen on.
+    :param port: int - the port to listen on, 0 picks a free port, see self.url.
+    :param seed: int - the seed for the latency jitter and the error injection.
+    :param hard_limit: int - the Simbad TAP output row limit.
+    :param verbose: bool - print each request.
+    """
+    def __init__(self, data=None, settings=None, host="127.0.0.1", port=0, seed=0, hard_limit=2000000,
+                 verbose=False):
+        if data is None:
+            data = StandinData.synthetic()
+        self.data = data
+        if settings is None or isinstance(settings, ServiceSettings):
+            settings = {service: settings or ServiceSettings() for service in services}
+        self.settings = {service: settings.get(service, ServiceSettings()) for service in services}
+        self.rate_limits = {service: TokenBucket(rate=self.settings[service].rate,
+                                                 burst=self.settings[service].burst, service=service)
+                            for service in services}
+        self.hard_limit = hard_limit
+        self.verbose = verbose
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.gaia_jobs = {}
+        self.stats = {}
+        self.httpd = ThreadingHTTPServer((host, port), StandinRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """ Serve requests in a background thread."""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="standin-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def count(self, service, stat):
+        with self.lock:
+            service_stats = self.stats.setdefault(service, {})
+            service_stats[stat] = service_stats.get(stat, 0) + 1
+
+    def admit(self, service):
+        """
+        Apply the settings of a service to one query.
+
+        :return: (status, retry_after) - status is None when the query should be answered.
+        """
+        self.count(service, 'requests')
+        settings = self.settings[service]
+        wait = self.rate_limits[service].try_acquire()
+        if wait > 0.0:
+            self.count(service, 'rate_limited')
+            return 429, max(1, math.ceil(wait))
+        with self.lock:
+            delay = settings.latency + self.random.uniform(0.0, settings.jitter)
+            inject_error = self.random.random() < settings.error_rate
+        if delay > 0.0:
+            time.sleep(delay)
+        if inject_error:
+            self.count(service, 'errors_injected')
+            return settings.error_status, None
+        return None, None
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def standin(self):
+        return self.server.standin
+
+    def log_message(self, format, *args):
+        if self.standin.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type="text/plain", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header_name, header_value in (headers or {}).items():
+            self.send_header(header_name, header_value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_refusal(self, status, retry_after):
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        self.send_body(status, f"{status} {self.responses.get(status, ('',))[0]}", headers=headers)
+
+    def read_form(self):
+        """ :return: (fields, files) - the form fields as str and the uploaded files as bytes."""
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+        fields, files = {}, {}
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=policy.HTTP).parsebytes(
+                b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                payload = part.get_payload(decode=True)
+                if part.get_filename() is None:
+                    fields[name] = payload.decode("utf-8")
+                else:
+                    files[name] = payload
+        else:
+            fields = {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+        return fields, files
+
+    def route(self):
+        # requests sent to the server as an HTTP proxy have the full URL as the path
+        url = urlsplit(self.path)
+        return url.path, {key: values for key, values in parse_qs(url.query).items()}
+
+    def do_GET(self):
+        path, query = self.route()
+        if path == "/simbad/sim-tap/capabilities":
+            host = self.headers.get("Host", "127.0.0.1")
+            self.send_body(200, simbad_capabilities.format(tap_url=f"http://{host}/simbad/sim-tap",
+                                                           execution_duration=1080,
+                                                           hard_limit=self.standin.hard_limit,
+                                                           upload_limit=200000),
+                           content_type="text/xml")
+        elif path.startswith("/tap-server/tap/async/"):
+            self.gaia_job(path, method="GET")
+        elif path == "/Santa-war/query":
+            self.mast_resolver(query)
+        else:
+            self.send_body(404, f"The stand-in server has no {path}")
+
+    def do_POST(self):
+        path, _query = self.route()
+        fields, files = self.read_form()
+        if path == "/simbad/sim-tap/sync":
+            self.simbad_sync(fields, files)
+        elif path == "/tap-server/tap/async":
+            self.gaia_launch(fields)
+        elif path.startswith("/tap-server/tap/async/"):
+            self.gaia_job(path, method="POST")
+        elif path == "/api/v0/invoke":
+            self.mast_invoke(fields)
+        elif path == "/portal/Mashup/Mashup.asmx/columnsconfig":
+            self.send_body(200, json.dumps({}), content_type="application/json")
+        else:
+            self.send_body(404, f"The stand-in server has no {path}")
+
+    def simbad_sync(self, fields, files):
+        status, retry_after = self.standin.admit('simbad')
+        if status is not None:
+            self.send_refusal(status, retry_after)
+            return
+        uploads = {}
+        for upload in fields.get("UPLOAD", "").split(";"):
+            if upload:
+                table_name, _, source = upload.partition(",")
+                uploads[table_name] = read_votable(files[source.replace("param:", "")])
+        try:
+            column_names, rows = self.standin.data.simbad_tap(fields.get("QUERY", ""), uploads)
+        except ValueError as error:
+            self.send_body(400, votable_error.format(message=error), content_type="text/xml")
+            return
+        maxrec = int(fields.get("MAXREC") or self.standin.hard_limit)
+        self.send_body(200, votable_bytes(column_names, rows[:maxrec], overflow=len(rows) > maxrec),
+                       content_type="application/x-votable+xml")
+
+    def gaia_launch(self, fields):
+        status, retry_after = self.standin.admit('gaia')
+        if status is not None:
+            self.send_refusal(status, retry_after)
+            return
+        try:
+            column_names, rows = self.standin.data.gaia_adql(fields.get("QUERY", ""))
+        except ValueError as error:
+            self.send_body(400, str(error))
+            return
+        job_id = uuid.uuid4().hex
+        # the results of a Gaia archive job are a gzip compressed VOTable
+        with self.standin.lock:
+            self.standin.gaia_jobs[job_id] = gzip.compress(votable_bytes(column_names, rows))
+        host = self.headers.get("Host", "127.0.0.1")
+        self.send_body(303, "", headers={"Location": f"http://{host}/tap-server/tap/async/{job_id}"})
+
+    def gaia_job(self, path, method):
+        job_id, _, job_path = path[len("/tap-server/tap/async/"):].partition("/")
+        with self.standin.lock:
+            results = self.standin.gaia_jobs.get(job_id)
+        if results is None:
+            self.send_body(404, f"No job {job_id}")
+        elif job_path == "phase" and method == "GET":
+            # the job ran when it was launched
+            self.send_body(200, "COMPLETED")
+        elif job_path == "results/result":
+            self.send_body(200, results, content_type="application/x-votable+xml",
+                           headers={"Content-Encoding": "gzip"})
+        else:
+            host = self.headers.get("Host", "127.0.0.1")
+            self.send_body(303, "", headers={"Location": f"http://{host}/tap-server/tap/async/{job_id}"})
+
+    def mast_resolver(self, query):
+        status, retry_after = self.standin.admit('mast')
+        if status is not None:
+            self.send_refusal(status, retry_after)
+            return
+        resolved = []
+        for name in query.get("name", []):
+            simbad_object = self.standin.data.find_object(name)
+            if simbad_object is not None:
+                resolved.append({'searchString': name.lower(), 'resolver': 'SIMBAD',
+                                 'canonicalName': simbad_object['main_id'], 'ra': simbad_object['ra'],
+                                 'decl': simbad_object['dec'], 'objectType': simbad_object.get('otype', '*')})
+        self.send_body(200, json.dumps({'resolvedCoordinate': resolved}), content_type="application/json")
+
+    def mast_invoke(self, fields):
+        status, retry_after = self.standin.admit('mast')
+        if status is not None:
+            self.send_refusal(status, retry_after)
+            return
+        request = json.loads(fields.get("request", "{}"))
+        service = request.get("service", "")
+        params = request.get("params", {})
+        if service == "Mast.Catalogs.All.Tic":
+            body = {'status': 'COMPLETE', 'data': {'Tables': [{'ExtendedProperties': {'discreteHistogram': {},
+                                                                                      'continuousHistogram': {}}}]}}
+        elif service.lower() == "mast.catalogs.tic.cone":
+            rows = self.standin.data.tic_cone(float(params['ra']), float(params['dec']), float(params['radius']))
+            column_names = list(dict.fromkeys(column_name for row in rows for column_name in row.keys()))
+            fields_list = []
+            for column_name in column_names:
+                present = [row[column_name] for row in rows if row.get(column_name) is not None]
+                if present and all(isinstance(value, (int, np.integer)) for value in present):
+                    column_type = "int"
+                elif present and all(isinstance(value, (float, int, np.number)) for value in present):
+                    column_type = "float"
+                else:
+                    column_type = "string"
+                fields_list.append({'name': column_name, 'type': column_type})
+            body = {'status': 'COMPLETE', 'msg': '', 'fields': fields_list,
+                    'data': [{column_name: python_value(row.get(column_name)) for column_name in column_names}
+                             for row in rows],
+                    'paging': {'page': 1, 'pageSize': len(rows), 'pagesFiltered': 1, 'rows': len(rows),
+                               'rowsFiltered': len(rows), 'rowsTotal': len(rows)}}
+        else:
+            body = {'status': 'ERROR', 'msg': f"The stand-in MAST server does not support the service {service}"}
+        self.send_body(200, json.dumps(body, default=python_value), content_type="application/json")
+
+
+@contextmanager
+def use_standin_server(server_url):
+    """
+    Point the autostar Simbad, Gaia, and MAST clients in this process at a stand-in server, for the body of a
+    with statement.
+
+    MAST name resolution uses a fixed http:// address in astroquery, so the server is also set as the http_proxy,
+    and the requests to the server itself do not go through the proxy. The server urls in the config and the
+    http_proxy and no_proxy environment variables are set back to their old values at the end of the with
+    statement.
+    """
+    old_server_urls = {service: config.get(f"{service}_server_url") for service in services}
+    old_environ = {key: os.environ.get(key) for key in ("http_proxy", "no_proxy")}
+    for service in services:
+        config.set(f"{service}_server_url", server_url)
+    os.environ["http_proxy"] = server_url
+    host = urlsplit(server_url).hostname
+    no_proxy = [entry for entry in os.environ.get("no_proxy", "").split(",") if entry]
+    os.environ["no_proxy"] = ",".join(no_proxy + [host, "localhost", "127.0.0.1"])
+    try:
+        yield
+    finally:
+        for service, old_server_url in old_server_urls.items():
+            config.set(f"{service}_server_url", old_server_url)
+        for key, old_value in old_environ.items():
+            if old_value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = old_value
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run an offline stand-in for Simbad, Gaia TAP, and MAST.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    fixtures = parser.add_mutually_exclusive_group()
+    fixtures.add_argument("--fixtures", help="a JSON fixture file, see StandinData.from_json")
+    fixtures.add_argument("--simbad-ref", help="make fixtures for the stars in a Simbad reference file")
+    fixtures.add_argument("--synthetic", type=int, default=1000, help="make fixtures for this many synthetic stars")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each query is answered")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds of latency, up to this")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of queries that get an error")
+    parser.add_argument("--error-status", type=int, default=503, help="the HTTP status of the injected errors")
+    parser.add_argument("--rate", type=float, default=None, help="queries per second allowed by each service")
+    parser.add_argument("--burst", type=int, default=5, help="queries allowed at once by each service")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(args)
+
+    if args.fixtures:
+        data = StandinData.from_json(args.fixtures)
+    elif args.simbad_ref:
+        data = StandinData.from_simbad_ref(args.simbad_ref, seed=args.seed)
+    else:
+        data = StandinData.synthetic(args.synthetic, seed=args.seed)
+    settings = ServiceSettings(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               error_status=args.error_status, rate=args.rate, burst=args.burst)
+    server = StandinServer(data, settings=settings, host=args.host, port=args.port, seed=args.seed,
+                           verbose=args.verbose)
+    print(f"Stand-in Simbad, Gaia TAP, and MAST server for {len(data)} stars at {server.url}")
+    print(f"  set simbad_server_url, gaia_server_url, and mast_server_url to {server.url}, "
+          f"and http_proxy={server.url} for MAST name resolution")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Requests served: {server.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,35 @@
 import os
+import importlib
 
 import numpy as np
-import astroquery.mast
 
 from autostar.table_read import num_format
-from autostar.simbad_query import SimbadLib, StarDict
+from autostar.rate_limit import get_rate_limiter
+from autostar.response_cache import cached_query
+from autostar.ref_snapshot import read_snapshot, write_snapshot
+from autostar.file_lock import file_lock, atomic_write
+from autostar.simbad_query import shared_simbad_lib, StarDict
 from autostar.object_params import ObjectParams, set_single_param
-from autostar.config.datapaths import tic_ref_filename, star_name_format, StringStarName
+from autostar.config.datapaths import config, star_name_format, StringStarName
+
+
+def get_catalogs():
+    """
+    The astroquery MAST Catalogs client, astroquery is imported at 'runtime' not 'import time'.
+
+    When mast_server_url is set in the config, the client sends the catalog queries to that server, i.e.
+    autostar.standin_server. astroquery resolves names to coordinates at a fixed http:// address, that request
+    only goes to the same server when it is set as the http_proxy, see autostar.standin_server.use_standin_server.
+    """
+    mast = importlib.import_module("astroquery.mast")
+    server_url = config.get('mast_server_url')
+    if not server_url:
+        return mast.Catalogs
+    catalogs = mast.CatalogsClass()
+    portal_api = catalogs._portal_api_connection
+    portal_api.MAST_REQUEST_URL = server_url.rstrip("/") + "/api/v0/invoke"
+    portal_api.COLUMNS_CONFIG_URL = server_url.rstrip("/") + "/portal/Mashup/Mashup.asmx/columnsconfig"
+    return catalogs
 
 
 class TicQuery:
@@ -28,11 +51,11 @@ class TicQuery:
         self.available_handles = None
         self.new_data_count = 0
         if simbad_lib is None:
-            self.simbad_lib = SimbadLib()
+            self.simbad_lib = shared_simbad_lib()
         else:
             self.simbad_lib = simbad_lib
         if reference_file_name is None:
-            self.reference_file_name = tic_ref_filename
+            self.reference_file_name = config.tic_ref_filename
         else:
             self.reference_file_name = reference_file_name
 
@@ -67,11 +90,17 @@ class TicQuery:
         # we can try all the available names in the to see it we get a match to the TIC data
         raw_tic_data = None
         desired_index = None
+        # import astroquery at 'runtime' not 'import time', reading the TIC reference file does not need it
+        catalogs = get_catalogs()
+        resolver_error = importlib.import_module("astroquery.exceptions").ResolverError
+        # the rate limit is shared by all the MAST queries in this process, the responses are cached on disk
+        rate_limiter = get_rate_limiter('mast')
         for name_type in available_names_in_preference_order:
             # preform the TIC database Query
             try:
-                raw_tic_data = astroquery.mast.Catalogs.query_object(name_type, catalog="TIC", radius=0.0001)
-            except astroquery.exceptions.ResolverError:
+                raw_tic_data = cached_query('mast', catalogs.query_object, name_type, catalog="TIC", radius=0.0001,
+                                            rate_limiter=rate_limiter)
+            except resolver_error:
                 # this is the error that happens when the star is not found.
                 pass
             # We only need to continue if data was retrieved
@@ -212,25 +241,27 @@ class TicQuery:
         return new_object_params
 
     def update_to_and_from_simbad_ref(self):
-        self.simbad_lib.simbad_ref.load()
-        self.simbad_lib.simbad_ref.make_lookup()
+        self.simbad_lib.load()
+        # one name of each star, the names are resolved together with get_star_dict_many
+        named_star_dicts = []
+        hypatia_names = []
         for star_names_dict, tic_dic in self.tic_ref_data:
-            simbad_star_dict = None
-            for name_type in star_names_dict.keys():
-                for star_id in star_names_dict[name_type]:
-                    hypatia_name = (name_type, star_id)
-                    _hypatia_handle, simbad_star_dict = self.simbad_lib.get_star_dict(hypatia_name=hypatia_name)
-                    star_names_dict.update(simbad_star_dict)
-                    break
-                if simbad_star_dict is not None:
-                    break
+            if star_names_dict:
+                name_type = next(iter(star_names_dict.keys()))
+                named_star_dicts.append(star_names_dict)
+                hypatia_names.append((name_type, next(iter(star_names_dict[name_type]))))
             else:
-                self.simbad_lib.simbad_ref.add_star_dicts([star_names_dict])
-                self.simbad_lib.simbad_ref.load()
-                self.simbad_lib.simbad_ref.make_lookup()
+                with self.simbad_lib.lock:
+                    self.simbad_lib.simbad_ref.add_star_dicts([star_names_dict])
+                self.simbad_lib.load()
+        for star_names_dict, (_hypatia_handle, simbad_star_dict) \
+                in zip(named_star_dicts, self.simbad_lib.get_star_dict_many(hypatia_names)):
+            star_names_dict.update(simbad_star_dict)
         self.write_data()
         self.load_ref()
-        for star_names_dict in self.simbad_lib.simbad_ref.star_dict_list:
+        with self.simbad_lib.lock:
+            star_dict_list = list(self.simbad_lib.simbad_ref.star_dict_list)
+        for star_names_dict in star_dict_list:
             self.new_data_update_loop(star_names_dict)
 
     def make_ref_data_look_up_dicts(self):
@@ -238,8 +269,9 @@ class TicQuery:
             self.load_ref()
         self.ref_data_hypatia_handle = {}
         self.available_handles = set()
-        for star_names_dict, tic_dic in self.tic_ref_data:
-            hypatia_handle, _star_name_dict = self.simbad_lib.get_star_dict_with_star_dict(star_names_dict)
+        star_dicts = self.simbad_lib.get_star_dict_many([star_names_dict for star_names_dict, _tic_dic
+                                                         in self.tic_ref_data])
+        for (hypatia_handle, _star_name_dict), (_star_names_dict, tic_dic) in zip(star_dicts, self.tic_ref_data):
             self.ref_data_hypatia_handle[hypatia_handle] = tic_dic
             self.available_handles.add(hypatia_handle)
 
@@ -254,6 +286,17 @@ class TicQuery:
                                    existing data
         :return:
         """
+        # the lock is held from the read to the write, so the data other processes write is not lost
+        with file_lock(self.reference_file_name):
+            self.write_locked_data(append_mode=append_mode)
+        # do some clean up to reset this class to initial conditions
+        self.tic_ref_data = None
+        self.new_tic_data = []
+        if self.verbose:
+            print(self.new_data_count, " new TIC data requests this run.")
+            print("Writing Tess Input Catalog data to reference file:", self.reference_file_name, "\n")
+
+    def write_locked_data(self, append_mode=True):
         data_to_write = []
         # get the previously found reference data
         if os.path.isfile(self.reference_file_name) and append_mode:
@@ -287,21 +330,28 @@ class TicQuery:
                 else:
                     single_line += ","
             body.append(single_line[:-1])
-        # write the data to a file
-        with open(self.reference_file_name, 'w') as f:
+        # write the data to a file, the file is replaced, so readers never see part of it
+        with atomic_write(self.reference_file_name) as f:
             f.write(header + "\n")
             for single_line in body:
                 f.write(single_line + "\n")
-        # do some clean up to reset this class to initial conditions
-        self.tic_ref_data = None
-        self.new_tic_data = []
-        if self.verbose:
-            print(self.new_data_count, " new TIC data requests this run.")
-            print("Writing Tess Input Catalog data to reference file:", self.reference_file_name, "\n")
 
     def load_ref(self):
+        with file_lock(self.reference_file_name, shared=True):
+            self.read_ref()
+
+    def read_ref(self):
         self.tic_ref_data = []
-        if os.path.isfile(self.reference_file_name):
+        # the parsed reference file, while the reference file is unchanged, see autostar.ref_snapshot
+        snapshot = read_snapshot(self.reference_file_name, 'tic_ref')
+        if snapshot is not None:
+            column_names, tic_ref_data = snapshot
+            self.header_star_name_types |= set(column_names) - self.tic_data_wanted
+            for star_names, tic_dict in tic_ref_data:
+                star_names_dict = StarDict()
+                star_names_dict.data = star_names
+                self.tic_ref_data.append((star_names_dict, tic_dict))
+        elif os.path.isfile(self.reference_file_name):
             with open(self.reference_file_name, 'r') as f:
                 raw_ref_data = f.readlines()
             column_names = raw_ref_data[0].strip().split(",")
@@ -320,6 +370,9 @@ class TicQuery:
                             tic_dict[column_name] = num_format(value)
                 if star_names_dict != {}:
                     self.tic_ref_data.append((star_names_dict, tic_dict))
+            write_snapshot(self.reference_file_name, 'tic_ref',
+                           (column_names, [(star_names_dict.data, tic_dict)
+                                           for star_names_dict, tic_dict in self.tic_ref_data]))
 
 
 if __name__ == "__main__":
@@ -1,7 +1,13 @@
-from astroquery.irsa import Irsa
+import importlib
+
+
+def get_irsa():
+    # import astroquery at 'runtime' not 'import time', astroquery and astropy are imported when a query is made
+    return importlib.import_module("astroquery.irsa").Irsa
 
 
 if __name__ == "__main__":
+    Irsa = get_irsa()
     wise_cats = {key: Irsa.list_catalogs()[key] for key in Irsa.list_catalogs().keys() if "wise" in key.lower()}
     tb = Irsa.query_region('WISE j113325.38-701141.1', catalog='allwise_p3as_psd', spatial='Cone', width=None,
                            polygon=None, get_query_payload=False, verbose=True, selcols=None)
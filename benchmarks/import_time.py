@@ -0,0 +1,109 @@
+"""
+Import-time budget for autostar
+
+Short-lived worker processes import autostar thousands of times a day, so the import needs to be fast and it
+should not read or write any files. This script runs
+    python -X importtime -c "import autostar.simbad_query"
+in fresh processes, reports the median cumulative import time and the slowest modules, and checks that the
+import did not load the config (no user.toml read or written, no reference directory made).
+
+It exits with status 1 when the median import time is over the budget or the import had side effects:
+    python benchmarks/import_time.py --budget-ms 150
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+
+# the config object is still empty after the import when the import did not read the config
+side_effect_check = "import autostar.config.datapaths as datapaths; " \
+                    "print('config loaded:', datapaths.config._user_config is not None)"
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of python -X importtime.
+
+    :param stderr: str - the stderr of a python process that was started with -X importtime.
+    :return: dict - {module name: (self time in microseconds, cumulative time in microseconds)}
+    """
+    import_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module_name = line[len("import time:"):].split("|")
+        import_times[module_name.strip()] = (int(self_us), int(cumulative_us))
+    return import_times
+
+
+def time_import(module_name, python=sys.executable):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = repo_dir + os.pathsep + env.get("PYTHONPATH", "")
+    # installed packages import from .pyc files, without them the time to compile the source is measured
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    completed = subprocess.run([python, "-X", "importtime", "-c", f"import {module_name}; {side_effect_check}"],
+                               cwd=repo_dir, env=env, capture_output=True, text=True, check=True)
+    config_loaded = "config loaded: True" in completed.stdout
+    return parse_importtime(completed.stderr), config_loaded
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Check the import time of autostar against a budget.")
+    parser.add_argument("--module", default="autostar.simbad_query", help="the module to import")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="the budget for the median import time")
+    parser.add_argument("--runs", type=int, default=10, help="the number of fresh processes to time")
+    parser.add_argument("--top", type=int, default=10, help="the number of slowest modules to report")
+    parser.add_argument("--output", default=os.path.join(benchmarks_dir, "import_time_results.json"),
+                        help="the JSON file for the results")
+    args = parser.parse_args(args)
+
+    # the first import writes the .pyc files, it is not timed
+    time_import(args.module)
+    cumulative_ms = []
+    self_ms_by_module = {}
+    side_effects = False
+    for _ in range(args.runs):
+        import_times, config_loaded = time_import(args.module)
+        side_effects = side_effects or config_loaded
+        cumulative_ms.append(import_times[args.module][1] / 1000.0)
+        for module_name, (self_us, _cumulative_us) in import_times.items():
+            self_ms_by_module.setdefault(module_name, []).append(self_us / 1000.0)
+    median_ms = statistics.median(cumulative_ms)
+    slowest = sorted(((statistics.median(times), module_name) for module_name, times in self_ms_by_module.items()),
+                     reverse=True)[:args.top]
+    autostar_ms = sum(statistics.median(times) for module_name, times in self_ms_by_module.items()
+                      if module_name.split(".")[0] == "autostar")
+    over_budget = median_ms > args.budget_ms
+
+    report = {"meta": {"benchmark": "import_time", "module": args.module, "runs": args.runs,
+                       "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "budget_ms": args.budget_ms, "median_ms": median_ms, "min_ms": min(cumulative_ms),
+              "max_ms": max(cumulative_ms), "autostar_self_ms": autostar_ms, "config_loaded_on_import": side_effects,
+              "slowest_modules_self_ms": {module_name: self_ms for self_ms, module_name in slowest}}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"import {args.module}: median {median_ms:.1f} ms (min {min(cumulative_ms):.1f}, "
+          f"max {max(cumulative_ms):.1f}) over {args.runs} runs, budget {args.budget_ms:.1f} ms")
+    print(f"  autostar modules (self time): {autostar_ms:.1f} ms")
+    print(f"  slowest modules (self time):")
+    for self_ms, module_name in slowest:
+        print(f"    {self_ms:8.1f} ms  {module_name}")
+    if side_effects:
+        print("  FAIL: the config was loaded on import")
+    if over_budget:
+        print(f"  FAIL: the import time is over the budget of {args.budget_ms:.1f} ms")
+    print(f"Results written to {args.output}")
+    return 1 if over_budget or side_effects else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Offline benchmark for the star name parser and formatters in autostar.config.default_star_names
+
+A corpus with names for every name type in star_name_types is generated from a seed, or it is
+read from a file with one star name per line. The script measures the throughput of:
+    parse - star_name_format for each name
+    parse_many - star_name_format_many for the whole corpus
+    parse_cached - star_name_format wrapped in a StarNameCache, the way autostar.config.datapaths uses it
+    format - StringStarName(x).string_name for each parsed name, the format_functions
+    format_many - string_names_many for all the parsed names
+    round_trip - star_name_format(StringStarName(x).string_name) == x
+and the memory allocated by each step using tracemalloc. It also checks round-trip equality for every
+parsed name and reports the failures by name type and by stage:
+    format - StringStarName raised, most often a name type without a @string_name function
+    parse - star_name_format raised for the string name
+    compare - the string name was parsed to a different StarName
+
+The results are written as JSON so that runs can be compared over time:
+    python benchmarks/name_parsing.py --output before.json
+    python benchmarks/name_parsing.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import subprocess
+from datetime import datetime, timezone
+
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+
+from autostar.config.default_star_names import star_name_format, star_name_format_many, StringStarName, \
+    string_names_many, StarNameCache, star_name_types, single_part_star_names, multi_part_star_names, \
+    signed_star_names, string_names, star_letters
+
+
+"""
+Corpus generation
+"""
+# hand-picked names in the forms that show up in Simbad, NASA Exoplanet Archive, and the Hypatia Catalog
+curated_names = ["HD 1234", "HIP 12345", "HIP 12345 B", "Gaia DR3 1234567890123", "Gaia DR2 4567890123",
+                 "GJ 551", "GJ 551.1", "G 123-45", "BD+12 345", "BD+12345", "CD-45 1234", "CoD-45 1234",
+                 "CPD-60 1234", "TYC 1234-56789-1", "2MASS J12345678+1234567", "2MASS 12345678+1234567",
+                 "2MASSI J0840424+193357", "* alf Cen", "* alf Cen A", "V* V830 Tau", "** ABC 12",
+                 "EM* LkHA 101", "NAME Proxima Cen", "Cl* Melotte 22 HII 1234", "MOA-2011-BLG-293L",
+                 "MOA 2011-BLG-293", "OGLE-TR-56", "OGLE-2005-BLG-071L", "KMT-2016-BLG-1107L",
+                 "BPS CS 22892-0052", "CS 22892-052", "BS 16467-062", "USco CTIO 5", "uscoCTIO 108",
+                 "WD 0806-661", "LP 123-45", "L 123-45", "Kepler-22 b", "K2-18", "WASP-12", "TrES-2", "XO-1",
+                 "HAT-P-11", "HATS-1", "TOI-700", "TIC 307210830", "KOI-1234", "DENIS J1048-3956",
+                 "PSR B1257+12", "IRAS 04302+2247", "[BHM2000] 123"]
+
+# the upper/lower case that names are written with
+case_styles = (str, str.upper, str.lower, str.title)
+
+
+def single_part_names(name_type, rnd, count):
+    names = []
+    for _ in range(count):
+        number = rnd.randint(1, 999999)
+        style = rnd.randrange(4)
+        if style == 0:
+            names.append(f"{name_type} {number}")
+        elif style == 1:
+            names.append(f"{name_type}-{number}")
+        elif style == 2:
+            names.append(f"{name_type} {number} {rnd.choice(sorted(star_letters))}")
+        else:
+            names.append(f"{name_type} {number}.{rnd.randint(1, 9)}")
+    return names
+
+
+def signed_names(name_type, rnd, count):
+    names = []
+    for _ in range(count):
+        sign = rnd.choice("+-")
+        zone = rnd.randint(0, 89)
+        number = rnd.randint(1, 9999)
+        if rnd.randrange(2):
+            names.append(f"{name_type}{sign}{zone:02d} {number}")
+        else:
+            names.append(f"{name_type} {sign}{zone:02d} {number}")
+    return names
+
+
+def multi_part_names(name_type, rnd, count):
+    names = []
+    for _ in range(count):
+        first = rnd.randint(1, 9999)
+        second = rnd.randint(1, 99999)
+        style = rnd.randrange(3)
+        if style == 0:
+            names.append(f"{name_type} {first}-{second}")
+        elif style == 1:
+            names.append(f"{name_type} {first}+{second}")
+        else:
+            names.append(f"{name_type} {first}-{second}-{rnd.randint(1, 3)}")
+    return names
+
+
+def string_part_names(name_type, rnd, count):
+    names = []
+    for _ in range(count):
+        style = rnd.randrange(3)
+        if style == 0:
+            names.append(f"{name_type} j{rnd.randint(0, 99999999):08d}+{rnd.randint(0, 9999999):07d}")
+        elif style == 1:
+            names.append(f"{name_type} {rnd.randint(1990, 2024)}-blg-{rnd.randint(1, 1999)}")
+        else:
+            names.append(f"{name_type} {rnd.choice(['alf', 'bet', 'tau', 'lkha', 'v830'])} {rnd.randint(1, 999)}")
+    return names
+
+
+def make_corpus(seed=1, names_per_type=40):
+    """
+    Make a corpus of star names that covers every name type in star_name_types.
+
+    :param seed: int - the seed for the random number generator, the same seed makes the same corpus.
+    :param names_per_type: int - the number of generated names for each name type.
+    :return: list of str star names.
+    """
+    rnd = random.Random(seed)
+    corpus = list(curated_names)
+    for name_type in sorted(star_name_types):
+        if name_type in signed_star_names:
+            names = signed_names(name_type, rnd, names_per_type)
+        elif name_type in multi_part_star_names:
+            names = multi_part_names(name_type, rnd, names_per_type)
+        elif name_type in string_names:
+            names = string_part_names(name_type, rnd, names_per_type)
+        elif name_type in single_part_star_names:
+            names = single_part_names(name_type, rnd, names_per_type)
+        else:
+            raise KeyError(f"The name type {name_type} is not in any of the star name families.")
+        corpus.extend(rnd.choice(case_styles)(name) for name in names)
+    return corpus
+
+
+def read_corpus(path):
+    with open(path, "r") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def write_corpus(corpus, path):
+    with open(path, "w") as f:
+        f.write("\n".join(corpus) + "\n")
+
+
+"""
+Measurements
+"""
+
+
+def measure(func, repeat=5):
+    """
+    Time a function and measure the memory it allocates.
+
+    :param func: a function with no arguments.
+    :param repeat: int - the number of timed runs, the fastest is reported.
+    :return: dict - the best time in seconds, the peak traced memory in bytes, and the number of memory blocks
+             that were still allocated when the function returned.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    # allocations are measured in a separate run, tracing memory slows python down
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = func()
+    after = tracemalloc.take_snapshot()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained_blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return {"seconds": best, "peak_bytes": peak, "retained_blocks": retained_blocks}
+
+
+def throughput(stats, count):
+    stats["count"] = count
+    stats["per_second"] = count / stats["seconds"] if stats["seconds"] > 0 else None
+    stats["peak_bytes_per_item"] = stats["peak_bytes"] / count if count else None
+    return stats
+
+
+def outcome(func, *args):
+    try:
+        return func(*args), None
+    except Exception as error:
+        return None, error
+
+
+def round_trip_check(parsed_names):
+    """
+    Check that star_name_format(StringStarName(x).string_name) == x for each parsed name.
+
+    :param parsed_names: list of StarName tuples.
+    :return: (failures, checked_by_type) - failures is a list of dicts that describe each failure,
+             checked_by_type counts the names checked for each name type.
+    """
+    failures = []
+    checked_by_type = {}
+    for hypatia_name in parsed_names:
+        name_type = hypatia_name[0]
+        checked_by_type[name_type] = checked_by_type.get(name_type, 0) + 1
+        reparsed = None
+        string_name, error = outcome(lambda x: StringStarName(x).string_name, hypatia_name)
+        if error is None:
+            stage = "parse"
+            reparsed, error = outcome(star_name_format, string_name)
+        else:
+            # a KeyError here is a name type that has no @string_name function in format_functions
+            stage = "format"
+        if error is None and reparsed != hypatia_name:
+            stage = "compare"
+        if error is not None or reparsed != hypatia_name:
+            failures.append({"name_type": name_type, "stage": stage, "star_name": repr(hypatia_name),
+                             "string_name": string_name, "reparsed": None if reparsed is None else repr(reparsed),
+                             "error": None if error is None else type(error).__name__})
+    return failures, checked_by_type
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(corpus, repeat=5):
+    parsed_names = []
+    parse_errors = 0
+    for star_name in corpus:
+        hypatia_name, error = outcome(star_name_format, star_name)
+        if error is None:
+            parsed_names.append(hypatia_name)
+        else:
+            parse_errors += 1
+
+    def parse():
+        return [outcome(star_name_format, star_name) for star_name in corpus]
+
+    def parse_many():
+        return star_name_format_many(corpus)
+
+    cached_format = StarNameCache(star_name_format, maxsize=None)
+    # fill the cache, the timed runs are all cache hits
+    [outcome(cached_format, star_name) for star_name in corpus]
+
+    def parse_cached():
+        return [outcome(cached_format, star_name) for star_name in corpus]
+
+    def format_names():
+        return [outcome(lambda x: StringStarName(x).string_name, hypatia_name) for hypatia_name in parsed_names]
+
+    def format_many():
+        return string_names_many(parsed_names)
+
+    def round_trip():
+        return [outcome(lambda x: star_name_format(StringStarName(x).string_name), hypatia_name)
+                for hypatia_name in parsed_names]
+
+    results = {
+        "parse": throughput(measure(parse, repeat=repeat), len(corpus)),
+        "parse_many": throughput(measure(parse_many, repeat=repeat), len(corpus)),
+        "parse_cached": throughput(measure(parse_cached, repeat=repeat), len(corpus)),
+        "format": throughput(measure(format_names, repeat=repeat), len(parsed_names)),
+        "format_many": throughput(measure(format_many, repeat=repeat), len(parsed_names)),
+        "round_trip": throughput(measure(round_trip, repeat=repeat), len(parsed_names)),
+    }
+    failures, checked_by_type = round_trip_check(parsed_names)
+    failures_by_type = {}
+    failures_by_stage = {}
+    for failure in failures:
+        failures_by_type[failure["name_type"]] = failures_by_type.get(failure["name_type"], 0) + 1
+        failures_by_stage[failure["stage"]] = failures_by_stage.get(failure["stage"], 0) + 1
+    round_trip_summary = {"checked": len(parsed_names), "failed": len(failures), "parse_errors": parse_errors,
+                          "name_types_checked": len(checked_by_type),
+                          "failures_by_stage": dict(sorted(failures_by_stage.items())),
+                          "failures_by_type": dict(sorted(failures_by_type.items())),
+                          "failures": failures}
+    return results, round_trip_summary
+
+
+def compare(results, old_results):
+    print(f"\n{'benchmark':>14} {'old /s':>12} {'new /s':>12} {'speedup':>8}")
+    for bench_name, stats in results.items():
+        old_stats = old_results.get(bench_name)
+        if old_stats is None or not old_stats.get("per_second") or not stats.get("per_second"):
+            continue
+        print(f"{bench_name:>14} {old_stats['per_second']:12.0f} {stats['per_second']:12.0f} "
+              f"{stats['per_second'] / old_stats['per_second']:7.2f}x")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the star name parser and formatters.")
+    parser.add_argument("--corpus", help="a file with one star name per line, the default is a generated corpus")
+    parser.add_argument("--seed", type=int, default=1, help="the seed for the generated corpus")
+    parser.add_argument("--names-per-type", type=int, default=40, help="generated names for each name type")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs for each benchmark, the best is kept")
+    parser.add_argument("--write-corpus", help="write the corpus to this file, one star name per line")
+    parser.add_argument("--output", default=os.path.join(benchmarks_dir, "name_parsing_results.json"),
+                        help="the JSON file for the results")
+    parser.add_argument("--compare", help="a JSON results file from an earlier run to compare against")
+    parser.add_argument("--verbose", action="store_true", help="print the round-trip failures for each name type")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 on a round-trip failure")
+    args = parser.parse_args(args)
+
+    if args.corpus is None:
+        corpus = make_corpus(seed=args.seed, names_per_type=args.names_per_type)
+        corpus_source = f"generated, seed={args.seed}, names_per_type={args.names_per_type}"
+    else:
+        corpus = read_corpus(args.corpus)
+        corpus_source = os.path.abspath(args.corpus)
+    if args.write_corpus is not None:
+        write_corpus(corpus, args.write_corpus)
+
+    results, round_trip_summary = run_benchmarks(corpus, repeat=args.repeat)
+    report = {"meta": {"benchmark": "name_parsing", "commit": git_commit(),
+                       "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "corpus": corpus_source, "corpus_size": len(corpus), "repeat": args.repeat},
+              "results": results,
+              "round_trip": round_trip_summary}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{len(corpus)} star names, {round_trip_summary['name_types_checked']} name types")
+    for bench_name, stats in results.items():
+        print(f"{bench_name:>14}: {stats['per_second']:12.0f} /s, peak {stats['peak_bytes'] / 1024:9.1f} KiB, "
+              f"retained blocks {stats['retained_blocks']:8d}")
+    print(f"round trip: {round_trip_summary['failed']} of {round_trip_summary['checked']} failed, by stage: "
+          f"{round_trip_summary['failures_by_stage']}")
+    if args.verbose:
+        for name_type, failed in round_trip_summary["failures_by_type"].items():
+            print(f"    {name_type}: {failed}")
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f)["results"])
+    print(f"Results written to {args.output}")
+    if args.strict and round_trip_summary["failed"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
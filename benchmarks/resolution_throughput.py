@@ -0,0 +1,191 @@
+"""
+Offline benchmark for star name resolution against the stand-in Simbad, Gaia TAP, and MAST server
+
+A StandinServer from autostar.standin_server is started in this process with synthetic fixtures, see
+StandinData.synthetic, and the autostar clients are pointed at it with use_standin_server. No request leaves
+the machine, and the server can add latency, jitter, errors, and a rate limit, so the cost of the round trips and
+of the client back-off is measured without the real services. The script measures the throughput of:
+    name_serial - SimbadQuery.get_name_data, one Simbad query per name
+    name_async - SimbadQuery.get_name_data_async, one query per name with up to --max-in-flight at once
+    name_bulk - SimbadQuery.get_name_data_bulk, one Simbad TAP upload query per batch of names
+    main_async - SimbadQuery.get_main_data_async, one main (Simbad.query_object) query per name, concurrently
+    main_bulk - SimbadQuery.get_main_data_bulk, one Simbad TAP upload query per batch of names for the main data
+    gaia_source - GaiaQuery.astroquery_source for the Gaia DR3 ids, one job per 500 ids
+    tic - TicQuery.get_tic_data for each star, one MAST name resolution and one TIC cone query per star
+
+The reference data directory is a temporary directory, the reference files are not changed. The client rate
+limits and the response cache (autostar.response_cache) are off unless --client-limits or --response-cache
+is given, so only the server settings slow the queries down:
+    python benchmarks/resolution_throughput.py --stars 200 --latency 0.05 --server-rate 20 --error-rate 0.02
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+
+from autostar.config.datapaths import config, star_name_format
+from autostar.standin_server import StandinData, StandinServer, ServiceSettings, use_standin_server
+from autostar.rate_limit import rate_limit_report, rate_limiters, unlimited_rate_limiters
+from autostar.response_cache import response_cache_report
+
+
+def timed(func, count):
+    start = time.perf_counter()
+    found = func()
+    seconds = time.perf_counter() - start
+    return {"count": count, "found": found, "seconds": seconds,
+            "queries_per_second": count / seconds if seconds > 0.0 else float("inf")}
+
+
+def run_benchmarks(data, stages, max_in_flight=None, batch_size=None, repeat=1):
+    # the query modules are imported after the config points at the stand-in server
+    from autostar.simbad_query import SimbadQuery, StarDict, get_simbad
+    from autostar.read_gaia import GaiaQuery
+    from autostar.tic_query import TicQuery
+
+    hd_names = [simbad_object['ids'][0] for simbad_object in data.simbad_objects]
+    gaia_dr3_names = [name for simbad_object in data.simbad_objects for name in simbad_object['ids']
+                      if name.startswith("Gaia DR3")]
+
+    def name_serial():
+        simbad_query = SimbadQuery(verbose=False)
+        simbad_query.get_name_data(hd_names)
+        return len(simbad_query.stars_found)
+
+    def name_async():
+        simbad_query = SimbadQuery(verbose=False)
+        asyncio.run(simbad_query.get_name_data_async(hd_names, max_in_flight=max_in_flight))
+        return len(simbad_query.stars_found)
+
+    def name_bulk():
+        simbad_query = SimbadQuery(verbose=False)
+        simbad_query.get_name_data_bulk(hd_names, batch_size=batch_size)
+        return len(simbad_query.stars_found)
+
+    def main_async():
+        simbad_query = SimbadQuery(verbose=False)
+        object_dicts = asyncio.run(simbad_query.get_main_data_async(hd_names, max_in_flight=max_in_flight))
+        return sum(1 for object_dict in object_dicts if object_dict is not None)
+
+    def main_bulk():
+        simbad_query = SimbadQuery(verbose=False)
+        query_result = simbad_query.get_main_data_bulk(hd_names, batch_size=batch_size)
+        return sum(1 for main_id in query_result.columns['MAIN_ID'] if main_id)
+
+    def gaia_source():
+        gaia_query = GaiaQuery()
+        gaia_query.astroquery_source(gaia_dr3_names, dr_num=3)
+        return len(gaia_query.star_dict)
+
+    def tic():
+        tic_query = TicQuery(verbose=False)
+        found = 0
+        for simbad_object in data.simbad_objects:
+            star_names_dict = StarDict()
+            for name in simbad_object['ids']:
+                if name.startswith(("HIP", "TYC")):
+                    name_type, star_id = star_name_format(name)
+                    star_names_dict[name_type] = star_id
+            if tic_query.get_tic_data(star_names_dict):
+                found += 1
+        return found
+
+    benchmarks = {"name_serial": (name_serial, len(hd_names)), "name_async": (name_async, len(hd_names)),
+                  "name_bulk": (name_bulk, len(hd_names)), "main_async": (main_async, len(hd_names)),
+                  "main_bulk": (main_bulk, len(hd_names)), "gaia_source": (gaia_source, len(gaia_dr3_names)),
+                  "tic": (tic, len(data.simbad_objects))}
+    results = {}
+    for stage in stages:
+        results[stage] = []
+        for _ in range(repeat):
+            # astroquery keeps the last Simbad query results in memory, each run starts without them
+            get_simbad().clear_cache()
+            results[stage].append(timed(*benchmarks[stage]))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark star name resolution against the stand-in server.")
+    parser.add_argument("--stars", type=int, default=100, help="the number of synthetic stars")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for the fixtures and the server")
+    parser.add_argument("--latency", type=float, default=0.0, help="server seconds before each query is answered")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds of server latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of queries that get a 503")
+    parser.add_argument("--server-rate", type=float, default=None, help="queries per second allowed by the server")
+    parser.add_argument("--server-burst", type=int, default=5, help="queries allowed at once by the server")
+    parser.add_argument("--client-limits", action="store_true",
+                        help="use the client rate limits from the config, the default is no client limit")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="cache the responses on disk, with --repeat the later runs are replayed from the cache")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each stage")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="concurrent queries for name_async and main_async")
+    parser.add_argument("--batch-size", type=int, default=None, help="names in each query for name_bulk and main_bulk")
+    stage_names = ["name_serial", "name_async", "name_bulk", "main_async", "main_bulk", "gaia_source", "tic"]
+    parser.add_argument("--stages", nargs="+", default=stage_names, choices=stage_names)
+    parser.add_argument("--output", default=os.path.join(benchmarks_dir, "resolution_throughput_results.json"),
+                        help="the JSON file for the results")
+    args = parser.parse_args(args)
+
+    data = StandinData.synthetic(args.stars, seed=args.seed)
+    settings = ServiceSettings(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               rate=args.server_rate, burst=args.server_burst)
+    with tempfile.TemporaryDirectory() as reference_data_dir, \
+            StandinServer(data, settings=settings, seed=args.seed) as server:
+        config.set('reference_data_dir', reference_data_dir)
+        for service in ("simbad", "gaia", "mast"):
+            if not args.client_limits:
+                config.set(f"{service}_query_rate", 0)
+            if not args.response_cache:
+                config.set(f"{service}_cache_ttl_days", 0)
+        # the limiters are made again from the config that was just set
+        rate_limiters.clear()
+        unlimited_rate_limiters.clear()
+        with use_standin_server(server.url):
+            results = run_benchmarks(data, args.stages, max_in_flight=args.max_in_flight,
+                                     batch_size=args.batch_size, repeat=args.repeat)
+        server_stats = server.stats
+    client_stats = {stats.service: stats._asdict() for stats in rate_limit_report()}
+    cache_stats = {stats.service: stats._asdict() for stats in response_cache_report()}
+
+    report = {"meta": {"benchmark": "resolution_throughput", "stars": args.stars, "seed": args.seed,
+                       "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+                       "server_rate": args.server_rate, "server_burst": args.server_burst,
+                       "client_limits": args.client_limits, "response_cache": args.response_cache,
+                       "repeat": args.repeat, "max_in_flight": args.max_in_flight,
+                       "batch_size": args.batch_size,
+                       "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "results": results, "server_stats": server_stats, "client_stats": client_stats,
+              "cache_stats": cache_stats}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.stars} stars, latency {args.latency} s, error rate {args.error_rate}, "
+          f"server rate {args.server_rate}, client limits {'on' if args.client_limits else 'off'}")
+    for stage, stage_results in results.items():
+        for result in stage_results:
+            print(f"  {stage:12s} {result['found']:6d} of {result['count']:6d} found in {result['seconds']:8.3f} s, "
+                  f"{result['queries_per_second']:10.1f} per second")
+    print(f"  server: {server_stats}")
+    for service, stats in client_stats.items():
+        print(f"  client {service}: {stats['queries']} queries, {stats['waits']} waits of {stats['wait_seconds']:.2f} s, "
+              f"{stats['backoffs']} back-offs")
+    for service, stats in cache_stats.items():
+        print(f"  cache {service}: {stats['hits']} hits, {stats['misses']} misses, {stats['stores']} stores")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
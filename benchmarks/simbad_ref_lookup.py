@@ -0,0 +1,211 @@
+"""
+Offline benchmark for SimbadRef.make_lookup on a synthetic Simbad reference
+
+A reference with --stars stars is generated from a seed, each star has HD, HIP, TYC, 2MASS, Gaia DR2, and
+Gaia DR3 names, so the default of 170,000 stars is about 1,000,000 identifiers. A fraction of the stars
+(--duplicate-fraction) is split into two or three star dictionaries that share one name, like the entries that
+are added for the same star from different queries. Half of the split stars are chains, A and B share a name and
+B and C share a different name, so they only combine through B.
+
+The script measures the time and the memory allocated (tracemalloc) of make_lookup, and it checks that every
+split star was combined into a single star dictionary with all of its names. With --legacy-stars the earlier
+make_lookup, which restarted from the beginning after each combination, is timed on a smaller reference and its
+result is compared to the union-find version:
+    python benchmarks/simbad_ref_lookup.py --stars 170000 --legacy-stars 2000
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import contextlib
+from datetime import datetime, timezone
+
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+
+from autostar.simbad_query import SimbadRef, StarDict
+
+
+def star_names(star_number):
+    """ The (name_type, star_id) names of one synthetic star, in the form star_name_format returns them."""
+    return [("hd", (star_number,)), ("hip", (star_number,)),
+            ("tyc", (1 + star_number % 9000, 1 + star_number // 9000, 1)),
+            ("2mass", f"j{star_number:08d}+{star_number % 10000000:07d}"),
+            ("gaia dr2", (3000000000000000000 + star_number,)), ("gaia dr3", (4000000000000000000 + star_number,))]
+
+
+def make_star_dict(names):
+    star_dict = StarDict()
+    for name_type, star_id in names:
+        star_dict[name_type] = star_id
+    return star_dict
+
+
+def make_reference(n_stars, duplicate_fraction=0.1, seed=1):
+    """
+    :return: tuple - (list of StarDict, list of int) the star dictionaries in a shuffled order, and the star
+             numbers of the stars that were split into more than one star dictionary.
+    """
+    rnd = random.Random(seed)
+    star_dict_list = []
+    split_stars = []
+    for star_number in range(1, n_stars + 1):
+        names = star_names(star_number)
+        if rnd.random() < duplicate_fraction:
+            split_stars.append(star_number)
+            if rnd.random() < 0.5:
+                # two star dictionaries that share the HD name
+                star_dict_list.append(make_star_dict(names[:3]))
+                star_dict_list.append(make_star_dict(names[:1] + names[3:]))
+            else:
+                # a chain, A and C only share names with B
+                star_dict_list.append(make_star_dict(names[:2]))
+                star_dict_list.append(make_star_dict(names[1:4]))
+                star_dict_list.append(make_star_dict(names[3:]))
+        else:
+            star_dict_list.append(make_star_dict(names))
+    rnd.shuffle(star_dict_list)
+    return star_dict_list, split_stars
+
+
+def copy_star_dicts(star_dict_list):
+    return [make_star_dict((name_type, star_id) for name_type, star_ids in star_dict.items() for star_id in star_ids)
+            for star_dict in star_dict_list]
+
+
+def legacy_make_lookup(simbad_ref):
+    """ The make_lookup of SimbadRef before the union-find version, it restarts after each combination."""
+    simbad_ref.lookup_dicts = {name_type: {} for name_type in simbad_ref.available_name_types}
+    simbad_ref.found_ids = {name_type: set() for name_type in simbad_ref.available_name_types}
+    for index, star_dict in list(enumerate(simbad_ref.star_dict_list)):
+        found_index = None
+        name_types_this_star = set(star_dict.keys())
+        for name_type in name_types_this_star:
+            for star_id in star_dict[name_type]:
+                if name_type in simbad_ref.available_name_types:
+                    if star_id in simbad_ref.found_ids[name_type]:
+                        found_index = simbad_ref.lookup_dicts[name_type][star_id]
+                        break
+                    else:
+                        simbad_ref.lookup_dicts[name_type][star_id] = index
+                        simbad_ref.found_ids[name_type].add(star_id)
+                else:
+                    simbad_ref.available_name_types.add(name_type)
+                    simbad_ref.lookup_dicts[name_type] = {star_id: index}
+                    simbad_ref.found_ids[name_type] = {star_id}
+        if found_index is not None:
+            for name_type in name_types_this_star:
+                simbad_ref.star_dict_list[found_index][name_type] = star_dict[name_type]
+                simbad_ref.available_name_types.add(name_type)
+            simbad_ref.star_dict_list.pop(index)
+            legacy_make_lookup(simbad_ref)
+            break
+
+
+def new_simbad_ref(star_dict_list):
+    simbad_ref = SimbadRef(ref_file_name=os.devnull)
+    simbad_ref.star_dict_list = star_dict_list
+    simbad_ref.available_name_types = set()
+    return simbad_ref
+
+
+def measure(make_lookup, simbad_ref):
+    tracemalloc.start()
+    start = time.perf_counter()
+    # the combination messages are not part of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        make_lookup(simbad_ref)
+    seconds = time.perf_counter() - start
+    _current, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak_bytes
+
+
+def check_combined(simbad_ref, n_stars):
+    """ :return: int - the number of stars that are not exactly one star dictionary with all the star's names."""
+    failures = 0
+    for star_number in range(1, n_stars + 1):
+        names = star_names(star_number)
+        indexes = {simbad_ref.lookup_dicts[name_type].get(star_id) for name_type, star_id in names}
+        if len(indexes) != 1 or None in indexes:
+            failures += 1
+            continue
+        star_dict = simbad_ref.star_dict_list[indexes.pop()]
+        if star_dict != make_star_dict(names):
+            failures += 1
+    return failures
+
+
+def lookup_snapshot(simbad_ref):
+    """ The lookup as {(name_type, star_id): frozenset of names of the star}, independent of the list order."""
+    snapshot = {}
+    for name_type, lookup_this_type in simbad_ref.lookup_dicts.items():
+        for star_id, index in lookup_this_type.items():
+            star_dict = simbad_ref.star_dict_list[index]
+            snapshot[(name_type, star_id)] = frozenset((other_type, other_id) for other_type, other_ids
+                                                       in star_dict.items() for other_id in other_ids)
+    return snapshot
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark SimbadRef.make_lookup on a synthetic reference.")
+    parser.add_argument("--stars", type=int, default=170000, help="synthetic stars, each star has 6 names")
+    parser.add_argument("--duplicate-fraction", type=float, default=0.1,
+                        help="the fraction of stars that are split into more than one star dictionary")
+    parser.add_argument("--seed", type=int, default=1, help="the seed for the synthetic reference")
+    parser.add_argument("--legacy-stars", type=int, default=0,
+                        help="also time the earlier make_lookup on a reference with this many stars")
+    parser.add_argument("--output", default=os.path.join(benchmarks_dir, "simbad_ref_lookup_results.json"),
+                        help="the JSON file for the results")
+    args = parser.parse_args(args)
+
+    star_dict_list, split_stars = make_reference(args.stars, args.duplicate_fraction, args.seed)
+    n_identifiers = sum(len(star_ids) for star_dict in star_dict_list for star_ids in star_dict.values())
+    simbad_ref = new_simbad_ref(star_dict_list)
+    n_entries = len(simbad_ref.star_dict_list)
+    seconds, peak_bytes = measure(SimbadRef.make_lookup, simbad_ref)
+    failures = check_combined(simbad_ref, args.stars)
+    results = {"make_lookup": {"stars": args.stars, "entries": n_entries, "identifiers": n_identifiers,
+                               "split_stars": len(split_stars), "entries_after": len(simbad_ref.star_dict_list),
+                               "seconds": seconds, "peak_mb": peak_bytes / 1.0e6, "combine_failures": failures}}
+    print(f"make_lookup: {n_entries} star dictionaries with {n_identifiers} identifiers, {len(split_stars)} split "
+          f"stars, {len(simbad_ref.star_dict_list)} after combination in {seconds:.3f} s, "
+          f"peak {peak_bytes / 1.0e6:.1f} MB, {failures} combination failures")
+
+    if args.legacy_stars:
+        legacy_list, _legacy_split = make_reference(args.legacy_stars, args.duplicate_fraction, args.seed)
+        legacy_ref = new_simbad_ref(copy_star_dicts(legacy_list))
+        # the earlier version recursed once for each combination
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * len(legacy_list)))
+        legacy_seconds, legacy_peak = measure(legacy_make_lookup, legacy_ref)
+        union_find_ref = new_simbad_ref(copy_star_dicts(legacy_list))
+        union_find_seconds, union_find_peak = measure(SimbadRef.make_lookup, union_find_ref)
+        same = lookup_snapshot(legacy_ref) == lookup_snapshot(union_find_ref) \
+            and len(legacy_ref.star_dict_list) == len(union_find_ref.star_dict_list)
+        results["legacy_comparison"] = {"stars": args.legacy_stars, "entries": len(legacy_list),
+                                        "legacy_seconds": legacy_seconds, "union_find_seconds": union_find_seconds,
+                                        "legacy_peak_mb": legacy_peak / 1.0e6,
+                                        "union_find_peak_mb": union_find_peak / 1.0e6, "same_result": same}
+        print(f"legacy comparison on {len(legacy_list)} star dictionaries: legacy {legacy_seconds:.3f} s, "
+              f"union-find {union_find_seconds:.3f} s, same result: {same}")
+
+    report = {"meta": {"benchmark": "simbad_ref_lookup", "seed": args.seed,
+                       "duplicate_fraction": args.duplicate_fraction,
+                       "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if failures or not results.get("legacy_comparison", {}).get("same_result", True) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
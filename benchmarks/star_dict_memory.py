@@ -0,0 +1,158 @@
+"""
+Offline benchmark for the memory and speed of StarDict, compared to the earlier UserDict StarDict
+
+Star dictionaries with --entries names in total are made from a seed, each star has HD, HIP, TYC, 2MASS,
+Gaia DR2, and Gaia DR3 names, and a fraction of the stars (--multi-fraction) have a second HD name. The script
+measures, for the earlier UserDict StarDict (a copy is in this file) and for autostar.simbad_query.StarDict:
+    build - the time and memory (tracemalloc) to make the star dictionaries, the memory that is kept is reported
+    contains - `name_type in star_dict` for every name type of every star
+    get - star_dict[name_type] for every name type of every star, and iteration over the star_ids
+and it checks that both versions have the same names for every star:
+    python benchmarks/star_dict_memory.py --entries 1000000
+"""
+import gc
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from collections import UserDict
+from datetime import datetime, timezone
+
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+if repo_dir not in sys.path:
+    sys.path.insert(0, repo_dir)
+
+from autostar.simbad_query import StarDict
+
+
+class LegacyStarDict(UserDict):
+    """ The StarDict before the __slots__ version, every name type is a set."""
+    def __missing__(self, key):
+        if isinstance(key, str):
+            raise KeyError
+        return self[str(key)]
+
+    def __contains__(self, key):
+        return str(key) in self.data
+
+    def __setitem__(self, key, value):
+        if not self.__contains__(key):
+            if isinstance(value, set):
+                self.data[str(key)] = value
+            else:
+                self.data[str(key)] = {value}
+        if isinstance(value, set):
+            self.data[str(key)] |= value
+        else:
+            self.data[str(key)].add(value)
+
+
+def star_names(star_number, second_hd=False):
+    """ The (name_type, star_id) names of one synthetic star, in the form star_name_format returns them."""
+    names = [("hd", (star_number,)), ("hip", (star_number,)),
+             ("tyc", (1 + star_number % 9000, 1 + star_number // 9000, 1)),
+             ("2mass", f"j{star_number:08d}+{star_number % 10000000:07d}"),
+             ("gaia dr2", (3000000000000000000 + star_number,)), ("gaia dr3", (4000000000000000000 + star_number,))]
+    if second_hd:
+        names.append(("hd", (star_number, "a")))
+    return names
+
+
+def make_names(n_entries, multi_fraction=0.05, seed=1):
+    rnd = random.Random(seed)
+    names_per_star = []
+    n_names = 0
+    star_number = 0
+    while n_names < n_entries:
+        star_number += 1
+        names = star_names(star_number, second_hd=rnd.random() < multi_fraction)
+        names_per_star.append(names)
+        n_names += len(names)
+    return names_per_star
+
+
+def build(star_dict_class, names_per_star):
+    star_dicts = []
+    for names in names_per_star:
+        star_dict = star_dict_class()
+        for name_type, star_id in names:
+            star_dict[name_type] = star_id
+        star_dicts.append(star_dict)
+    return star_dicts
+
+
+def measure(star_dict_class, names_per_star):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    star_dicts = build(star_dict_class, names_per_star)
+    build_seconds = time.perf_counter() - start
+    kept_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    name_types = [name_type for name_type, _star_id in names_per_star[0]]
+    start = time.perf_counter()
+    for star_dict in star_dicts:
+        for name_type in name_types:
+            name_type in star_dict
+    contains_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_star_ids = 0
+    for star_dict in star_dicts:
+        for name_type in name_types:
+            for _star_id in star_dict[name_type]:
+                n_star_ids += 1
+    get_seconds = time.perf_counter() - start
+    result = {"build_seconds": build_seconds, "kept_mb": kept_bytes / 1.0e6, "peak_mb": peak_bytes / 1.0e6,
+              "contains_seconds": contains_seconds, "get_seconds": get_seconds, "star_ids": n_star_ids}
+    return result, star_dicts
+
+
+def same_names(legacy_star_dicts, star_dicts):
+    """ :return: int - the number of stars with different names in the two versions."""
+    return sum(1 for legacy_star_dict, star_dict in zip(legacy_star_dicts, star_dicts)
+               if {name_type: set(star_ids) for name_type, star_ids in legacy_star_dict.items()}
+               != {name_type: set(star_ids) for name_type, star_ids in star_dict.items()})
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the memory and speed of StarDict.")
+    parser.add_argument("--entries", type=int, default=1000000, help="the total number of names of all the stars")
+    parser.add_argument("--multi-fraction", type=float, default=0.05,
+                        help="the fraction of stars with two HD names")
+    parser.add_argument("--seed", type=int, default=1, help="the seed for the synthetic names")
+    parser.add_argument("--output", default=os.path.join(benchmarks_dir, "star_dict_memory_results.json"),
+                        help="the JSON file for the results")
+    args = parser.parse_args(args)
+
+    names_per_star = make_names(args.entries, args.multi_fraction, args.seed)
+    n_entries = sum(len(names) for names in names_per_star)
+    legacy_result, legacy_star_dicts = measure(LegacyStarDict, names_per_star)
+    result, star_dicts = measure(StarDict, names_per_star)
+    differences = same_names(legacy_star_dicts, star_dicts)
+    results = {"legacy": legacy_result, "star_dict": result, "stars": len(names_per_star), "entries": n_entries,
+               "different_stars": differences}
+    print(f"{len(names_per_star)} stars with {n_entries} names, {differences} stars with different names")
+    for label, stage_result in (("UserDict StarDict", legacy_result), ("__slots__ StarDict", result)):
+        print(f"  {label:18s} kept {stage_result['kept_mb']:8.1f} MB, peak {stage_result['peak_mb']:8.1f} MB, "
+              f"build {stage_result['build_seconds']:6.2f} s, contains {stage_result['contains_seconds']:6.2f} s, "
+              f"get {stage_result['get_seconds']:6.2f} s")
+
+    report = {"meta": {"benchmark": "star_dict_memory", "seed": args.seed, "multi_fraction": args.multi_fraction,
+                       "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
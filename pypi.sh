@@ -1,3 +1,5 @@
+# the release stops when importing autostar is over the import-time budget or touches files
+python benchmarks/import_time.py --output /dev/null || exit 1
 # twine is PyPi's upload tool
 pip install twine --upgrade
 # make a distribution wheel file